@@ -0,0 +1,124 @@
+"""
+Migrasi database di luar lifespan app.
+
+`prisma migrate deploy` spawn Node dan makan beberapa detik, jadi tidak
+dijalankan lagi di setiap boot. Migrasi dijalankan sekali di release phase:
+
+    python -m app.db.migrations           # migrate deploy + cek versi
+    python -m app.db.migrations --check   # hanya cek (exit 1 jika ada pending)
+
+Database lama yang dibuat sebelum ada folder migrasi (`prisma db push`)
+ditandai sekali dengan `python -m prisma migrate resolve --applied 0_init`
+supaya baseline tidak dijalankan ulang.
+
+Saat startup app cukup membandingkan folder prisma/migrations dengan tabel
+`_prisma_migrations` (satu query, tanpa Node) — lihat MIGRATE_ON_STARTUP
+di app/main.py.
+"""
+
+import argparse
+import asyncio
+import logging
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
+
+from prisma import Prisma
+
+_logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "prisma" / "migrations"
+
+_APPLIED_SQL = (
+    "SELECT migration_name FROM _prisma_migrations "
+    "WHERE finished_at IS NOT NULL AND rolled_back_at IS NULL "
+    "ORDER BY migration_name"
+)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def local_migrations(migrations_dir: Path = MIGRATIONS_DIR) -> List[str]:
+    """Nama migrasi yang ada di repo (folder berisi migration.sql)."""
+    if not migrations_dir.exists():
+        return []
+    return sorted(
+        path.name
+        for path in migrations_dir.iterdir()
+        if (path / "migration.sql").exists()
+    )
+
+
+async def applied_migrations(prisma: Prisma) -> List[str]:
+    """Nama migrasi yang sudah selesai di database."""
+    try:
+        rows = await prisma.query_raw(_APPLIED_SQL)
+    except Exception as e:
+        # Tabel _prisma_migrations belum ada → belum pernah migrate deploy
+        _logger.warning(f"Cannot read _prisma_migrations: {e}")
+        return []
+    return [row["migration_name"] for row in rows]
+
+
+async def check_migrations(prisma: Prisma) -> dict:
+    """
+    Cek apakah semua migrasi di repo sudah diterapkan (tanpa Node/CLI).
+
+    Returns:
+        Dict up_to_date, pending, latest_applied
+    """
+    local = local_migrations()
+    applied = await applied_migrations(prisma)
+    pending = [name for name in local if name not in set(applied)]
+
+    return {
+        "up_to_date": not pending,
+        "pending": pending,
+        "latest_applied": applied[-1] if applied else None,
+    }
+
+
+def run_migrate_deploy() -> None:
+    """Jalankan `prisma migrate deploy` (release phase, bukan saat serving)."""
+    _logger.info("Running prisma migrate deploy...")
+    result = subprocess.run([sys.executable, "-m", "prisma", "migrate", "deploy"])
+    if result.returncode != 0:
+        raise MigrationError(f"prisma migrate deploy gagal (exit {result.returncode})")
+
+
+async def _main(check_only: bool) -> int:
+    if not check_only:
+        run_migrate_deploy()
+
+    prisma = Prisma()
+    await prisma.connect()
+    try:
+        status = await check_migrations(prisma)
+    finally:
+        await prisma.disconnect()
+
+    if status["pending"]:
+        _logger.error(f"Pending migrations: {status['pending']}")
+        return 1
+
+    _logger.info(f"Database schema up to date (latest: {status['latest_applied']})")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Migrasi database (release phase)")
+    parser.add_argument("--check", action="store_true", help="Hanya cek, tanpa migrate deploy")
+    args = parser.parse_args()
+
+    try:
+        sys.exit(asyncio.run(_main(args.check)))
+    except MigrationError as e:
+        _logger.error(str(e))
+        sys.exit(1)
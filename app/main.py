@@ -1,18 +1,25 @@
 from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
 import logging
-import subprocess
+import os
+import time
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import httpx
 from fastapi.routing import APIRoute
 
 # Import Prisma client
 from app.db import prisma, connect_db
+from app.db.migrations import check_migrations, run_migrate_deploy
 
 # Import routers
 from app.webhook import telegram_router, whatsapp_router
+from app.services import storage_manager_loop
+from app.services.job_queue import APP_ROLE, JOB_QUEUE_ENABLED
+import worker
+from app.utils.metrics import render_metrics
 
 # Setup logging
 logging.basicConfig(
@@ -21,26 +28,75 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Warm-up engine OCR saat startup (0 = matikan; role ingest tidak pernah OCR)
+OCR_WARMUP = os.getenv("OCR_WARMUP", "1") == "1" and not JOB_QUEUE_ENABLED
+
+# Lifecycle file struk terjadwal (0 = matikan)
+STORAGE_MANAGER_ENABLED = os.getenv("STORAGE_MANAGER_ENABLED", "1") == "1"
+
+# Migrasi saat startup:
+# "check"  = hanya cek versi migrasi (default; migrate deploy di release phase)
+# "deploy" = jalankan prisma migrate deploy (lambat, spawn Node)
+# "skip"   = tidak cek sama sekali
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "check").lower()
+
 http_client: httpx.AsyncClient | None = None
+storage_task: asyncio.Task | None = None
+warmup_task: asyncio.Task | None = None
+
+# Status readiness (dibaca /ready)
+readiness = {
+    "started_at": None,
+    "startup_ms": None,
+    "migrations": None,
+    "ocr_warmup": None,
+    "ocr_warmup_error": None,
+}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global http_client
+    global http_client, storage_task, warmup_task
+
+    start = time.perf_counter()
+    readiness["started_at"] = datetime.now().isoformat()
 
     try:
-        # Jalankan migrasi database pertama-tama
-        logger.info("Running database migrations...")
-        subprocess.run(["python", "-m", "prisma", "migrate", "deploy"], check=True)
-        
+        if MIGRATE_ON_STARTUP == "deploy":
+            logger.info("Running database migrations...")
+            await asyncio.to_thread(run_migrate_deploy)
+
         # Connect to database
         logger.info("Connecting to database...")
         await connect_db()
         logger.info("✅ Database connected successfully")
 
+        if MIGRATE_ON_STARTUP in ("check", "deploy"):
+            readiness["migrations"] = await check_migrations(prisma)
+            if readiness["migrations"]["pending"]:
+                logger.warning(
+                    f"⚠️ Pending migrations: {readiness['migrations']['pending']} "
+                    "(jalankan: python -m app.db.migrations)"
+                )
+
+        # Role ingest tidak menjalankan pipeline → buffer worker tidak dipakai
+        if not JOB_QUEUE_ENABLED:
+            await worker.startup_worker()
+
         http_client = httpx.AsyncClient(timeout=20.0)
         app.state.http_client = http_client
         logger.info("🌐 HTTP client initialized")
 
+        # Warm-up di background: /health langsung hidup, /ready menunggu engine siap
+        if OCR_WARMUP:
+            warmup_task = asyncio.create_task(warm_up_ocr())
+
+        if STORAGE_MANAGER_ENABLED:
+            storage_task = asyncio.create_task(storage_manager_loop(prisma))
+            logger.info("🗂️ Storage manager scheduled")
+
+        readiness["startup_ms"] = int((time.perf_counter() - start) * 1000)
+        logger.info(f"🚀 Startup finished in {readiness['startup_ms']} ms (role={APP_ROLE})")
+
     except Exception as e:
         logger.error(f"❌ Failed to start application: {e}")
         raise
@@ -48,11 +104,33 @@ async def lifespan(app: FastAPI):
     yield
     
     # Cleanup
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if not JOB_QUEUE_ENABLED:
+        await worker.shutdown_worker()
+    if storage_task:
+        storage_task.cancel()
+        try:
+            await storage_task
+        except asyncio.CancelledError:
+            pass
     if http_client:
         await http_client.aclose()
     await prisma.disconnect()
     logger.info("♻️ Resources cleaned up")
 
+async def warm_up_ocr():
+    """Bangun engine OCR sekali di startup (gagal warm-up tidak fatal)."""
+    from worker.ocr.engines import warm_up
+
+    try:
+        stats = await asyncio.to_thread(warm_up)
+        readiness["ocr_warmup"] = stats
+        logger.info(f"🔥 OCR engines ready ({stats['warmup_ms']} ms)")
+    except Exception as e:
+        readiness["ocr_warmup_error"] = str(e)
+        logger.warning(f"⚠️ OCR warm-up failed: {e}")
+
 #Setup FastAPI app
 app = FastAPI(
     title="Finance Tracker API",
@@ -66,6 +144,53 @@ app = FastAPI(
 async def health_check():
     return {"status": "ok"}
 
+# Readiness: DB bisa di-query, migrasi up to date, engine OCR sudah warm-up
+@app.get("/ready")
+async def readiness_check():
+    checks = {}
+
+    try:
+        await asyncio.wait_for(prisma.query_raw("SELECT 1"), timeout=2.0)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+
+    migrations = readiness["migrations"]
+    if migrations is None:
+        checks["migrations"] = "unchecked"
+    elif migrations["pending"]:
+        checks["migrations"] = f"pending: {', '.join(migrations['pending'])}"
+    else:
+        checks["migrations"] = "ok"
+
+    warmup_stats = readiness["ocr_warmup"]
+    if not OCR_WARMUP:
+        checks["ocr_engines"] = "disabled"
+    elif readiness["ocr_warmup_error"]:
+        # Gagal warm-up tidak fatal: engine dibuat lazy saat struk pertama
+        checks["ocr_engines"] = "disabled"
+    elif warmup_stats is None:
+        checks["ocr_engines"] = "warming_up"
+    else:
+        checks["ocr_engines"] = "ok"
+
+    ready = all(value in ("ok", "unchecked", "disabled") for value in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "startup_ms": readiness["startup_ms"],
+            "ocr_warmup": warmup_stats,
+        },
+    )
+
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 app.include_router(telegram_router, tags=["Telegram"])  
 app.include_router(whatsapp_router, prefix="/webhook/whatsapp", tags=["WhatsApp"])
 
@@ -1,11 +1,19 @@
-from app.models import IntentType,InputSource,MessageSource, LLMOutputSchema,TransactionCreateSchema,TransactionResponseSchema,WebhookPayloadSchema
+from .enums import IntentType, InputType, MessageSource
+from .schemas import (
+    LLMBatchItemSchema,
+    LLMOutputSchema,
+    TransactionCreateSchema,
+    TransactionResponseSchema,
+    WebhookPayloadSchema
+)
 
 __all__ = [
     "IntentType",
     "InputType",
     "MessageSource",
+    "LLMBatchItemSchema",
     "LLMOutputSchema",
     "TransactionCreateSchema",
     "TransactionResponseSchema",
     "WebhookPayloadSchema"
-]
\ No newline at end of file
+]
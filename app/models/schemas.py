@@ -1,18 +1,61 @@
 from datetime import datetime
-from typing import Optional, Dict, Any
+from decimal import Decimal, InvalidOperation
+from typing import Literal, Optional, Dict, Any
 
 from pydantic import BaseModel, field_validator, Field
-from .enums import IntentType, InputSource
+from .enums import IntentType, MessageSource
+
+_INTENT_ALIASES = {
+    "income": "income",
+    "pemasukan": "income",
+    "masuk": "income",
+    "expense": "expense",
+    "pengeluaran": "expense",
+    "keluar": "expense",
+}
+
 
 class LLMOutputSchema(BaseModel):
-    intent: IntentType
-    amount: int = Field(..., gt=0)
+    """
+    Output LLM untuk satu transaksi (dipakai `parse_llm_response`).
+
+    Intent disimpan sebagai "income" / "expense" (nilai kolom transactions.intent);
+    amount 0 = tidak ada nominal (ditandai sanity check, bukan error parse).
+    """
+    intent: Literal["income", "expense"]
+    amount: Decimal = Field(..., ge=0)
     currency: str = "IDR"
     date: Optional[str] = None  # ISO date string (YYYY-MM-DD)
     category: str
     note: str
     confidence: float = Field(..., ge=0.0, le=1.0)
 
+    @field_validator("intent", mode="before")
+    def normalize_intent(cls, v):
+        if isinstance(v, str):
+            return _INTENT_ALIASES.get(v.strip().lower(), v)
+        return v
+
+    @field_validator("amount", mode="before")
+    def parse_amount_slang(cls, v):
+        # "25rb" / "5jt" / "1.5 juta" → angka
+        if isinstance(v, str):
+            s = v.lower().replace(" ", "")
+            s = s.replace("juta", "000000").replace("jt", "000000").replace("rb", "000")
+            try:
+                return Decimal(s)
+            except InvalidOperation:
+                raise ValueError(f"amount must be a number, got {v!r}")
+        return v
+
+    @field_validator("currency", mode="after")
+    def upper_currency(cls, v):
+        return v.upper()
+
+    @field_validator("category", mode="after")
+    def lower_category(cls, v):
+        return v.lower()
+
     @field_validator("date")
     def validate_date(cls, v):
         if v is None:
@@ -23,6 +66,11 @@ class LLMOutputSchema(BaseModel):
             raise ValueError("date must be in ISO format YYYY-MM-DD")
         return v
 
+
+class LLMBatchItemSchema(LLMOutputSchema):
+    """Satu item output mode batch (JSON array); ref = nomor item input."""
+    ref: Optional[int] = None
+
 class TransactionCreateSchema(BaseModel):
     user_id: int
     intent: IntentType
@@ -41,6 +89,6 @@ class TransactionResponseSchema(TransactionCreateSchema):
     created_at: datetime
 
 class WebhookPayloadSchema(BaseModel):
-    source: InputSource
+    source: MessageSource
     raw_message: str
     timestamp: Optional[datetime] = None
@@ -14,6 +14,19 @@ from .receipt_service import (
     get_receipt_by_id,
     get_receipts_by_user,
 )
+from .storage_service import (
+    compress_processed_receipts,
+    enforce_storage_budget,
+    purge_expired_receipts,
+    run_storage_sweep,
+    run_storage_sweep_locked,
+    storage_manager_loop,
+)
+from .job_queue import (
+    claim_jobs,
+    dispatch_job,
+    enqueue_job,
+)
 from .user_service import (
     get_or_create_user,
     get_user_by_id,
@@ -40,6 +53,17 @@ __all__ = [
     "delete_receipt",
     "count_receipts_by_user",
     "get_latest_receipt",
+    # Storage service
+    "compress_processed_receipts",
+    "purge_expired_receipts",
+    "enforce_storage_budget",
+    "run_storage_sweep",
+    "run_storage_sweep_locked",
+    "storage_manager_loop",
+    # Job queue
+    "enqueue_job",
+    "dispatch_job",
+    "claim_jobs",
     # User service
     "get_or_create_user",
     "update_user",
@@ -0,0 +1,182 @@
+"""Antrian job berbasis tabel Postgres (ingest → worker/export)."""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import BackgroundTasks
+from prisma import Prisma
+
+from app.utils.metrics import DB_WRITE_DURATION, observe
+
+_logger = logging.getLogger(__name__)
+
+# Role process:
+# "all"    = satu process (webhook + OCR/LLM via BackgroundTasks, perilaku lama)
+# "ingest" = webhook saja; pekerjaan berat dimasukkan ke tabel jobs
+APP_ROLE = os.getenv("APP_ROLE", "all").lower()
+JOB_QUEUE_ENABLED = APP_ROLE == "ingest"
+
+# Retry job yang gagal (raise) sebelum ditandai failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SECONDS = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "10"))
+# Job "running" lebih lama dari ini dianggap worker-nya mati → di-queue ulang
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "600"))
+
+QUEUE_WORKER = "worker"
+QUEUE_EXPORT = "export"
+
+JOB_TELEGRAM_TEXT = "telegram_text"
+JOB_TELEGRAM_RECEIPT = "telegram_receipt"
+JOB_TELEGRAM_EXPORT = "telegram_export"
+JOB_WHATSAPP_TEXT = "whatsapp_text"
+JOB_WHATSAPP_RECEIPT = "whatsapp_receipt"
+
+JOB_QUEUES = {
+    JOB_TELEGRAM_TEXT: QUEUE_WORKER,
+    JOB_TELEGRAM_RECEIPT: QUEUE_WORKER,
+    JOB_TELEGRAM_EXPORT: QUEUE_EXPORT,
+    JOB_WHATSAPP_TEXT: QUEUE_WORKER,
+    JOB_WHATSAPP_RECEIPT: QUEUE_WORKER,
+}
+
+# Ambil job dengan FOR UPDATE SKIP LOCKED: banyak worker bisa polling
+# bersamaan tanpa mengambil job yang sama.
+# Kolom DateTime Prisma = timestamp tanpa zona (UTC) → bandingkan dengan UTC.
+_CLAIM_SQL = """
+UPDATE jobs
+SET status = 'running', locked_at = timezone('utc', now()), locked_by = $3,
+    attempts = attempts + 1
+WHERE id IN (
+    SELECT id FROM jobs
+    WHERE queue = $1 AND status = 'queued' AND run_at <= timezone('utc', now())
+    ORDER BY id
+    FOR UPDATE SKIP LOCKED
+    LIMIT $2
+)
+RETURNING id, kind, payload, attempts
+"""
+
+# Job yang sudah di-claim JOB_MAX_ATTEMPTS kali tidak di-queue ulang (mis.
+# struk yang selalu membuat worker OOM) → langsung failed.
+_REQUEUE_STALE_SQL = """
+UPDATE jobs
+SET status = CASE WHEN attempts >= $3 THEN 'failed' ELSE 'queued' END,
+    finished_at = CASE WHEN attempts >= $3 THEN timezone('utc', now()) END,
+    last_error = CASE WHEN attempts >= $3 THEN 'stale: worker lost, attempts exhausted'
+                      ELSE last_error END,
+    locked_at = NULL, locked_by = NULL
+WHERE queue = $1 AND status = 'running'
+  AND locked_at < timezone('utc', now()) - ($2::int * interval '1 second')
+"""
+
+
+async def enqueue_job(
+    prisma: Prisma,
+    kind: str,
+    payload: Dict[str, Any],
+) -> int:
+    """Masukkan job ke antrian (queue ditentukan dari kind)."""
+    queue = JOB_QUEUES[kind]
+    with observe(DB_WRITE_DURATION, table="jobs"):
+        job = await prisma.job.create(
+            data={"queue": queue, "kind": kind, "payload": json.dumps(payload)}
+        )
+    _logger.info(f"Job enqueued: {kind} #{job.id} → {queue}")
+    return job.id
+
+
+async def dispatch_job(
+    prisma: Prisma,
+    background_tasks: BackgroundTasks,
+    kind: str,
+    handler: Callable,
+    client: Any,
+    **payload: Any,
+) -> None:
+    """
+    Jalankan handler sesuai role process:
+    - ingest: simpan ke tabel jobs (dikerjakan `python -m worker.runner`)
+    - all: BackgroundTasks di process yang sama
+
+    Payload harus JSON-serializable; http client disediakan oleh runner.
+    """
+    if JOB_QUEUE_ENABLED:
+        await enqueue_job(prisma, kind, payload)
+    else:
+        background_tasks.add_task(handler, client=client, **payload)
+
+
+async def claim_jobs(
+    prisma: Prisma,
+    queue: str,
+    limit: int,
+    worker_id: str,
+) -> List[dict]:
+    """Ambil maksimal `limit` job queued dan tandai running."""
+    if limit <= 0:
+        return []
+
+    rows = await prisma.query_raw(_CLAIM_SQL, queue, limit, worker_id)
+    for row in rows:
+        if isinstance(row["payload"], str):
+            row["payload"] = json.loads(row["payload"])
+    return rows
+
+
+async def complete_job(prisma: Prisma, job_id: int) -> None:
+    with observe(DB_WRITE_DURATION, table="jobs"):
+        await prisma.job.update(
+            where={"id": job_id},
+            data={"status": "done", "finishedAt": _utcnow(), "lockedBy": None},
+        )
+
+
+async def fail_job(
+    prisma: Prisma,
+    job_id: int,
+    error: str,
+    attempts: int,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> None:
+    """Job gagal: queue ulang dengan delay, atau failed jika attempt habis."""
+    data: Dict[str, Any] = {"lastError": error[:2000], "lockedBy": None}
+    if attempts >= max_attempts:
+        data.update({"status": "failed", "finishedAt": _utcnow()})
+    else:
+        data.update({
+            "status": "queued",
+            "runAt": _utcnow(JOB_RETRY_DELAY_SECONDS * attempts),
+        })
+
+    with observe(DB_WRITE_DURATION, table="jobs"):
+        await prisma.job.update(where={"id": job_id}, data=data)
+
+
+async def requeue_stale_jobs(
+    prisma: Prisma,
+    queue: str,
+    timeout_seconds: int = JOB_LOCK_TIMEOUT_SECONDS,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> int:
+    """
+    Kembalikan job running yang worker-nya hilang (crash/kill) ke antrian,
+    atau tandai failed jika attempt sudah habis.
+    """
+    count = await prisma.execute_raw(_REQUEUE_STALE_SQL, queue, timeout_seconds, max_attempts)
+    if count:
+        _logger.warning(f"Recovered {count} stale jobs on queue {queue} (requeued or failed)")
+    return count
+
+
+async def get_queue_depth(prisma: Prisma, queue: Optional[str] = None) -> int:
+    where: Dict[str, Any] = {"status": "queued"}
+    if queue:
+        where["queue"] = queue
+    return await prisma.job.count(where=where)
+
+
+def _utcnow(offset_seconds: int = 0) -> datetime:
+    return datetime.utcnow() + timedelta(seconds=offset_seconds)
@@ -3,11 +3,13 @@
 import asyncio
 import logging
 import mimetypes
+import time
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
-from app.config import WHATSAPP_ACCESS_TOKEN
+from app.config import TELEGRAM_API_URL, WHATSAPP_ACCESS_TOKEN
+from app.utils.metrics import MEDIA_DOWNLOAD_DURATION
 
 import aiofiles
 import httpx
@@ -51,13 +53,14 @@ async def download_telegram_media(
     user_id_value = str(user_id or "anon")
     now = datetime.utcnow()
     timestamp = now.strftime("%Y%m%d%H%M%S")
-    metadata_url = f"https://api.telegram.org/bot{bot_token}/getFile"
+    metadata_url = f"{TELEGRAM_API_URL}/bot{bot_token}/getFile"
     params = {"file_id": file_id}
 
     timeout = httpx.Timeout(10.0, read=30.0)
     
     _logger.info(f"Downloading Telegram media: {file_id}")
     
+    start = time.perf_counter()
     async with httpx.AsyncClient(timeout=timeout) as client:
         # Ambil info file dari Telegram
         metadata_resp = await _get_with_retries(client, metadata_url, params=params)
@@ -75,7 +78,7 @@ async def download_telegram_media(
         file_path = payload["result"]["file_path"]
         
         # Download file dari Telegram
-        download_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+        download_url = f"{TELEGRAM_API_URL}/file/bot{bot_token}/{file_path}"
         unique_id = uuid.uuid4().hex[:8]
         original_name = Path(file_path).name
         ext = Path(file_path).suffix
@@ -91,6 +94,10 @@ async def download_telegram_media(
                 async for chunk in download_resp.aiter_bytes(1024 * 64):
                     await out_file.write(chunk)
 
+    MEDIA_DOWNLOAD_DURATION.labels(platform="telegram").observe(
+        time.perf_counter() - start
+    )
+
     mime_type = _determine_mime_type(destination)
     file_size = destination.stat().st_size
 
@@ -115,6 +122,7 @@ async def download_twilio_media(media_url: str, user_id: Optional[str] = None) -
 
     _logger.info(f"Downloading Twilio media: {media_url}")
 
+    start = time.perf_counter()
     async with httpx.AsyncClient(timeout=timeout) as client:
         response = await client.get(media_url)
         response.raise_for_status()
@@ -130,6 +138,10 @@ async def download_twilio_media(media_url: str, user_id: Optional[str] = None) -
         async with aiofiles.open(destination, "wb") as out_file:
             await out_file.write(response.content)
 
+    MEDIA_DOWNLOAD_DURATION.labels(platform="twilio").observe(
+        time.perf_counter() - start
+    )
+
     detected_mime = _determine_mime_type(destination)
     mime_type = detected_mime or content_type
     file_size = destination.stat().st_size
@@ -158,6 +170,7 @@ async def download_whatsapp_media(
     
     _logger.info(f"Downloading WhatsApp media: {media_id}")
     
+    start = time.perf_counter()
     async with httpx.AsyncClient(timeout=timeout) as client:
         # Ambil URL media dari WhatsApp API
         metadata_url = f"https://graph.facebook.com/v17.0/{media_id}"
@@ -191,6 +204,10 @@ async def download_whatsapp_media(
                 async for chunk in download_resp.aiter_bytes(1024 * 64):
                     await out_file.write(chunk)
     
+    MEDIA_DOWNLOAD_DURATION.labels(platform="whatsapp").observe(
+        time.perf_counter() - start
+    )
+
     # Verifikasi MIME type dari file yang sudah didownload
     detected_mime = _determine_mime_type(destination)
     mime_type = detected_mime if detected_mime != "application/octet-stream" else mime_type_from_api
@@ -244,53 +261,22 @@ def get_mime_type(file_path: str) -> str:
 
 
 async def cleanup_old_files(days: int = 30) -> dict:
-    """Hapus file yang lebih tua dari X hari."""
+    """
+    Hapus file struk yang lebih tua dari X hari.
+
+    File dilacak lewat tabel receipts (bukan scan direktori), lihat
+    `storage_service.purge_expired_receipts`.
+    """
+    from app.db import prisma
+    from app.services.storage_service import purge_expired_receipts
+
     _logger.info(f"Starting cleanup for files older than {days} days")
-    
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    cutoff_timestamp = cutoff_date.timestamp()
-    
-    deleted_count = 0
-    freed_bytes = 0
-    errors = []
-    
-    try:
-        for file_path in UPLOAD_DIR.iterdir():
-            if not file_path.is_file():
-                continue
-            
-            try:
-                # Cek waktu modifikasi file
-                file_mtime = file_path.stat().st_mtime
-                
-                if file_mtime < cutoff_timestamp:
-                    file_size = file_path.stat().st_size
-                    file_path.unlink()
-                    
-                    deleted_count += 1
-                    freed_bytes += file_size
-                    
-                    _logger.debug(f"Deleted: {file_path.name} ({file_size} bytes)")
-                    
-            except Exception as e:
-                error_msg = f"Error deleting {file_path.name}: {str(e)}"
-                _logger.error(error_msg)
-                errors.append(error_msg)
-                
-    except Exception as e:
-        error_msg = f"Error during cleanup: {str(e)}"
-        _logger.error(error_msg)
-        errors.append(error_msg)
-    
-    result = {
-        "deleted_count": deleted_count,
-        "freed_bytes": freed_bytes,
-        "errors": errors,
-    }
-    
+
+    result = await purge_expired_receipts(prisma, max_age_days=days)
+
     _logger.info(
-        f"Cleanup completed: {deleted_count} files deleted, "
-        f"{freed_bytes / 1024 / 1024:.2f} MB freed"
+        f"Cleanup completed: {result['deleted_count']} files deleted, "
+        f"{result['freed_bytes'] / 1024 / 1024:.2f} MB freed"
     )
-    
+
     return result
@@ -7,6 +7,8 @@ from typing import List, Optional
 from prisma import Prisma
 from prisma.models import Receipt
 
+from app.utils.metrics import DB_WRITE_DURATION, observe
+
 _logger = logging.getLogger(__name__)
 
 
@@ -22,15 +24,16 @@ async def create_receipt(
     _logger.info(f"Creating receipt for user {user_id}: {file_name}")
     
     try:
-        receipt = await prisma.receipt.create(
-            data={
-                "userId": user_id,
-                "filePath": file_path,
-                "fileName": file_name,
-                "mimeType": mime_type,
-                "fileSize": file_size,
-            }
-        )
+        with observe(DB_WRITE_DURATION, table="receipts"):
+            receipt = await prisma.receipt.create(
+                data={
+                    "userId": user_id,
+                    "filePath": file_path,
+                    "fileName": file_name,
+                    "mimeType": mime_type,
+                    "fileSize": file_size,
+                }
+            )
         
         _logger.info(f"Receipt created with ID: {receipt.id}")
         return receipt
@@ -0,0 +1,316 @@
+"""Service untuk lifecycle file struk (kompresi, retensi, budget storage)."""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from prisma import Prisma
+
+from app.utils.metrics import DB_WRITE_DURATION, observe
+
+_logger = logging.getLogger(__name__)
+
+# Struk yang sudah di-OCR dikompres setelah umur ini
+COMPRESS_AFTER_HOURS = int(os.getenv("RECEIPT_COMPRESS_AFTER_HOURS", "24"))
+# File struk dihapus setelah umur ini (record DB tetap ada)
+MAX_AGE_DAYS = int(os.getenv("RECEIPT_MAX_AGE_DAYS", "90"))
+# Budget total ukuran file struk yang masih tersimpan
+STORAGE_BUDGET_MB = int(os.getenv("RECEIPT_STORAGE_BUDGET_MB", "1024"))
+# Interval sweep background
+SWEEP_INTERVAL_SECONDS = int(os.getenv("STORAGE_SWEEP_INTERVAL_SECONDS", "3600"))
+SWEEP_BATCH_SIZE = int(os.getenv("STORAGE_SWEEP_BATCH_SIZE", "100"))
+# Advisory lock Postgres: hanya satu process (worker uvicorn / replica) yang sweep.
+# Lock dipegang transaction selama sweep, maksimal timeout ini
+SWEEP_LOCK_KEY = 0x53544F52  # "STOR"
+SWEEP_LOCK_TIMEOUT_SECONDS = int(os.getenv("STORAGE_SWEEP_LOCK_TIMEOUT_SECONDS", "900"))
+
+_SWEEP_LOCK_SQL = "SELECT pg_try_advisory_xact_lock($1) AS locked"
+
+# Thumbnail: webp (default) atau avif (jika Pillow mendukung)
+THUMBNAIL_FORMAT = os.getenv("RECEIPT_THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_MAX_SIDE = int(os.getenv("RECEIPT_THUMBNAIL_MAX_SIDE", "1280"))
+THUMBNAIL_QUALITY = int(os.getenv("RECEIPT_THUMBNAIL_QUALITY", "60"))
+
+STATE_ORIGINAL = "original"
+STATE_COMPRESSED = "compressed"
+STATE_PURGED = "purged"
+# File ada tapi gagal dikompres (rusak / format tidak didukung): tidak
+# diambil sweep kompresi lagi, tetap ikut retensi umur dan budget
+STATE_COMPRESS_FAILED = "compress_failed"
+
+
+def _thumbnail_format() -> str:
+    from PIL import features
+
+    if THUMBNAIL_FORMAT == "avif" and not features.check("avif"):
+        _logger.warning("Pillow tanpa dukungan AVIF, fallback ke WebP")
+        return "webp"
+    return THUMBNAIL_FORMAT
+
+
+def _make_thumbnail(source: Path, fmt: str) -> Tuple[Path, int]:
+    """Transcode image ke thumbnail WebP/AVIF (blocking, jalankan di thread)."""
+    # Import lazy: Pillow baru di-load saat sweep kompresi pertama
+    from PIL import Image, ImageOps
+
+    destination = source.with_name(f"{source.stem}_thumb.{fmt}")
+
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((THUMBNAIL_MAX_SIDE, THUMBNAIL_MAX_SIDE))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(destination, format=fmt.upper(), quality=THUMBNAIL_QUALITY)
+
+    return destination, destination.stat().st_size
+
+
+def _unlink_many(paths: Iterable[str]) -> Tuple[int, List[str]]:
+    """Hapus banyak file sekaligus (blocking, jalankan di thread)."""
+    deleted = 0
+    errors = []
+    for file_path in paths:
+        try:
+            Path(file_path).unlink(missing_ok=True)
+            deleted += 1
+        except OSError as e:
+            errors.append(f"Error deleting {file_path}: {e}")
+    return deleted, errors
+
+
+async def _mark_receipt(prisma: Prisma, receipt_id: int, state: str, **data) -> None:
+    with observe(DB_WRITE_DURATION, table="receipts"):
+        await prisma.receipt.update(
+            where={"id": receipt_id},
+            data={**data, "storageState": state, "storageUpdatedAt": datetime.utcnow()},
+        )
+
+
+async def compress_processed_receipts(
+    prisma: Prisma,
+    older_than_hours: int = COMPRESS_AFTER_HOURS,
+    batch_size: int = SWEEP_BATCH_SIZE,
+) -> dict:
+    """
+    Kompres struk yang OCR-nya sudah selesai menjadi thumbnail.
+
+    Receipt yang gagal tidak tetap "original" (batch berikutnya akan
+    mengambil baris gagal yang sama lagi): file hilang → purged, gagal
+    transcode → compress_failed.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+    fmt = _thumbnail_format()
+
+    receipts = await prisma.receipt.find_many(
+        where={
+            "storageState": STATE_ORIGINAL,
+            "uploadedAt": {"lt": cutoff},
+            "mimeType": {"startswith": "image/"},
+            "ocrTexts": {"some": {}},
+        },
+        order={"uploadedAt": "asc"},
+        take=batch_size,
+    )
+
+    compressed = 0
+    saved_bytes = 0
+    errors = []
+
+    for receipt in receipts:
+        source = Path(receipt.filePath)
+        try:
+            destination, new_size = await asyncio.to_thread(_make_thumbnail, source, fmt)
+            await asyncio.to_thread(source.unlink, True)
+        except FileNotFoundError:
+            _logger.warning(f"Receipt {receipt.id} file missing ({source}), marked purged")
+            await _mark_receipt(prisma, receipt.id, STATE_PURGED, fileSize=0)
+            continue
+        except Exception as e:
+            error_msg = f"Error compressing receipt {receipt.id}: {e}"
+            _logger.error(error_msg)
+            errors.append(error_msg)
+            await _mark_receipt(prisma, receipt.id, STATE_COMPRESS_FAILED)
+            continue
+
+        await _mark_receipt(
+            prisma,
+            receipt.id,
+            STATE_COMPRESSED,
+            filePath=destination.as_posix(),
+            mimeType=f"image/{fmt}",
+            fileSize=new_size,
+        )
+
+        compressed += 1
+        saved_bytes += max(0, receipt.fileSize - new_size)
+
+    return {"compressed": compressed, "saved_bytes": saved_bytes, "errors": errors}
+
+
+async def _purge_batch(prisma: Prisma, receipts: list) -> Tuple[int, int, List[str]]:
+    """Hapus file satu batch receipt lalu tandai purged dengan satu update_many."""
+    if not receipts:
+        return 0, 0, []
+
+    deleted, errors = await asyncio.to_thread(
+        _unlink_many, [r.filePath for r in receipts]
+    )
+
+    with observe(DB_WRITE_DURATION, table="receipts"):
+        await prisma.receipt.update_many(
+            where={"id": {"in": [r.id for r in receipts]}},
+            data={
+                "storageState": STATE_PURGED,
+                "storageUpdatedAt": datetime.utcnow(),
+                "fileSize": 0,
+            },
+        )
+
+    return deleted, sum(r.fileSize for r in receipts), errors
+
+
+async def purge_expired_receipts(
+    prisma: Prisma,
+    max_age_days: int = MAX_AGE_DAYS,
+    batch_size: int = SWEEP_BATCH_SIZE,
+) -> dict:
+    """Hapus file struk yang melewati umur retensi (per batch)."""
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+
+    deleted_count = 0
+    freed_bytes = 0
+    errors: List[str] = []
+
+    while True:
+        receipts = await prisma.receipt.find_many(
+            where={"storageState": {"not": STATE_PURGED}, "uploadedAt": {"lt": cutoff}},
+            order={"uploadedAt": "asc"},
+            take=batch_size,
+        )
+        if not receipts:
+            break
+
+        deleted, freed, batch_errors = await _purge_batch(prisma, receipts)
+        deleted_count += deleted
+        freed_bytes += freed
+        errors.extend(batch_errors)
+
+    return {"deleted_count": deleted_count, "freed_bytes": freed_bytes, "errors": errors}
+
+
+async def get_storage_usage(prisma: Prisma) -> int:
+    """Total ukuran file struk yang masih tersimpan (dari tabel receipts)."""
+    rows = await prisma.query_raw(
+        "SELECT COALESCE(SUM(file_size), 0)::bigint AS total "
+        "FROM receipts WHERE storage_state <> $1",
+        STATE_PURGED,
+    )
+    return int(rows[0]["total"]) if rows else 0
+
+
+async def enforce_storage_budget(
+    prisma: Prisma,
+    budget_mb: int = STORAGE_BUDGET_MB,
+    batch_size: int = SWEEP_BATCH_SIZE,
+) -> dict:
+    """Hapus file struk tertua sampai total ukuran di bawah budget."""
+    budget_bytes = budget_mb * 1024 * 1024
+    usage = await get_storage_usage(prisma)
+
+    deleted_count = 0
+    freed_bytes = 0
+    errors: List[str] = []
+
+    while usage > budget_bytes:
+        receipts = await prisma.receipt.find_many(
+            where={"storageState": {"not": STATE_PURGED}},
+            order={"uploadedAt": "asc"},
+            take=batch_size,
+        )
+        if not receipts:
+            break
+
+        # Ambil secukupnya dari batch tertua agar kembali di bawah budget
+        selected = []
+        to_free = usage - budget_bytes
+        for receipt in receipts:
+            selected.append(receipt)
+            to_free -= receipt.fileSize
+            if to_free <= 0:
+                break
+
+        deleted, freed, batch_errors = await _purge_batch(prisma, selected)
+        deleted_count += deleted
+        freed_bytes += freed
+        errors.extend(batch_errors)
+        usage -= freed
+
+    return {
+        "deleted_count": deleted_count,
+        "freed_bytes": freed_bytes,
+        "usage_bytes": usage,
+        "errors": errors,
+    }
+
+
+async def run_storage_sweep(prisma: Prisma) -> dict:
+    """Satu putaran lifecycle: kompresi → retensi umur → budget ukuran."""
+    compress_result = await compress_processed_receipts(prisma)
+    expired_result = await purge_expired_receipts(prisma)
+    budget_result = await enforce_storage_budget(prisma)
+
+    result = {
+        "compressed": compress_result["compressed"],
+        "compress_saved_bytes": compress_result["saved_bytes"],
+        "expired_deleted": expired_result["deleted_count"],
+        "budget_deleted": budget_result["deleted_count"],
+        "freed_bytes": expired_result["freed_bytes"] + budget_result["freed_bytes"],
+        "usage_bytes": budget_result["usage_bytes"],
+        "errors": compress_result["errors"] + expired_result["errors"] + budget_result["errors"],
+    }
+
+    _logger.info(
+        f"Storage sweep: {result['compressed']} compressed, "
+        f"{result['expired_deleted'] + result['budget_deleted']} purged, "
+        f"usage {result['usage_bytes'] / 1024 / 1024:.2f} MB"
+    )
+    return result
+
+
+async def run_storage_sweep_locked(prisma: Prisma) -> Optional[dict]:
+    """
+    `run_storage_sweep` di bawah advisory lock; None jika process lain
+    sedang sweep.
+
+    Lock transaction-level (bukan session): dengan connection pool Prisma,
+    lock/unlock session bisa jatuh ke koneksi berbeda. Transaction hanya
+    menahan satu koneksi, query sweep sendiri tetap lewat pool.
+    """
+    async with prisma.tx(timeout=timedelta(seconds=SWEEP_LOCK_TIMEOUT_SECONDS)) as tx:
+        rows = await tx.query_raw(_SWEEP_LOCK_SQL, SWEEP_LOCK_KEY)
+        if not rows or not rows[0]["locked"]:
+            _logger.info("Storage sweep skipped: another process holds the sweep lock")
+            return None
+        return await run_storage_sweep(prisma)
+
+
+async def storage_manager_loop(
+    prisma: Prisma,
+    interval_seconds: Optional[int] = None,
+) -> None:
+    """Loop background untuk lifespan app (dibatalkan saat shutdown)."""
+    interval = interval_seconds or SWEEP_INTERVAL_SECONDS
+    _logger.info(f"Storage manager started (interval={interval}s)")
+
+    while True:
+        try:
+            await run_storage_sweep_locked(prisma)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _logger.error(f"Storage sweep failed: {e}", exc_info=True)
+
+        await asyncio.sleep(interval)
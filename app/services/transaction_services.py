@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Tuple, Optional
 
-import pandas as pd
 from prisma import Prisma
 from prisma.models import Transaction
 
@@ -107,6 +106,9 @@ async def create_excel_report(
             }
         )
 
+    # Import lazy: pandas + openpyxl hanya dibutuhkan saat export
+    import pandas as pd
+
     df = pd.DataFrame(rows)
 
     EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
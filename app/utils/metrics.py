@@ -0,0 +1,223 @@
+"""
+Prometheus metrics untuk pipeline bot.
+
+Semua histogram/counter didefinisikan di sini supaya webhook (app) dan
+worker (OCR/LLM/DB) memakai registry yang sama, lalu di-expose lewat
+endpoint /metrics di app.main (role worker / export: HTTP server
+METRICS_PORT di worker.runner).
+
+Registry per process: uvicorn dijalankan dengan satu worker per process
+(scale dengan menambah process/container), bukan --workers > 1.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Bucket untuk stage yang lambat (OCR, LLM) - bisa sampai puluhan detik
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+WEBHOOK_DURATION = Histogram(
+    "finance_webhook_duration_seconds",
+    "Durasi handling webhook (sampai response dikirim)",
+    ["platform", "kind"],
+)
+
+MEDIA_DOWNLOAD_DURATION = Histogram(
+    "finance_media_download_duration_seconds",
+    "Durasi download media dari Telegram/WhatsApp",
+    ["platform"],
+    buckets=SLOW_BUCKETS,
+)
+
+BOT_API_DURATION = Histogram(
+    "finance_bot_api_duration_seconds",
+    "Durasi call keluar ke Bot API (sendMessage, sendDocument, dll)",
+    ["platform", "method"],
+)
+
+PREPROCESS_STAGE_DURATION = Histogram(
+    "finance_preprocess_stage_duration_seconds",
+    "Durasi tiap stage ImagePreprocessor",
+    ["stage"],
+)
+
+IMAGE_QUALITY_DURATION = Histogram(
+    "finance_image_quality_duration_seconds",
+    "Durasi quality gate foto struk (sebelum preprocess)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1),
+)
+
+IMAGE_QUALITY_CHECKS = Counter(
+    "finance_image_quality_checks_total",
+    "Hasil quality gate foto struk (accepted / alasan penolakan)",
+    ["result"],
+)
+
+IMAGE_QUALITY_SAVED_SECONDS = Counter(
+    "finance_image_quality_saved_seconds_total",
+    "Estimasi waktu preprocess + OCR yang dihemat karena foto ditolak",
+)
+
+DOCUMENT_PAGE_DURATION = Histogram(
+    "finance_document_page_duration_seconds",
+    "Durasi ekstraksi teks per halaman PDF (text layer / render + OCR)",
+    ["source"],
+    buckets=SLOW_BUCKETS,
+)
+
+DOCUMENT_PAGES = Counter(
+    "finance_document_pages_total",
+    "Jumlah halaman PDF yang diproses per sumber teks (text_layer / ocr)",
+    ["source"],
+)
+
+OCR_ATTEMPT_DURATION = Histogram(
+    "finance_ocr_attempt_duration_seconds",
+    "Durasi tiap percobaan Tesseract per PSM",
+    ["psm"],
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_CALL_DURATION = Histogram(
+    "finance_llm_call_duration_seconds",
+    "Durasi call LLM (termasuk retry)",
+    ["model"],
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "finance_llm_time_to_first_token_seconds",
+    "Waktu sampai token pertama pada call LLM streaming",
+    ["model"],
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_TIME_TO_JSON = Histogram(
+    "finance_llm_time_to_json_seconds",
+    "Waktu sampai blok JSON output LLM lengkap (stream ditutup)",
+    ["model"],
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "finance_llm_tokens_total",
+    "Jumlah token LLM dari field usage",
+    ["model", "kind"],
+)
+
+PARSE_DURATION = Histogram(
+    "finance_parse_duration_seconds",
+    "Durasi parsing output LLM",
+    ["source"],
+)
+
+DB_WRITE_DURATION = Histogram(
+    "finance_db_write_duration_seconds",
+    "Durasi tiap write ke database",
+    ["table"],
+)
+
+LLM_BREAKER_STATE = Gauge(
+    "finance_llm_breaker_state",
+    "State circuit breaker LLM per model (0=closed, 1=half_open, 2=open)",
+    ["model"],
+)
+
+LLM_ESCALATIONS = Counter(
+    "finance_llm_escalations_total",
+    "Jumlah call LLM yang dieskalasi ke model lebih besar",
+    ["from_model", "to_model", "reason"],
+)
+
+LLM_PARSE_ATTEMPTS = Counter(
+    "finance_llm_parse_attempts_total",
+    "Validasi output LLM per tahap (primary / repair / escalation)",
+    ["source", "stage", "result"],
+)
+
+LLM_RETRY_TOKENS = Counter(
+    "finance_llm_retry_tokens_total",
+    "Token yang dipakai call tambahan karena output gagal / lemah",
+    ["source", "kind"],
+)
+
+LLM_RATE_LIMITED = Counter(
+    "finance_llm_rate_limited_total",
+    "Jumlah response 429 dari provider LLM",
+    ["model"],
+)
+
+LLM_LIMITER_WAIT = Histogram(
+    "finance_llm_limiter_wait_seconds",
+    "Lama request LLM menunggu di token bucket (RPM/TPM)",
+    buckets=SLOW_BUCKETS,
+)
+
+LLM_FALLBACK = Counter(
+    "finance_llm_fallback_total",
+    "Jumlah pesan yang dialihkan ke parser rule-based karena LLM tidak tersedia",
+    ["input_source", "reason"],
+)
+
+CATEGORY_CACHE_LOOKUPS = Counter(
+    "finance_category_cache_lookups_total",
+    "Lookup cache kategori per user (exact / similar / miss)",
+    ["result"],
+)
+
+CATEGORY_CACHE_ENTRIES = Gauge(
+    "finance_category_cache_entries",
+    "Jumlah note di cache kategori (semua user)",
+)
+
+JOB_QUEUE_DEPTH = Gauge(
+    "finance_job_queue_depth",
+    "Jumlah job queued di tabel jobs per antrian (worker / export)",
+    ["queue"],
+)
+
+FAILURES = Counter(
+    "finance_pipeline_failures_total",
+    "Jumlah kegagalan pipeline per stage dan tipe exception",
+    ["stage", "exception"],
+)
+
+
+def record_failure(stage: str, exc: BaseException) -> None:
+    """Catat kegagalan pada stage tertentu berdasarkan tipe exception."""
+    FAILURES.labels(stage=stage, exception=type(exc).__name__).inc()
+
+
+def record_llm_usage(model: str, usage: Any) -> None:
+    """Tambah counter token dari objek `usage` response Groq."""
+    if usage is None:
+        return
+
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS.labels(model=model, kind=kind).inc(value)
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Context manager untuk mengukur durasi blok ke histogram berlabel."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render semua metrics dalam format teks Prometheus."""
+    return generate_latest(), CONTENT_TYPE_LATEST
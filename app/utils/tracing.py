@@ -0,0 +1,180 @@
+"""
+Tracing ringan untuk pipeline webhook → OCR → LLM → transaksi.
+
+Setiap update yang masuk mendapat trace ID (disimpan di contextvar
+sehingga ikut terbawa ke coroutine/background task), lalu tiap stage
+dicatat sebagai span dengan durasi. Span dikirim ke file JSONL lokal
+atau ke OpenTelemetry (jika terinstall), diatur lewat env:
+
+- TRACE_EXPORTER: "none" (default), "jsonl", atau "otel"
+- TRACE_FILE: path file JSONL (default: logs/traces.jsonl)
+- TRACE_FILE_MAX_MB / TRACE_FILE_BACKUPS: rotasi file JSONL
+- TRACE_QUEUE_SIZE: antrean span yang belum ditulis (penuh → span dibuang)
+
+Exporter JSONL tidak menulis file dari event loop: span masuk antrean
+terbatas dan ditulis thread background (QueueListener + RotatingFileHandler).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = Path(os.getenv("TRACE_FILE", "logs/traces.jsonl"))
+TRACE_FILE_MAX_MB = int(os.getenv("TRACE_FILE_MAX_MB", "50"))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_span_id: ContextVar[Optional[str]] = ContextVar("span_id", default=None)
+
+_write_lock = threading.Lock()
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_listener: Optional[QueueListener] = None
+_dropped = 0
+_otel_tracer = None
+
+if TRACE_EXPORTER == "otel":
+    try:
+        from opentelemetry import trace as otel_trace
+
+        _otel_tracer = otel_trace.get_tracer("finance-bot")
+    except ImportError:
+        logger.warning("opentelemetry tidak terinstall, fallback ke exporter jsonl")
+        TRACE_EXPORTER = "jsonl"
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """
+    Mulai (atau lanjutkan) trace di context saat ini.
+
+    Args:
+        trace_id: Trace ID yang sudah ada (mis. dari webhook), None = buat baru
+
+    Returns:
+        Trace ID yang aktif
+    """
+    if trace_id and trace_id == _trace_id.get():
+        return trace_id
+
+    trace_id = trace_id or uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    _span_id.set(None)
+    return trace_id
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID aktif di context saat ini (None jika belum ada trace)."""
+    return _trace_id.get()
+
+
+def _start_listener() -> None:
+    """Thread penulis file JSONL (dibuat saat span pertama)."""
+    global _listener
+    with _write_lock:
+        if _listener is not None:
+            return
+        TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            TRACE_FILE,
+            maxBytes=TRACE_FILE_MAX_MB * 1024 * 1024,
+            backupCount=TRACE_FILE_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _listener = QueueListener(_queue, handler)
+        _listener.start()
+        # Flush sisa antrean saat process berhenti
+        atexit.register(_listener.stop)
+
+
+def _export(record: Dict[str, Any]) -> None:
+    """Antrekan satu span untuk ditulis ke file JSONL (non-blocking)."""
+    global _dropped
+    try:
+        if _listener is None:
+            _start_listener()
+        line = json.dumps(record, default=str)
+        _queue.put_nowait(logging.makeLogRecord({"msg": line}))
+    except queue.Full:
+        _dropped += 1
+        if _dropped % 1000 == 1:
+            logger.warning(f"Antrean trace penuh, {_dropped} span dibuang")
+    except Exception as e:
+        logger.warning(f"Gagal menulis span ke {TRACE_FILE}: {e}")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Catat satu stage pipeline sebagai span.
+
+    Bisa dipakai di kode sync maupun async (di sekitar `await`).
+    Attribute tambahan bisa diisi lewat dict yang di-yield.
+
+    Contoh:
+        with span("ocr", receipt_id=12) as attrs:
+            text, meta = engine.extract_text(img)
+            attrs["confidence"] = meta["confidence"]
+    """
+    if TRACE_EXPORTER == "none":
+        yield attributes
+        return
+
+    trace_id = _trace_id.get() or start_trace()
+    parent_id = _span_id.get()
+    span_id = uuid.uuid4().hex[:16]
+    token = _span_id.set(span_id)
+
+    status = "ok"
+    error = None
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+
+    otel_cm = None
+    if _otel_tracer is not None:
+        otel_cm = _otel_tracer.start_as_current_span(name)
+        otel_span = otel_cm.__enter__()
+        otel_span.set_attribute("finance.trace_id", trace_id)
+
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "error"
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _span_id.reset(token)
+
+        if otel_cm is not None:
+            for key, value in attributes.items():
+                if isinstance(value, (str, int, float, bool)):
+                    otel_span.set_attribute(key, value)
+            otel_span.set_attribute("finance.status", status)
+            otel_cm.__exit__(None, None, None)
+        else:
+            _export({
+                "trace_id": trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": name,
+                "start": started_at.isoformat(),
+                "duration_ms": round(duration_ms, 2),
+                "status": status,
+                "error": error,
+                "attributes": attributes,
+            })
@@ -1,11 +1,19 @@
 import os
+import time
 import httpx
 from fastapi import APIRouter, Request, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
 from app.config import BOT_TOKEN, TELEGRAM_API_URL
 from app.services import user_service, media_service, receipt_service
 from app.db import prisma 
-from worker import process_text_message, process_image_message
+import worker  # lazy: worker_main baru di-load saat pesan pertama diproses
+from app.utils.metrics import (
+    BOT_API_DURATION,
+    WEBHOOK_DURATION,
+    observe,
+    record_failure,
+)
+from app.utils.tracing import span, start_trace
 from app.services import (
     user_service,
     media_service,
@@ -14,6 +22,17 @@ from app.services import (
     build_history_summary,
     create_excel_report,
 )
+from app.services.job_queue import (
+    JOB_QUEUE_ENABLED,
+    JOB_TELEGRAM_EXPORT,
+    JOB_TELEGRAM_RECEIPT,
+    JOB_TELEGRAM_TEXT,
+    dispatch_job,
+    enqueue_job,
+)
+
+# Ditambahkan ke balasan jika transaksi dicatat lewat parser fallback (LLM tidak tersedia)
+NEEDS_REVIEW_NOTE = "⚠️ Dicatat otomatis tanpa AI (layanan sedang sibuk), mohon cek kembali."
 
 HELP_TEXT = (
     "Selamat datang di Slip Ku \n\n"
@@ -41,9 +60,11 @@ async def send_telegram_message(chat_id: int, text: str, client: httpx.AsyncClie
         url = f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}/sendMessage"
         payload = {"chat_id": chat_id, "text": text}
 
-        response = await client.post(url, json=payload)
+        with observe(BOT_API_DURATION, platform="telegram", method="sendMessage"):
+            response = await client.post(url, json=payload)
         response.raise_for_status()
     except Exception as e:
+        record_failure("telegram_send", e)
         print(f"Error sending Telegram message: {str(e)}")
 
 def detect_special_intent(text: str) -> tuple[str | None, str | None, str | None]:
@@ -283,7 +304,11 @@ async def handle_text_message(
     chat_id: int,
     text: str,
     client: httpx.AsyncClient,
+    trace_id: str | None = None,
+    raise_errors: bool = False,
+    notify_errors: bool = True,
 ):
+    start_trace(trace_id)
     try:
         clean = text.strip()
         intent, period, direction = detect_special_intent(clean)
@@ -389,10 +414,11 @@ async def handle_text_message(
             return
 
         # 7) Bukan command -> anggap sebagai teks transaksi biasa
-        result = await process_text_message(
+        result = await worker.process_text_message(
             user_id=user_id,
             text=text,
             source="telegram",
+            raise_errors=raise_errors,
         )
 
         if not result:
@@ -408,6 +434,15 @@ async def handle_text_message(
         direction = result.get("direction")
         intent = result.get("intent")
 
+        transactions = result.get("transactions")
+        if transactions:
+            lines = [f"{len(transactions)} transaksi berhasil dicatat."]
+            for tx in transactions:
+                lines.append(f"• Rp {tx['amount']:,.0f} [{tx['category']}] {tx.get('note') or ''}".rstrip())
+            lines.append(f"Total: Rp {amount:,.0f}")
+            await send_telegram_message(chat_id, "\n".join(lines), client)
+            return
+
         lines = ["Transaksi berhasil dicatat."]
         if amount is not None:
             lines.append(f"• Jumlah: Rp {amount:,.0f}")
@@ -417,6 +452,8 @@ async def handle_text_message(
             lines.append(f"• Tipe: {direction}")
         if intent:
             lines.append(f"• Intent: {intent}")
+        if result.get("needsReview"):
+            lines.append(NEEDS_REVIEW_NOTE)
 
         await send_telegram_message(
             chat_id,
@@ -426,11 +463,14 @@ async def handle_text_message(
 
     except Exception as e:
         print(f"Error in handle_text_message: {e}")
-        await send_telegram_message(
-            chat_id,
-            "Terjadi error saat memproses transaksi. Coba lagi nanti.",
-            client,
-        )
+        if notify_errors:
+            await send_telegram_message(
+                chat_id,
+                "Terjadi error saat memproses transaksi. Coba lagi nanti.",
+                client,
+            )
+        if raise_errors:
+            raise
 
 async def send_telegram_document(
     chat_id: int,
@@ -443,9 +483,11 @@ async def send_telegram_document(
         with open(file_path, "rb") as f:
             files = {"document": ("report.xlsx", f)}
             data = {"chat_id": chat_id, "caption": caption}
-            response = await client.post(url, data=data, files=files)
+            with observe(BOT_API_DURATION, platform="telegram", method="sendDocument"):
+                response = await client.post(url, data=data, files=files)
             response.raise_for_status()
     except Exception as e:
+        record_failure("telegram_send", e)
         print(f"Error sending Telegram document: {str(e)}")
 
 async def process_receipt_background(
@@ -454,15 +496,21 @@ async def process_receipt_background(
     receipt_id: int,
     file_path: str,
     client: httpx.AsyncClient,
+    trace_id: str | None = None,
+    raise_errors: bool = False,
+    notify_errors: bool = True,
 ):
     """Proses struk di worker lalu kirim ringkasan transaksi ke Telegram."""
+    start_trace(trace_id)
     try:
-        result = await process_image_message(
-            user_id=user_id,
-            receipt_id=receipt_id,
-            file_path=file_path,
-            source="telegram",
-        )
+        with span("process_receipt_background", receipt_id=receipt_id):
+            result = await worker.process_image_message(
+                user_id=user_id,
+                receipt_id=receipt_id,
+                file_path=file_path,
+                source="telegram",
+                raise_errors=raise_errors,
+            )
 
         if not result:
             await send_telegram_message(
@@ -472,6 +520,11 @@ async def process_receipt_background(
             )
             return
 
+        if result.get("rejected"):
+            # Ditolak quality gate sebelum OCR: kirim hint spesifik
+            await send_telegram_message(chat_id, f"📷 {result['hint']}", client)
+            return
+
         amount = result.get("amount")
         category = result.get("category")
         direction = result.get("direction")
@@ -483,6 +536,8 @@ async def process_receipt_background(
             lines.append(f"• Kategori: {category}")
         if direction:
             lines.append(f"• Tipe: {direction}")
+        if result.get("needsReview"):
+            lines.append(NEEDS_REVIEW_NOTE)
 
         await send_telegram_message(
             chat_id,
@@ -492,143 +547,191 @@ async def process_receipt_background(
 
     except Exception as e:
         print(f"Error in process_receipt_background: {e}")
-        await send_telegram_message(
-            chat_id,
-            "Terjadi error saat memproses struk. Coba lagi nanti.",
-            client,
-        )
+        if notify_errors:
+            await send_telegram_message(
+                chat_id,
+                "Terjadi error saat memproses struk. Coba lagi nanti.",
+                client,
+            )
+        if raise_errors:
+            raise
 
 @router.post("/tg_webhook")
 async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
-    try:
-        body = await request.json()
-
-        client: httpx.AsyncClient = request.app.state.http_client
-
-        message = body.get("message")
-        if not message:
-            raise HTTPException(status_code=400, detail="No message in update")
-
-        from_data = message.get("from", {})
-        user_id = from_data.get("id")
-        username = from_data.get("username")
-        display_name = from_data.get("first_name", "")
-        message_id = message.get("message_id")
-        chat_id = message.get("chat", {}).get("id")
-        text = message.get("text")
-        photos = message.get("photo")
-        document = message.get("document")
-
-        user = await user_service.get_or_create_user(
-            prisma=prisma,
-            user_id=user_id,
-            username=username,
-            display_name=display_name,
-            source="telegram"
-        )
+    start = time.perf_counter()
+    kind = "ignored"
+    trace_id = start_trace()
+    with span("telegram_webhook") as trace_attrs:
+        try:
+            body = await request.json()
+
+            client: httpx.AsyncClient = request.app.state.http_client
+
+            message = body.get("message")
+            if not message:
+                raise HTTPException(status_code=400, detail="No message in update")
+
+            from_data = message.get("from", {})
+            user_id = from_data.get("id")
+            username = from_data.get("username")
+            display_name = from_data.get("first_name", "")
+            message_id = message.get("message_id")
+            chat_id = message.get("chat", {}).get("id")
+            text = message.get("text")
+            photos = message.get("photo")
+            document = message.get("document")
+
+            user = await user_service.get_or_create_user(
+                prisma=prisma,
+                user_id=user_id,
+                username=username,
+                display_name=display_name,
+                source="telegram"
+            )
         
-        if document:
-            file_id = document.get("file_id")
-            file_name = document.get("file_name", "document")
+            if document:
+                kind = "document"
+                file_id = document.get("file_id")
+                file_name = document.get("file_name", "document")
             
-            media_info = await media_service.download_telegram_media(
-                file_id=file_id,
-                bot_token=BOT_TOKEN
-            )
+                with span("media_download", platform="telegram"):
+                    media_info = await media_service.download_telegram_media(
+                        file_id=file_id,
+                        bot_token=BOT_TOKEN
+                    )
             
-            receipt = await receipt_service.create_receipt(
-                prisma=prisma,
-                user_id=user.id,
-                file_path=media_info["file_path"],
-                file_name=media_info["file_name"],
-                mime_type=media_info["mime_type"],
-                file_size=media_info["file_size"]
-            )
+                with span("create_receipt"):
+                    receipt = await receipt_service.create_receipt(
+                        prisma=prisma,
+                        user_id=user.id,
+                        file_path=media_info["file_path"],
+                        file_name=media_info["file_name"],
+                        mime_type=media_info["mime_type"],
+                        file_size=media_info["file_size"]
+                    )
             
-            # Balasan cepat
-            await send_telegram_message(chat_id, "Dokumen diterima. Sedang diproses.", client)
-            print(f"Document processed - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}")
-
-            # Proses OCR + transaksi di background lalu kirim ringkasan ke user
-            background_tasks.add_task(
-                process_receipt_background,
-                user.id,
-                chat_id,
-                receipt.id,
-                media_info["file_path"],
-                client,
-            )
+                # Balasan cepat
+                await send_telegram_message(chat_id, "Dokumen diterima. Sedang diproses.", client)
+                print(f"Document processed - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}")
+
+                # Proses OCR + transaksi di background lalu kirim ringkasan ke user
+                await dispatch_job(
+                    prisma,
+                    background_tasks,
+                    JOB_TELEGRAM_RECEIPT,
+                    process_receipt_background,
+                    client,
+                    user_id=user.id,
+                    chat_id=chat_id,
+                    receipt_id=receipt.id,
+                    file_path=media_info["file_path"],
+                    trace_id=trace_id,
+                )
             
-            return JSONResponse(status_code=200, content={"status": "document_processed"})
+                return JSONResponse(status_code=200, content={"status": "document_processed"})
         
-        if photos:
-            highest = photos[-1]
-            file_id = highest.get("file_id")
-
-            media_info = await media_service.download_telegram_media(
-                file_id=file_id,
-                bot_token=BOT_TOKEN
-            )
-
-            receipt = await receipt_service.create_receipt(
-                prisma=prisma,
-                user_id=user.id,
-                file_path=media_info["file_path"],
-                file_name=media_info["file_name"],
-                mime_type=media_info["mime_type"],
-                file_size=media_info["file_size"]
-            )
-
-            # Balasan cepat
-            await send_telegram_message(chat_id, "Foto struk diterima. Sedang diproses.", client)
-            print(f"Photo processed - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}")
-
-            # Proses OCR + transaksi di background lalu kirim ringkasan ke user
-            background_tasks.add_task(
-                process_receipt_background,
-                user.id,
-                chat_id,
-                receipt.id,
-                media_info["file_path"],
-                client,
-            )
+            if photos:
+                kind = "photo"
+                highest = photos[-1]
+                file_id = highest.get("file_id")
+
+                with span("media_download", platform="telegram"):
+                    media_info = await media_service.download_telegram_media(
+                        file_id=file_id,
+                        bot_token=BOT_TOKEN
+                    )
+
+                with span("create_receipt"):
+                    receipt = await receipt_service.create_receipt(
+                        prisma=prisma,
+                        user_id=user.id,
+                        file_path=media_info["file_path"],
+                        file_name=media_info["file_name"],
+                        mime_type=media_info["mime_type"],
+                        file_size=media_info["file_size"]
+                    )
+
+                # Balasan cepat
+                await send_telegram_message(chat_id, "Foto struk diterima. Sedang diproses.", client)
+                print(f"Photo processed - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}")
+
+                # Proses OCR + transaksi di background lalu kirim ringkasan ke user
+                await dispatch_job(
+                    prisma,
+                    background_tasks,
+                    JOB_TELEGRAM_RECEIPT,
+                    process_receipt_background,
+                    client,
+                    user_id=user.id,
+                    chat_id=chat_id,
+                    receipt_id=receipt.id,
+                    file_path=media_info["file_path"],
+                    trace_id=trace_id,
+                )
 
-            return JSONResponse(status_code=200, content={"status": "photo_processed"})
+                return JSONResponse(status_code=200, content={"status": "photo_processed"})
         
-        if text:
-            print(f"Text message - User: {user.id}, Message: {message_id}, Content: {text[:50]}")
-
-            intent, period, direction = detect_special_intent(text)
-            if intent in ("help", "history", "export"):
-                await handle_text_message(
-                    user.id,
-                    chat_id,
-                    text,
+            if text:
+                kind = "text"
+                print(f"Text message - User: {user.id}, Message: {message_id}, Content: {text[:50]}")
+
+                intent, period, direction = detect_special_intent(text)
+
+                # Role ingest: export Excel dikerjakan role export (pandas tidak di-load di sini)
+                if intent == "export" and JOB_QUEUE_ENABLED:
+                    kind = "command"
+                    await send_telegram_message(chat_id, "Laporan sedang disiapkan.", client)
+                    await enqueue_job(
+                        prisma,
+                        JOB_TELEGRAM_EXPORT,
+                        {"user_id": user.id, "chat_id": chat_id, "text": text, "trace_id": trace_id},
+                    )
+                    return JSONResponse(status_code=200, content={"status": "export_queued"})
+
+                if intent in ("help", "history", "export"):
+                    kind = "command"
+                    await handle_text_message(
+                        user.id,
+                        chat_id,
+                        text,
+                        client,
+                        trace_id,
+                    )
+
+                    return JSONResponse(status_code=200, content={"status": "command_processed"})
+
+                await send_telegram_message(chat_id, "Pesan diterima. Sedang diproses.", client)
+
+                await dispatch_job(
+                    prisma,
+                    background_tasks,
+                    JOB_TELEGRAM_TEXT,
+                    handle_text_message,
                     client,
+                    user_id=user.id,
+                    chat_id=chat_id,
+                    text=text,
+                    trace_id=trace_id,
                 )
 
-                return JSONResponse(status_code=200, content={"status": "command_processed"})
+                return JSONResponse(status_code=200, content={"status": "text_processed"})
 
-            await send_telegram_message(chat_id, "Pesan diterima. Sedang diproses.", client)
+            return JSONResponse(status_code=200, content={"status": "ignored"})
 
-            background_tasks.add_task(
-                handle_text_message,
-                user.id,
-                chat_id,
-                text,
-                client,
-            )
+        except Exception as e:
+            kind = "error"
+            record_failure("telegram_webhook", e)
+            print(f"Telegram Webhook Error: {str(e)}")
+            import traceback
+            traceback.print_exc()
 
-            return JSONResponse(status_code=200, content={"status": "text_processed"})
-
-        return JSONResponse(status_code=200, content={"status": "ignored"})
+            return JSONResponse(
+                status_code=200,
+                content={"status": "error_handled", "error": str(e)}
+            )
 
-    except Exception as e:
-        print(f"Telegram Webhook Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        return JSONResponse(
-            status_code=200,
-            content={"status": "error_handled", "error": str(e)}
-        )
\ No newline at end of file
+        finally:
+            trace_attrs["kind"] = kind
+            WEBHOOK_DURATION.labels(platform="telegram", kind=kind).observe(
+                time.perf_counter() - start
+            )
\ No newline at end of file
@@ -1,3 +1,5 @@
+import time
+
 import httpx
 from fastapi import APIRouter, Request, Query, BackgroundTasks, HTTPException
 from fastapi.responses import PlainTextResponse, JSONResponse
@@ -15,9 +17,16 @@ from app.services import (
     get_transactions_for_period,
     build_history_summary,
 )
+from app.services.job_queue import (
+    JOB_WHATSAPP_RECEIPT,
+    JOB_WHATSAPP_TEXT,
+    dispatch_job,
+)
 from app.utils.helpers import parse_phone_number
-from worker import process_text_message, process_image_message
-from app.webhook.telegram import HELP_TEXT, detect_special_intent
+import worker  # lazy: worker_main baru di-load saat pesan pertama diproses
+from app.utils.metrics import WEBHOOK_DURATION, record_failure
+from app.utils.tracing import span, start_trace
+from app.webhook.telegram import HELP_TEXT, NEEDS_REVIEW_NOTE, detect_special_intent
 
 router = APIRouter()
 
@@ -49,7 +58,11 @@ async def handle_whatsapp_text_message(
     phone: str,
     text_body: str,
     client: httpx.AsyncClient,
+    trace_id: str | None = None,
+    raise_errors: bool = False,
+    notify_errors: bool = True,
 ):
+    start_trace(trace_id)
     try:
         clean = text_body.strip()
         intent, period, direction = detect_special_intent(clean)
@@ -107,10 +120,11 @@ async def handle_whatsapp_text_message(
             )
             return
 
-        result = await process_text_message(
+        result = await worker.process_text_message(
             user_id=user_id,
             text=clean,
             source="whatsapp",
+            raise_errors=raise_errors,
         )
 
         if not result:
@@ -125,6 +139,15 @@ async def handle_whatsapp_text_message(
         category = result.get("category")
         direction = result.get("direction")
 
+        transactions = result.get("transactions")
+        if transactions:
+            lines = [f"✅ {len(transactions)} transaksi berhasil dicatat."]
+            for tx in transactions:
+                lines.append(f"• Rp {tx['amount']:,.0f} [{tx['category']}] {tx.get('note') or ''}".rstrip())
+            lines.append(f"Total: Rp {amount:,.0f}")
+            await send_whatsapp_message(phone, "\n".join(lines), client)
+            return
+
         lines = ["✅ Transaksi berhasil dicatat."]
         if amount is not None:
             lines.append(f"• Jumlah: Rp {amount:,.0f}")
@@ -132,6 +155,8 @@ async def handle_whatsapp_text_message(
             lines.append(f"• Kategori: {category}")
         if direction:
             lines.append(f"• Tipe: {direction}")
+        if result.get("needsReview"):
+            lines.append(NEEDS_REVIEW_NOTE)
 
         await send_whatsapp_message(
             phone,
@@ -141,11 +166,14 @@ async def handle_whatsapp_text_message(
 
     except Exception as e:
         print(f"Error in handle_whatsapp_text_message: {e}")
-        await send_whatsapp_message(
-            phone,
-            "Terjadi error saat memproses transaksi. Coba lagi nanti.",
-            client,
-        )
+        if notify_errors:
+            await send_whatsapp_message(
+                phone,
+                "Terjadi error saat memproses transaksi. Coba lagi nanti.",
+                client,
+            )
+        if raise_errors:
+            raise
 
 
 async def process_whatsapp_receipt_background(
@@ -154,14 +182,20 @@ async def process_whatsapp_receipt_background(
     receipt_id: int,
     file_path: str,
     client: httpx.AsyncClient,
+    trace_id: str | None = None,
+    raise_errors: bool = False,
+    notify_errors: bool = True,
 ):
+    start_trace(trace_id)
     try:
-        result = await process_image_message(
-            user_id=user_id,
-            receipt_id=receipt_id,
-            file_path=file_path,
-            source="whatsapp",
-        )
+        with span("process_receipt_background", receipt_id=receipt_id):
+            result = await worker.process_image_message(
+                user_id=user_id,
+                receipt_id=receipt_id,
+                file_path=file_path,
+                source="whatsapp",
+                raise_errors=raise_errors,
+            )
 
         if not result:
             await send_whatsapp_message(
@@ -171,6 +205,11 @@ async def process_whatsapp_receipt_background(
             )
             return
 
+        if result.get("rejected"):
+            # Ditolak quality gate sebelum OCR: kirim hint spesifik
+            await send_whatsapp_message(phone, f"📷 {result['hint']}", client)
+            return
+
         amount = result.get("amount")
         category = result.get("category")
         direction = result.get("direction")
@@ -182,6 +221,8 @@ async def process_whatsapp_receipt_background(
             lines.append(f"• Kategori: {category}")
         if direction:
             lines.append(f"• Tipe: {direction}")
+        if result.get("needsReview"):
+            lines.append(NEEDS_REVIEW_NOTE)
 
         await send_whatsapp_message(
             phone,
@@ -191,11 +232,14 @@ async def process_whatsapp_receipt_background(
 
     except Exception as e:
         print(f"Error in process_whatsapp_receipt_background: {e}")
-        await send_whatsapp_message(
-            phone,
-            "Terjadi error saat memproses struk. Coba lagi nanti.",
-            client,
-        )
+        if notify_errors:
+            await send_whatsapp_message(
+                phone,
+                "Terjadi error saat memproses struk. Coba lagi nanti.",
+                client,
+            )
+        if raise_errors:
+            raise
 
 
 @router.get("/")
@@ -212,6 +256,9 @@ async def whatsapp_webhook_verify(
 
 @router.post("/")
 async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
+    start = time.perf_counter()
+    kind = "ignored"
+    trace_id = start_trace()
     try:
         client: httpx.AsyncClient = request.app.state.http_client
         body = await request.json()
@@ -250,6 +297,8 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
                         source="whatsapp",
                     )
 
+                    kind = message_type or "unknown"
+
                     if message_type == "text":
                         text_body = message.get("text", {}).get("body")
 
@@ -260,17 +309,22 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
 
                             # Deteksi intent dan proses langsung (tanpa worker) untuk help/history/export
                             # atau kirim ke worker untuk transaksi biasa
-                            background_tasks.add_task(
+                            await dispatch_job(
+                                prisma,
+                                background_tasks,
+                                JOB_WHATSAPP_TEXT,
                                 handle_whatsapp_text_message,
-                                int(user_id),
-                                from_phone,
-                                text_body,
                                 client,
+                                user_id=int(user_id),
+                                phone=from_phone,
+                                text_body=text_body,
+                                trace_id=trace_id,
                             )
 
-                    elif message_type == "image":
-                        image_data = message.get("image", {})
-                        media_id = image_data.get("id")
+                    elif message_type in ("image", "document"):
+                        # document = PDF (e-receipt / mutasi) atau foto yang dikirim sebagai file
+                        media_data = message.get(message_type, {})
+                        media_id = media_data.get("id")
 
                         if media_id:
                             media_info = await media_service.download_whatsapp_media(
@@ -289,23 +343,29 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
                             )
 
                             print(
-                                f"WhatsApp image - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}"
+                                f"WhatsApp {message_type} - User: {user.id}, Receipt: {receipt.id}, Message: {message_id}"
                             )
 
                             await send_whatsapp_message(
                                 from_phone,
-                                "Foto struk diterima dan sedang diproses.",
+                                "Foto struk diterima dan sedang diproses."
+                                if message_type == "image"
+                                else "Dokumen diterima dan sedang diproses.",
                                 client,
                             )
 
                             # Proses OCR + transaksi di background dan kirim ringkasan
-                            background_tasks.add_task(
+                            await dispatch_job(
+                                prisma,
+                                background_tasks,
+                                JOB_WHATSAPP_RECEIPT,
                                 process_whatsapp_receipt_background,
-                                int(user_id),
-                                from_phone,
-                                receipt.id,
-                                media_info["file_path"],
                                 client,
+                                user_id=int(user_id),
+                                phone=from_phone,
+                                receipt_id=receipt.id,
+                                file_path=media_info["file_path"],
+                                trace_id=trace_id,
                             )
 
                     else:
@@ -318,15 +378,24 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
         return JSONResponse(status_code=200, content={"status": "success"})
 
     except Exception as e:
+        kind = "error"
+        record_failure("whatsapp_webhook", e)
         print(f"WhatsApp Webhook Error: {str(e)}")
         return JSONResponse(
             status_code=200,
             content={"status": "error_handled", "error": str(e)}
         )
 
+    finally:
+        WEBHOOK_DURATION.labels(platform="whatsapp", kind=kind).observe(
+            time.perf_counter() - start
+        )
+
 
 @router.post("/twilio")
 async def whatsapp_twilio_webhook(request: Request, background_tasks: BackgroundTasks):
+    start = time.perf_counter()
+    kind = "text"
     try:
         form_data = await request.form()
 
@@ -349,6 +418,7 @@ async def whatsapp_twilio_webhook(request: Request, background_tasks: Background
         print(f"Twilio webhook - User: {user.id}, Body: {body[:50] if body else 'No text'}")
 
         if media_url:
+            kind = "media"
             media_info = await media_service.download_twilio_media(media_url)
 
             receipt = await receipt_service.create_receipt(
@@ -365,5 +435,12 @@ async def whatsapp_twilio_webhook(request: Request, background_tasks: Background
         return PlainTextResponse(content="OK", status_code=200)
 
     except Exception as e:
+        kind = "error"
+        record_failure("twilio_webhook", e)
         print(f"Twilio Webhook Error: {str(e)}")
         return PlainTextResponse(content="Error", status_code=200)
+
+    finally:
+        WEBHOOK_DURATION.labels(platform="twilio", kind=kind).observe(
+            time.perf_counter() - start
+        )
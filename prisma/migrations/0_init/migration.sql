@@ -0,0 +1,113 @@
+-- Baseline: skema sebelum migrasi dikelola lewat `prisma migrate deploy`.
+-- Database lama (dibuat dengan `prisma db push`) cukup ditandai sudah diterapkan:
+--   python -m prisma migrate resolve --applied 0_init
+
+-- CreateTable
+CREATE TABLE "users" (
+    "id" BIGINT NOT NULL,
+    "username" TEXT,
+    "display_name" TEXT NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "users_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+CREATE TABLE "receipts" (
+    "id" SERIAL NOT NULL,
+    "user_id" BIGINT NOT NULL,
+    "file_path" TEXT NOT NULL,
+    "file_name" TEXT NOT NULL,
+    "mime_type" TEXT NOT NULL,
+    "file_size" INTEGER NOT NULL DEFAULT 0,
+    "uploaded_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "receipts_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+CREATE TABLE "ocr_texts" (
+    "id" SERIAL NOT NULL,
+    "receipt_id" INTEGER NOT NULL,
+    "ocr_raw" TEXT NOT NULL,
+    "ocr_meta" JSONB,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "ocr_texts_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+CREATE TABLE "llm_responses" (
+    "id" SERIAL NOT NULL,
+    "user_id" BIGINT,
+    "input_source" TEXT NOT NULL,
+    "input_text" TEXT,
+    "prompt_used" TEXT,
+    "model_name" TEXT DEFAULT 'gemini-2.5-flash',
+    "llm_output" JSONB NOT NULL,
+    "llm_meta" JSONB,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "llm_responses_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+CREATE TABLE "transactions" (
+    "id" BIGSERIAL NOT NULL,
+    "user_id" BIGINT,
+    "llm_response_id" INTEGER,
+    "receipt_id" INTEGER,
+    "intent" TEXT NOT NULL,
+    "amount" INTEGER NOT NULL,
+    "currency" TEXT NOT NULL DEFAULT 'IDR',
+    "tx_date" TIMESTAMP(3),
+    "category" TEXT NOT NULL,
+    "note" TEXT,
+    "needs_review" BOOLEAN NOT NULL DEFAULT false,
+    "extra" JSONB,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "transactions_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "receipts_user_id_idx" ON "receipts"("user_id");
+
+-- CreateIndex
+CREATE INDEX "ocr_texts_receipt_id_idx" ON "ocr_texts"("receipt_id");
+
+-- CreateIndex
+CREATE INDEX "llm_responses_user_id_idx" ON "llm_responses"("user_id");
+
+-- CreateIndex
+CREATE INDEX "llm_responses_created_at_idx" ON "llm_responses"("created_at");
+
+-- CreateIndex
+CREATE INDEX "transactions_user_id_idx" ON "transactions"("user_id");
+
+-- CreateIndex
+CREATE INDEX "transactions_created_at_idx" ON "transactions"("created_at");
+
+-- CreateIndex
+CREATE INDEX "transactions_needs_review_idx" ON "transactions"("needs_review");
+
+-- CreateIndex
+CREATE INDEX "transactions_intent_idx" ON "transactions"("intent");
+
+-- AddForeignKey
+ALTER TABLE "receipts" ADD CONSTRAINT "receipts_user_id_fkey" FOREIGN KEY ("user_id") REFERENCES "users"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "ocr_texts" ADD CONSTRAINT "ocr_texts_receipt_id_fkey" FOREIGN KEY ("receipt_id") REFERENCES "receipts"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "llm_responses" ADD CONSTRAINT "llm_responses_user_id_fkey" FOREIGN KEY ("user_id") REFERENCES "users"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "transactions" ADD CONSTRAINT "transactions_user_id_fkey" FOREIGN KEY ("user_id") REFERENCES "users"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "transactions" ADD CONSTRAINT "transactions_llm_response_id_fkey" FOREIGN KEY ("llm_response_id") REFERENCES "llm_responses"("id") ON DELETE SET NULL ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "transactions" ADD CONSTRAINT "transactions_receipt_id_fkey" FOREIGN KEY ("receipt_id") REFERENCES "receipts"("id") ON DELETE SET NULL ON UPDATE CASCADE;
@@ -0,0 +1,6 @@
+-- AlterTable
+ALTER TABLE "receipts" ADD COLUMN     "storage_state" TEXT NOT NULL DEFAULT 'original',
+ADD COLUMN     "storage_updated_at" TIMESTAMP(3);
+
+-- CreateIndex
+CREATE INDEX "receipts_storage_state_uploaded_at_idx" ON "receipts"("storage_state", "uploaded_at");
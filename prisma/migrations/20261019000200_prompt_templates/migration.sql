@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "prompt_templates" (
+    "id" TEXT NOT NULL,
+    "name" TEXT NOT NULL,
+    "body" TEXT NOT NULL,
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "prompt_templates_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "prompt_templates_name_idx" ON "prompt_templates"("name");
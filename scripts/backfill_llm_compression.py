@@ -0,0 +1,176 @@
+"""
+Backfill Kompresi llm_responses
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Migrasi row lama di llm_responses ke format baru:
+1. promptUsed berisi prompt lengkap → diganti referensi template
+   ("tpl:<id>"); template didaftarkan ke prompt_templates
+2. inputText / llmOutput besar → dikompres (zstd / gzip)
+
+Di akhir ditampilkan laporan bytes sebelum/sesudah.
+
+Usage:
+    python scripts/backfill_llm_compression.py --dry-run
+    python scripts/backfill_llm_compression.py --batch-size 500
+"""
+
+import sys
+import os
+import json
+import asyncio
+import argparse
+import logging
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.connection import connect_db, prisma
+from worker.llm.prompts import INPUT_PLACEHOLDER
+from worker.services.prompt_store import (
+    TEMPLATE_PREFIX,
+    ensure_template,
+    prompt_ref,
+    template_body,
+    template_id,
+)
+from worker.utils.compression import compress_text, is_compressed
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Satu UPDATE per batch (bukan per row)
+_UPDATE_SQL = """
+UPDATE llm_responses AS l
+SET input_text = v.input_text,
+    prompt_used = v.prompt_used,
+    llm_output = v.llm_output
+FROM jsonb_to_recordset($1::jsonb) AS v(id int, input_text text, prompt_used text, llm_output jsonb)
+WHERE l.id = v.id
+"""
+
+
+def _size(value) -> int:
+    if value is None:
+        return 0
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return len(value.encode("utf-8"))
+
+
+async def _pack_prompt(row, dry_run: bool) -> str:
+    """promptUsed lama → referensi template (atau versi terkompresi)."""
+    prompt = row.promptUsed
+    if not prompt or prompt.startswith(TEMPLATE_PREFIX) or is_compressed(prompt):
+        return prompt
+
+    # System prompt row lama tidak tercatat → template hanya user prompt
+    if row.inputText and row.inputText in prompt:
+        template = prompt.replace(row.inputText, INPUT_PLACEHOLDER, 1)
+        name = f"{row.inputSource}_legacy"
+        body = template_body(template, None)
+        tid = template_id(name, body) if dry_run else await ensure_template(name, body)
+        return prompt_ref(tid, row.inputText, row.inputText)
+
+    return compress_text(prompt)
+
+
+def _pack_output(value):
+    """llmOutput (Json) → string terkompresi jika cukup besar."""
+    if is_compressed(value):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    packed = compress_text(text)
+    return packed if is_compressed(packed) else value
+
+
+async def backfill(batch_size: int, dry_run: bool) -> dict:
+    report = {
+        "rows_scanned": 0,
+        "rows_updated": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+    }
+    last_id = 0
+
+    while True:
+        rows = await prisma.llmresponse.find_many(
+            where={"id": {"gt": last_id}},
+            order={"id": "asc"},
+            take=batch_size,
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            before = _size(row.inputText) + _size(row.promptUsed) + _size(row.llmOutput)
+
+            input_text = compress_text(row.inputText)
+            prompt_used = await _pack_prompt(row, dry_run)
+            llm_output = _pack_output(row.llmOutput)
+
+            after = _size(input_text) + _size(prompt_used) + _size(llm_output)
+
+            report["rows_scanned"] += 1
+            report["bytes_before"] += before
+            if after < before:
+                report["bytes_after"] += after
+                report["rows_updated"] += 1
+                updates.append({
+                    "id": row.id,
+                    "input_text": input_text,
+                    "prompt_used": prompt_used,
+                    "llm_output": llm_output,
+                })
+            else:
+                report["bytes_after"] += before
+
+        if updates and not dry_run:
+            await prisma.execute_raw(_UPDATE_SQL, json.dumps(updates))
+
+        logger.info(
+            f"Batch up to id {last_id}: {len(updates)}/{len(rows)} rows "
+            f"{'would be ' if dry_run else ''}updated"
+        )
+
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    return report
+
+
+def print_report(report: dict, dry_run: bool):
+    before = report["bytes_before"]
+    saved = report["bytes_saved"]
+    ratio = (saved / before * 100) if before else 0.0
+
+    print("\n" + "=" * 60)
+    print(f"  LLM RESPONSES BACKFILL {'(DRY RUN)' if dry_run else ''}")
+    print("=" * 60)
+    print(f"   Rows scanned : {report['rows_scanned']}")
+    print(f"   Rows updated : {report['rows_updated']}")
+    print(f"   Bytes before : {before:,}")
+    print(f"   Bytes after  : {report['bytes_after']:,}")
+    print(f"   Bytes saved  : {saved:,} ({ratio:.1f}%)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill kompresi llm_responses")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Hanya laporan, tanpa UPDATE")
+    args = parser.parse_args()
+
+    await connect_db()
+    try:
+        report = await backfill(args.batch_size, args.dry_run)
+    finally:
+        await prisma.disconnect()
+
+    print_report(report, args.dry_run)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
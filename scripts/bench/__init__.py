@@ -0,0 +1 @@
+# Benchmark harness (offline): fake Telegram/Groq + korpus sintetis
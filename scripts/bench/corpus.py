@@ -0,0 +1,99 @@
+"""
+Korpus sintetis update Telegram (teks transaksi + foto struk) untuk benchmark.
+
+Deterministik untuk seed yang sama, jadi hasil antar run bisa dibandingkan.
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+TEXT_TEMPLATES = [
+    "beli kopi {amount}",
+    "makan siang {amount}",
+    "parkir {amount}",
+    "gojek ke kantor {amount}",
+    "bayar listrik {amount}",
+    "gaji masuk {amount}",
+    "kopi {amount}, parkir {amount2}",
+    "makan {amount}; bensin {amount2}; parkir {amount3}",
+]
+
+MERCHANTS = ["INDOMARET", "ALFAMART", "KOPI KENANGAN", "SUPERINDO", "HYPERMART"]
+ITEMS = ["AQUA 600ML", "ROTI TAWAR", "INDOMIE GORENG", "SUSU UHT", "KOPI SUSU", "TELUR 1KG"]
+
+BASE_CHAT_ID = 9_000_000
+
+
+def _slang(rng: random.Random) -> str:
+    value = rng.choice([5, 10, 12, 15, 20, 25, 35, 50, 75, 100, 150])
+    return f"{value}rb" if rng.random() < 0.7 else f"{value * 1000}"
+
+
+def render_receipt(merchant: str, items: List[Tuple[str, int]], width: int = 480) -> bytes:
+    """Gambar struk sederhana (teks hitam di kertas putih) sebagai PNG."""
+    import cv2
+    import numpy as np
+
+    total = sum(price for _, price in items)
+    lines = [merchant, "JL. BENCHMARK NO. 1", "-" * 28]
+    lines += [f"{name:<18}{price:>10,}".replace(",", ".") for name, price in items]
+    lines += ["-" * 28, f"{'TOTAL':<18}{total:>10,}".replace(",", "."), "TERIMA KASIH"]
+
+    line_height = 34
+    img = np.full((line_height * (len(lines) + 2), width), 255, dtype=np.uint8)
+    for i, line in enumerate(lines, 1):
+        cv2.putText(
+            img, line, (16, i * line_height),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.7, 0, 2, cv2.LINE_AA,
+        )
+
+    ok, buffer = cv2.imencode(".png", img)
+    if not ok:
+        raise RuntimeError("Gagal encode PNG struk")
+    return buffer.tobytes()
+
+
+def build_corpus(
+    count: int,
+    photo_ratio: float = 0.2,
+    users: int = 20,
+    seed: int = 42,
+) -> Tuple[List[Dict], Dict[str, bytes]]:
+    """
+    Returns:
+        Tuple (list update Telegram, file_id → bytes PNG untuk fake getFile)
+
+    Tiap update punya chat_id unik agar balasan final bisa dipasangkan
+    dengan update-nya (latency end-to-end).
+    """
+    rng = random.Random(seed)
+    updates = []
+    files: Dict[str, bytes] = {}
+
+    for i in range(count):
+        user_id = 1_000_000 + rng.randrange(users)
+        message = {
+            "message_id": i + 1,
+            "from": {"id": user_id, "username": f"bench{user_id}", "first_name": "Bench"},
+            "chat": {"id": BASE_CHAT_ID + i, "type": "private"},
+            "date": 0,
+        }
+
+        if rng.random() < photo_ratio:
+            file_id = f"bench_{seed}_{i}"
+            items = [
+                (rng.choice(ITEMS), rng.choice([3500, 4500, 12000, 18500, 27000]))
+                for _ in range(rng.randint(2, 6))
+            ]
+            files[file_id] = render_receipt(rng.choice(MERCHANTS), items)
+            message["photo"] = [{"file_id": file_id, "width": 480, "height": 480}]
+            kind = "photo"
+        else:
+            message["text"] = rng.choice(TEXT_TEMPLATES).format(
+                amount=_slang(rng), amount2=_slang(rng), amount3=_slang(rng)
+            )
+            kind = "text"
+
+        updates.append({"kind": kind, "update": {"update_id": i + 1, "message": message}})
+
+    return updates, files
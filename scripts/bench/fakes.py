@@ -0,0 +1,215 @@
+"""
+Fake Telegram Bot API + fake Groq (OpenAI-compatible) untuk benchmark offline.
+
+Satu app FastAPI melayani keduanya:
+- Telegram: sendMessage, sendDocument, getFile, download file
+  (app diarahkan ke sini lewat TELEGRAM_API_URL)
+- Groq: POST /openai/v1/chat/completions dengan latency yang bisa diatur
+  dan output JSON kalengan (SDK groq diarahkan lewat GROQ_BASE_URL);
+  mendukung stream=True (SSE) dengan teks penutup setelah JSON, seperti
+  model sungguhan
+
+Semua pesan keluar dicatat di `FakeRecorder` (timestamp perf_counter,
+process yang sama dengan harness) untuk menghitung latency end-to-end.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Balasan "ack" dari webhook (bukan hasil akhir pemrosesan)
+ACK_PREFIXES = (
+    "Pesan diterima",
+    "Foto struk diterima",
+    "Dokumen diterima",
+    "Laporan sedang disiapkan",
+)
+
+_AMOUNT = re.compile(r"(\d[\d.]*)\s*(rb|k|jt)?", re.IGNORECASE)
+_BATCH_ITEM = re.compile(r"^(\d+)\.\s+(.*)$", re.MULTILINE)
+
+# Teks yang sering ditambahkan model setelah JSON (dibuang oleh early stop)
+_TRAILER = "\n\nSemoga membantu! Transaksi di atas sudah dikategorikan sesuai input."
+# Jeda antar chunk SSE (simulasi kecepatan decode)
+_STREAM_CHUNK_CHARS = 12
+_STREAM_CHUNK_DELAY = 0.01
+
+
+class FakeRecorder:
+    """Catatan thread-safe pesan yang dikirim app ke fake Telegram."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages: Dict[int, List[dict]] = {}
+        self.llm_calls = 0
+        self.files: Dict[str, bytes] = {}
+
+    def record_message(self, chat_id: int, text: str) -> None:
+        with self._lock:
+            self.messages.setdefault(chat_id, []).append({
+                "text": text,
+                "t": time.perf_counter(),
+                "final": not text.startswith(ACK_PREFIXES),
+            })
+
+    def final_message(self, chat_id: int) -> Optional[dict]:
+        with self._lock:
+            for message in self.messages.get(chat_id, []):
+                if message["final"]:
+                    return message
+        return None
+
+    def count_llm_call(self) -> None:
+        with self._lock:
+            self.llm_calls += 1
+
+
+def _amount_from(text: str) -> int:
+    match = _AMOUNT.search(text or "")
+    if not match:
+        return 25000
+    value = int(match.group(1).replace(".", ""))
+    suffix = (match.group(2) or "").lower()
+    if suffix in ("rb", "k"):
+        value *= 1000
+    elif suffix == "jt":
+        value *= 1000000
+    return value
+
+
+def _canned_transaction(text: str, ref: Optional[int] = None) -> dict:
+    item = {
+        "intent": "expense",
+        "amount": _amount_from(text),
+        "currency": "IDR",
+        "date": None,
+        "category": "makan",
+        "note": (text or "bench")[:40],
+        "confidence": 0.9,
+    }
+    if ref is not None:
+        item = {"ref": ref, **item}
+    return item
+
+
+def _completion(content: str, model: str, prompt_chars: int) -> dict:
+    prompt_tokens = max(1, prompt_chars // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _stream_chunks(content: str, model: str, prompt_chars: int):
+    """Generator SSE chat.completion.chunk (format OpenAI/Groq)."""
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    def event(delta: dict, finish_reason=None, usage=None) -> str:
+        payload = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            payload["x_groq"] = {"id": chunk_id, "usage": usage}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def generate():
+        yield event({"role": "assistant", "content": ""})
+        for i in range(0, len(content), _STREAM_CHUNK_CHARS):
+            await asyncio.sleep(_STREAM_CHUNK_DELAY)
+            yield event({"content": content[i:i + _STREAM_CHUNK_CHARS]})
+        yield event({}, "stop", _completion(content, model, prompt_chars)["usage"])
+        yield "data: [DONE]\n\n"
+
+    return generate()
+
+
+def create_fake_app(
+    recorder: FakeRecorder,
+    llm_latency_ms: float = 300.0,
+    llm_jitter_ms: float = 100.0,
+) -> FastAPI:
+    app = FastAPI(title="bench-fakes")
+
+    # ── Telegram Bot API ───────────────────────────────────────────
+    @app.post("/bot{token}/sendMessage")
+    async def send_message(token: str, request: Request):
+        body = await request.json()
+        recorder.record_message(int(body.get("chat_id")), body.get("text", ""))
+        return {"ok": True, "result": {"message_id": random.randint(1, 10**9)}}
+
+    @app.post("/bot{token}/sendDocument")
+    async def send_document(token: str, request: Request):
+        # Multipart tidak di-parse (cukup dicatat sebagai pesan final)
+        raw = await request.body()
+        match = re.search(rb'name="chat_id"\r\n\r\n(-?\d+)', raw)
+        if match:
+            recorder.record_message(int(match.group(1)), "[document]")
+        return {"ok": True, "result": {}}
+
+    @app.get("/bot{token}/getFile")
+    async def get_file(token: str, file_id: str):
+        if file_id not in recorder.files:
+            return JSONResponse(status_code=404, content={"ok": False, "description": "file not found"})
+        return {"ok": True, "result": {"file_id": file_id, "file_path": f"photos/{file_id}.png"}}
+
+    @app.get("/file/bot{token}/photos/{name}")
+    async def download_file(token: str, name: str):
+        data = recorder.files.get(name.rsplit(".", 1)[0])
+        if data is None:
+            return Response(status_code=404)
+        return Response(content=data, media_type="image/png")
+
+    # ── Groq (OpenAI-compatible) ───────────────────────────────────
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+
+        latency = max(0.0, random.gauss(llm_latency_ms, llm_jitter_ms)) / 1000
+        await asyncio.sleep(latency)
+        recorder.count_llm_call()
+
+        if "JSON array" in system:
+            items = _BATCH_ITEM.findall(user)
+            content = json.dumps([_canned_transaction(text, int(ref)) for ref, text in items])
+        else:
+            # Input OCR/teks ada di baris terakhir 'Input: "..."'
+            inputs = re.findall(r'Input: "(.*?)"\nOutput:', user, re.DOTALL)
+            content = json.dumps(_canned_transaction(inputs[-1] if inputs else user))
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_chunks(content + _TRAILER, body.get("model", "fake"), prompt_chars),
+                media_type="text/event-stream",
+            )
+        return _completion(content, body.get("model", "fake"), prompt_chars)
+
+    return app
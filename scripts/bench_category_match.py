@@ -0,0 +1,225 @@
+"""
+Benchmark Normalisasi Kategori
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Ukur akurasi dan latency `validate_and_normalize_category` (index
+symmetric delete + edit distance) dibanding baseline
+difflib.get_close_matches atas alias yang sama, dan dibanding perilaku
+lama (exact/alias saja → "lainnya").
+
+Latency dilaporkan dua kali: cold (memo index dikosongkan, call pertama
+per string) dan warm (string yang sama diulang --repeat kali).
+
+Korpus:
+- default: string kategori yang biasa keluar dari LLM (Indonesia/Inggris,
+  multi kata) + typo sintetis (transposisi, hapus, ganti, sisip huruf)
+  dari semua alias, deterministik per --seed
+- --corpus file.csv: kolom `text,expected` (expected kosong = harus
+  "lainnya"), mis. hasil export kategori transaksi yang sudah direview:
+      COPY (SELECT original_category, category FROM ...) TO STDOUT CSV
+
+Usage:
+    python scripts/bench_category_match.py
+    python scripts/bench_category_match.py --typos 10 --repeat 20
+    python scripts/bench_category_match.py --corpus categories.csv --show-errors
+"""
+
+import sys
+import os
+import csv
+import time
+import random
+import string
+import argparse
+import difflib
+import logging
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.services.sanity_checks import (
+    CATEGORY_INDEX,
+    CATEGORY_MAPPING,
+    VALID_CATEGORIES,
+    validate_and_normalize_category,
+)
+
+# String kategori yang biasa muncul di output LLM (bukan typo)
+REAL_CATEGORIES: List[Tuple[str, str]] = [
+    ("makan", "makan"), ("Makan", "makan"), ("makanan", "makan"),
+    ("Makanan & Minuman", "makan"), ("food", "makan"), ("jajan", "makan"),
+    ("minuman", "minuman"), ("drink", "minuman"), ("minum", "minuman"),
+    ("belanja", "belanja"), ("Belanja Bulanan", "belanja"), ("shopping", "belanja"),
+    ("transportasi", "transportasi"), ("transport", "transportasi"),
+    ("Transportasi Online", "transportasi"), ("bensin", "transportasi"),
+    ("ojol", "transportasi"), ("parkir", "transportasi"),
+    ("tagihan", "tagihan"), ("Tagihan Listrik", "tagihan"), ("bill", "tagihan"),
+    ("pulsa", "tagihan"), ("wifi", "tagihan"), ("listrik", "tagihan"),
+    ("hiburan", "hiburan"), ("entertainment", "hiburan"), ("nonton", "hiburan"),
+    ("game", "hiburan"), ("kesehatan", "kesehatan"), ("health", "kesehatan"),
+    ("obat", "kesehatan"), ("dokter", "kesehatan"), ("pendidikan", "pendidikan"),
+    ("education", "pendidikan"), ("kursus", "pendidikan"), ("sekolah", "pendidikan"),
+    ("gaji", "gaji"), ("salary", "gaji"), ("Gaji Bulanan", "gaji"),
+    ("transfer", "transfer"), ("Transfer Uang", "transfer"), ("lainnya", "lainnya"),
+    # Tidak dikenal: harus tetap "lainnya"
+    ("donasi", "lainnya"), ("investasi", "lainnya"), ("asuransi", "lainnya"),
+    ("cicilan", "lainnya"), ("misc", "lainnya"), ("", "lainnya"),
+]
+
+ALIASES = {**{c: c for c in VALID_CATEGORIES}, **CATEGORY_MAPPING}
+ALIAS_NAMES = list(ALIASES)
+
+
+def make_typo(word: str, rng: random.Random) -> str:
+    """Satu edit acak: transposisi, hapus, ganti, atau sisip huruf."""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(["swap", "delete", "replace", "insert"])
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == "delete":
+        return word[:i] + word[i + 1:]
+    letter = rng.choice(string.ascii_lowercase)
+    if kind == "replace":
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+
+def build_corpus(typos_per_alias: int, seed: int) -> List[Tuple[str, str, str]]:
+    """List (text, expected, kind) dengan kind real / typo."""
+    rng = random.Random(seed)
+
+    corpus = [(text, expected, "real") for text, expected in REAL_CATEGORIES]
+    for alias, category in ALIASES.items():
+        for _ in range(typos_per_alias):
+            typo = make_typo(alias, rng)
+            if typo != alias:
+                corpus.append((typo, category, "typo"))
+    return corpus
+
+
+def load_corpus(path: str) -> List[Tuple[str, str, str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            (row["text"], (row.get("expected") or "lainnya").strip().lower(), "file")
+            for row in csv.DictReader(f)
+        ]
+
+
+def legacy_normalize(text: str) -> str:
+    """Perilaku sebelum index fuzzy: exact / alias saja."""
+    normalized = (text or "").lower().strip()
+    if normalized in VALID_CATEGORIES:
+        return normalized
+    return CATEGORY_MAPPING.get(normalized, "lainnya")
+
+
+def difflib_normalize(text: str) -> str:
+    """Baseline: difflib atas semua alias (cutoff setara 0.75)."""
+    normalized = (text or "").lower().strip()
+    if normalized in ALIASES:
+        return ALIASES[normalized]
+    close = difflib.get_close_matches(normalized, ALIAS_NAMES, n=1, cutoff=0.75)
+    return ALIASES[close[0]] if close else "lainnya"
+
+
+def index_normalize(text: str) -> str:
+    return validate_and_normalize_category(text)["normalized"]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(
+    name: str,
+    normalize: Callable[[str], str],
+    corpus: List[Tuple[str, str, str]],
+    repeat: int,
+    reset: Optional[Callable[[], None]] = None,
+) -> Dict:
+    cold_us: List[float] = []
+    warm_us: List[float] = []
+    correct: Dict[str, List[bool]] = {}
+    errors: List[Tuple[str, str, str]] = []
+
+    for text, expected, kind in corpus:
+        if reset:
+            reset()
+        start = time.perf_counter()
+        result = normalize(text)
+        cold_us.append((time.perf_counter() - start) * 1e6)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            normalize(text)
+        warm_us.append((time.perf_counter() - start) / repeat * 1e6)
+
+        ok = result == expected
+        correct.setdefault(kind, []).append(ok)
+        if not ok:
+            errors.append((text, expected, result))
+
+    return {
+        "name": name,
+        "accuracy": {kind: sum(oks) / len(oks) for kind, oks in correct.items()},
+        "cold_p50_us": statistics.median(cold_us),
+        "cold_p99_us": _percentile(cold_us, 0.99),
+        "warm_p50_us": statistics.median(warm_us),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark normalisasi kategori")
+    parser.add_argument("--corpus", help="CSV text,expected (default: korpus bawaan)")
+    parser.add_argument("--typos", type=int, default=5, help="Typo sintetis per alias")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=10, help="Ulangan per string (timing)")
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    # Warning "Unknown category" per string tidak relevan untuk benchmark
+    logging.getLogger("worker.services.sanity_checks").setLevel(logging.ERROR)
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(args.typos, args.seed)
+    kinds = sorted({kind for _, _, kind in corpus})
+
+    print(f"\nCorpus: {len(corpus)} strings ({', '.join(kinds)}), "
+          f"{len(CATEGORY_INDEX)} aliases, min similarity {CATEGORY_INDEX.min_similarity}")
+
+    results = [
+        run("legacy (exact/alias)", legacy_normalize, corpus, args.repeat),
+        run("difflib", difflib_normalize, corpus, args.repeat),
+        run("category index", index_normalize, corpus, args.repeat,
+            reset=CATEGORY_INDEX._memo.clear),
+    ]
+
+    header = (
+        f"   {'method':<22}" + "".join(f"{'acc ' + k:>11}" for k in kinds)
+        + f"{'cold p50':>11}{'cold p99':>11}{'warm p50':>11}"
+    )
+    print("\n" + "=" * len(header))
+    print(header)
+    print("=" * len(header))
+    for result in results:
+        accuracy = "".join(f"{result['accuracy'].get(k, 0) * 100:>10.1f}%" for k in kinds)
+        print(
+            f"   {result['name']:<22}{accuracy}"
+            f"{result['cold_p50_us']:>9.1f}us{result['cold_p99_us']:>9.1f}us"
+            f"{result['warm_p50_us']:>9.1f}us"
+        )
+
+    if args.show_errors:
+        for result in results:
+            print(f"\n-- {result['name']}: {len(result['errors'])} errors")
+            for text, expected, got in result["errors"][:50]:
+                print(f"   {text!r:<28} expected={expected:<14} got={got}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark Import Time & Memory
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Bandingkan biaya import untuk role web-only vs worker:
+
+- web    : `import app.main` saja (dependensi berat harus tetap lazy)
+- worker : app.main + jalur teks (LLM) + jalur struk (OCR)
+- export : worker + pandas (report Excel)
+
+Tiap role dijalankan di subprocess baru dengan `-X importtime`, lalu
+dilaporkan total waktu import, modul termahal, modul berat yang ikut
+ter-load, dan peak RSS.
+
+Usage:
+    python scripts/bench_imports.py
+    python scripts/bench_imports.py --runs 5 --top 15
+"""
+
+import sys
+import os
+import re
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROLES = {
+    "web": ["app.main"],
+    "worker": [
+        "app.main",
+        "worker.worker_main",
+        "worker.llm.llm_client",
+        "groq",
+        "worker.ocr.engines",
+    ],
+    "export": [
+        "app.main",
+        "worker.worker_main",
+        "worker.llm.llm_client",
+        "groq",
+        "worker.ocr.engines",
+        "pandas",
+        "openpyxl",
+    ],
+}
+
+# Dependensi yang seharusnya TIDAK ter-load di role web
+HEAVY_MODULES = ["cv2", "numpy", "pytesseract", "groq", "pandas", "openpyxl", "PIL"]
+
+_PROBE = """
+import importlib, json, resource, sys
+for name in {modules!r}:
+    importlib.import_module(name)
+print(json.dumps({{
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_role(modules: List[str]) -> Dict:
+    """Import modul role di subprocess baru; return importtime + memory."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         _PROBE.format(modules=modules, heavy=HEAVY_MODULES)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": ROOT_DIR},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Baris level teratas (indent 1 spasi) = biaya kumulatif per import langsung
+    top_level = {}
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cum_us, indent, name = match.groups()
+        cumulative[name] = int(cum_us)
+        if len(indent) == 1:
+            top_level[name] = int(cum_us)
+
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "total_ms": sum(top_level.values()) / 1000,
+        "cumulative_us": cumulative,
+        "max_rss_mb": probe["max_rss_kb"] / 1024,
+        "heavy_loaded": probe["heavy_loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time & memory per role")
+    parser.add_argument("--roles", nargs="+", default=list(ROLES), choices=list(ROLES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Jumlah modul termahal yang ditampilkan")
+    args = parser.parse_args()
+
+    summary = {}
+    for role in args.roles:
+        runs = [run_role(ROLES[role]) for _ in range(args.runs)]
+        summary[role] = {
+            "total_ms": statistics.median(r["total_ms"] for r in runs),
+            "max_rss_mb": statistics.median(r["max_rss_mb"] for r in runs),
+            "heavy_loaded": runs[-1]["heavy_loaded"],
+        }
+
+        print("\n" + "=" * 60)
+        print(f"  ROLE: {role}  ({', '.join(ROLES[role])})")
+        print("=" * 60)
+        slowest = sorted(
+            runs[-1]["cumulative_us"].items(), key=lambda item: item[1], reverse=True
+        )[:args.top]
+        for name, cum_us in slowest:
+            print(f"   {cum_us / 1000:8.1f} ms  {name}")
+
+    print("\n" + "=" * 60)
+    print(f"  SUMMARY (median of {args.runs} runs)")
+    print("=" * 60)
+    print(f"   {'role':<8} {'import':>10} {'peak RSS':>10}  heavy modules loaded")
+    for role, stats in summary.items():
+        heavy = ", ".join(stats["heavy_loaded"]) or "-"
+        print(
+            f"   {role:<8} {stats['total_ms']:>8.0f}ms {stats['max_rss_mb']:>8.1f}MB  {heavy}"
+        )
+
+
+if __name__ == "__main__":
+    main()
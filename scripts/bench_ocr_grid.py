@@ -0,0 +1,377 @@
+"""
+Benchmark Akurasi vs Latency OCR
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Jalankan grid konfigurasi preprocessing (CLAHE, sharpen, denoise, binarize)
+dan Tesseract (PSM, OEM, whitelist, fallback PSM) terhadap folder struk
+berlabel, lalu tampilkan tabel Pareto latency vs akurasi total.
+
+Label ground truth di folder yang sama:
+- labels.csv  → kolom `file,total`
+- labels.json → {"struk1.jpg": 45500, ...}
+
+Per konfigurasi diukur:
+- waktu tiap stage preprocessing (dari histogram PREPROCESS_STAGE_DURATION)
+- waktu Tesseract, mean confidence
+- akurasi total: parse_receipt_text(teks OCR) == label (± --tolerance)
+
+Hasil preprocessing di-cache per (gambar, konfigurasi preprocess), jadi
+tiap gambar hanya diproses sekali per kombinasi preprocess.
+
+Usage:
+    python scripts/bench_ocr_grid.py upload/labeled
+    python scripts/bench_ocr_grid.py upload/labeled --quick --output grid.csv
+    python scripts/bench_ocr_grid.py upload/labeled --grid my_grid.json
+"""
+
+import sys
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import logging
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY
+
+from worker.ocr.preprocessor import ImagePreprocessor
+from worker.ocr.tesseract import DEFAULT_CHAR_WHITELIST, TesseractOCR
+from worker.services.receipt_parser import parse_receipt_text
+from worker.utils.image_utils import load_image
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+STAGES = ["resize", "grayscale", "clahe", "sharpen", "deskew", "denoise", "binarize", "morphology"]
+STAGE_METRIC = "finance_preprocess_stage_duration_seconds_sum"
+
+# Grid default: 16 konfigurasi preprocess × 8 konfigurasi Tesseract.
+# Key = argumen ImagePreprocessor / TesseractOCR, kecuali:
+# - denoise_strength 0 → denoise=False
+# - whitelist: true = DEFAULT_CHAR_WHITELIST, false = tanpa whitelist
+# - fallback: true = PSM fallback produksi ([psm, 3, 4]), false = satu PSM
+DEFAULT_GRID = {
+    "preprocess": {
+        "use_clahe": [True, False],
+        "apply_sharpen": [True, False],
+        "denoise_strength": [7, 0],
+        "enable_binarize": [False, True],
+    },
+    "tesseract": {
+        "psm": [6, 4],
+        "oem": [3, 1],
+        "whitelist": [True, False],
+        "fallback": [False],
+    },
+}
+
+QUICK_GRID = {
+    "preprocess": {
+        "use_clahe": [True, False],
+        "denoise_strength": [7, 0],
+    },
+    "tesseract": {
+        "psm": [6],
+        "oem": [3, 1],
+        "whitelist": [True],
+        "fallback": [False],
+    },
+}
+
+# Konfigurasi produksi (engines.get_preprocessor / get_tesseract), selalu ikut diukur
+BASELINE = {
+    "preprocess": {"use_clahe": True, "apply_sharpen": True, "denoise_strength": 7, "enable_binarize": False},
+    "tesseract": {"psm": 6, "oem": 3, "whitelist": True, "fallback": True},
+}
+
+
+def load_labels(folder: Path) -> Dict[str, int]:
+    """Baca labels.csv / labels.json → {nama file: total}."""
+    csv_path = folder / "labels.csv"
+    json_path = folder / "labels.json"
+
+    if csv_path.exists():
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            return {row["file"].strip(): int(float(row["total"])) for row in csv.DictReader(f)}
+    if json_path.exists():
+        with open(json_path, encoding="utf-8") as f:
+            return {name: int(float(total)) for name, total in json.load(f).items()}
+
+    raise FileNotFoundError(f"labels.csv / labels.json tidak ditemukan di {folder}")
+
+
+def expand_grid(axes: Dict[str, list]) -> List[Dict]:
+    keys = list(axes)
+    return [dict(zip(keys, values)) for values in itertools.product(*(axes[k] for k in keys))]
+
+
+def build_preprocessor(params: Dict) -> ImagePreprocessor:
+    params = dict(params)
+    strength = params.pop("denoise_strength", 7)
+    return ImagePreprocessor(denoise=strength > 0, denoise_strength=strength or 7, **params)
+
+
+def build_tesseract(params: Dict) -> TesseractOCR:
+    params = dict(params)
+    psm = params.pop("psm", 6)
+    whitelist = params.pop("whitelist", True)
+    fallback = params.pop("fallback", False)
+    return TesseractOCR(
+        psm=psm,
+        fallback_psm_modes=None if fallback else [psm],
+        char_whitelist=DEFAULT_CHAR_WHITELIST if whitelist else None,
+        **params,
+    )
+
+
+def config_label(params: Dict) -> str:
+    short = {
+        "use_clahe": "clahe", "apply_sharpen": "sharp", "denoise_strength": "dn",
+        "enable_binarize": "bin", "whitelist": "wl", "fallback": "fb",
+    }
+    parts = []
+    for key, value in params.items():
+        name = short.get(key, key)
+        if isinstance(value, bool):
+            parts.append(name if value else f"!{name}")
+        else:
+            parts.append(f"{name}{value}")
+    return " ".join(parts)
+
+
+def _stage_totals() -> Dict[str, float]:
+    return {
+        stage: REGISTRY.get_sample_value(STAGE_METRIC, {"stage": stage}) or 0.0
+        for stage in STAGES
+    }
+
+
+def preprocess_all(
+    images: Dict[str, "object"],
+    params: Dict,
+) -> Tuple[Dict[str, "object"], Dict[str, float], float]:
+    """
+    Returns:
+        Tuple (gambar hasil preprocess per file, rata-rata ms per stage,
+        rata-rata ms total preprocess per gambar)
+    """
+    preprocessor = build_preprocessor(params)
+    before = _stage_totals()
+    results = {}
+
+    start = time.perf_counter()
+    for name, img in images.items():
+        results[name] = preprocessor.preprocess(img)
+    total_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+    after = _stage_totals()
+    stage_ms = {
+        stage: (after[stage] - before[stage]) * 1000 / len(images)
+        for stage in STAGES
+        if after[stage] > before[stage]
+    }
+    return results, stage_ms, total_ms
+
+
+def run_ocr(
+    processed: Dict[str, "object"],
+    labels: Dict[str, int],
+    params: Dict,
+    tolerance: int,
+) -> Dict:
+    engine = build_tesseract(params)
+    latencies, confidences = [], []
+    correct = extracted = 0
+
+    for name, img in processed.items():
+        start = time.perf_counter()
+        text, metadata = engine.extract_text(img)
+        latencies.append((time.perf_counter() - start) * 1000)
+        confidences.append(float(metadata.get("confidence", 0.0)))
+
+        parsed = parse_receipt_text(text, metadata.get("confidence"))
+        if parsed and parsed.get("amount") is not None:
+            extracted += 1
+            if abs(parsed["amount"] - labels[name]) <= tolerance:
+                correct += 1
+
+    count = len(processed)
+    return {
+        "ocr_ms": statistics.mean(latencies),
+        "ocr_p95_ms": _p95(latencies),
+        "confidence": statistics.mean(confidences),
+        "accuracy": correct / count,
+        "extracted": extracted / count,
+    }
+
+
+def _p95(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+def mark_pareto(rows: List[Dict]) -> None:
+    """Tandai konfigurasi yang tidak didominasi (lebih cepat DAN minimal sama akurat)."""
+    for row in rows:
+        row["pareto"] = not any(
+            other["total_ms"] <= row["total_ms"]
+            and other["accuracy"] >= row["accuracy"]
+            and (other["total_ms"] < row["total_ms"] or other["accuracy"] > row["accuracy"])
+            for other in rows
+        )
+
+
+def run_grid(
+    folder: Path,
+    grid: Dict,
+    tolerance: int,
+    limit: Optional[int] = None,
+) -> List[Dict]:
+    labels = load_labels(folder)
+    files = sorted(
+        p for p in folder.iterdir()
+        if p.suffix.lower() in IMAGE_EXTENSIONS and p.name in labels
+    )
+    if limit:
+        files = files[:limit]
+    if not files:
+        raise SystemExit(f"Tidak ada gambar berlabel di {folder}")
+
+    missing = sorted(set(labels) - {p.name for p in folder.iterdir()})
+    if missing:
+        print(f"⚠️  {len(missing)} label tanpa file gambar (diabaikan)")
+
+    images = {p.name: load_image(str(p)) for p in files}
+    print(f"📄 {len(images)} gambar berlabel di {folder}")
+
+    preprocess_configs = expand_grid(grid["preprocess"])
+    tesseract_configs = expand_grid(grid["tesseract"])
+    pairs = [(p, t) for p in preprocess_configs for t in tesseract_configs]
+    if (BASELINE["preprocess"], BASELINE["tesseract"]) not in pairs:
+        pairs.append((BASELINE["preprocess"], BASELINE["tesseract"]))
+    print(f"🔧 {len(pairs)} konfigurasi\n")
+
+    rows = []
+    preprocess_cache: Dict[str, Tuple] = {}
+    for i, (pre_params, ocr_params) in enumerate(pairs, 1):
+        key = json.dumps(pre_params, sort_keys=True)
+        if key not in preprocess_cache:
+            preprocess_cache.clear()  # cukup simpan satu set gambar di memori
+            preprocess_cache[key] = preprocess_all(images, pre_params)
+        processed, stage_ms, preprocess_ms = preprocess_cache[key]
+
+        result = run_ocr(processed, labels, ocr_params, tolerance)
+        row = {
+            "preprocess": config_label(pre_params),
+            "tesseract": config_label(ocr_params),
+            "baseline": pre_params == BASELINE["preprocess"] and ocr_params == BASELINE["tesseract"],
+            "preprocess_ms": preprocess_ms,
+            "stage_ms": stage_ms,
+            **result,
+            "total_ms": preprocess_ms + result["ocr_ms"],
+        }
+        rows.append(row)
+        print(
+            f"  [{i:>3}/{len(pairs)}] {row['preprocess']:<36} {row['tesseract']:<24} "
+            f"{row['total_ms']:7.0f}ms acc={row['accuracy']:.0%}"
+        )
+
+    mark_pareto(rows)
+    return rows
+
+
+def print_table(rows: List[Dict], pareto_only: bool = False) -> None:
+    rows = sorted(rows, key=lambda r: r["total_ms"])
+    baseline = next((r for r in rows if r["baseline"]), None)
+
+    print("\n" + "=" * 118)
+    print("  OCR ACCURACY vs LATENCY  (* = Pareto front, B = konfigurasi produksi)")
+    print("=" * 118)
+    print(
+        f"   {'':<2} {'preprocess':<36} {'tesseract':<24} {'total':>8} {'prep':>7} "
+        f"{'ocr':>7} {'p95':>7} {'conf':>6} {'acc':>6} {'extr':>6}"
+    )
+    for row in rows:
+        if pareto_only and not (row["pareto"] or row["baseline"]):
+            continue
+        mark = ("*" if row["pareto"] else " ") + ("B" if row["baseline"] else " ")
+        print(
+            f"   {mark} {row['preprocess']:<36} {row['tesseract']:<24} "
+            f"{row['total_ms']:7.0f}ms {row['preprocess_ms']:5.0f}ms {row['ocr_ms']:5.0f}ms "
+            f"{row['ocr_p95_ms']:5.0f}ms {row['confidence']:6.1f} "
+            f"{row['accuracy']:6.0%} {row['extracted']:6.0%}"
+        )
+
+    if baseline:
+        print("\n   Stage preprocessing baseline (ms/gambar): "
+              + ", ".join(f"{k}={v:.1f}" for k, v in baseline["stage_ms"].items()))
+        better = [
+            r for r in rows
+            if r["pareto"] and not r["baseline"]
+            and r["total_ms"] < baseline["total_ms"] and r["accuracy"] >= baseline["accuracy"]
+        ]
+        if better:
+            best = better[0]
+            speedup = baseline["total_ms"] / best["total_ms"]
+            print(
+                f"   Lebih cepat {speedup:.1f}x tanpa turun akurasi: "
+                f"{best['preprocess']} | {best['tesseract']}"
+            )
+        else:
+            print("   Tidak ada konfigurasi yang lebih cepat dengan akurasi ≥ baseline")
+
+
+def write_output(rows: List[Dict], path: str) -> None:
+    if path.endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        return
+
+    fields = [
+        "preprocess", "tesseract", "baseline", "pareto", "total_ms", "preprocess_ms",
+        "ocr_ms", "ocr_p95_ms", "confidence", "accuracy", "extracted",
+    ] + [f"stage_{s}_ms" for s in STAGES]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            flat = {k: row[k] for k in fields if k in row}
+            flat.update({f"stage_{s}_ms": round(v, 2) for s, v in row["stage_ms"].items()})
+            writer.writerow(flat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid benchmark OCR: akurasi total vs latency")
+    parser.add_argument("folder", help="Folder gambar struk + labels.csv/labels.json")
+    parser.add_argument("--grid", help="File JSON grid {preprocess: {...}, tesseract: {...}}")
+    parser.add_argument("--quick", action="store_true", help="Grid kecil (8 konfigurasi)")
+    parser.add_argument("--tolerance", type=int, default=0, help="Selisih total (Rp) yang dianggap benar")
+    parser.add_argument("--limit", type=int, default=None, help="Maksimal jumlah gambar")
+    parser.add_argument("--pareto-only", action="store_true", help="Tampilkan hanya Pareto front + baseline")
+    parser.add_argument("--output", help="Simpan hasil ke .csv atau .json")
+    args = parser.parse_args()
+
+    # Log INFO per stage preprocessing terlalu ramai untuk ratusan run
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.grid:
+        with open(args.grid, encoding="utf-8") as f:
+            grid = json.load(f)
+    else:
+        grid = QUICK_GRID if args.quick else DEFAULT_GRID
+
+    rows = run_grid(Path(args.folder), grid, args.tolerance, args.limit)
+    print_table(rows, args.pareto_only)
+
+    if args.output:
+        write_output(rows, args.output)
+        print(f"\n💾 Hasil disimpan ke {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark Startup Time
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Ukur cold start app per mode MIGRATE_ON_STARTUP (deploy / check / skip):
+spawn uvicorn, lalu ukur waktu sampai /health dan /ready membalas 200.
+
+Butuh DATABASE_URL yang valid (migrasi sudah diterapkan).
+
+Usage:
+    python scripts/bench_startup.py --runs 5
+    python scripts/bench_startup.py --modes deploy check --no-warmup
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Optional
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_for(client: httpx.Client, url: str, start: float, timeout: float) -> Optional[float]:
+    """Poll url sampai status 200; return detik sejak start (None jika timeout)."""
+    while time.perf_counter() - start < timeout:
+        try:
+            if client.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure_once(mode: str, port: int, warmup: bool, timeout: float) -> Dict:
+    env = {
+        **os.environ,
+        "MIGRATE_ON_STARTUP": mode,
+        "OCR_WARMUP": "1" if warmup else "0",
+        "STORAGE_MANAGER_ENABLED": "0",
+    }
+    base_url = f"http://127.0.0.1:{port}"
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        with httpx.Client() as client:
+            health = _wait_for(client, f"{base_url}/health", start, timeout)
+            ready = _wait_for(client, f"{base_url}/ready", start, timeout)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    return {"health_s": health, "ready_s": ready}
+
+
+def _fmt(values) -> str:
+    values = [v for v in values if v is not None]
+    if not values:
+        return "timeout"
+    return f"{statistics.median(values):6.2f}s (min {min(values):.2f}s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark startup per MIGRATE_ON_STARTUP mode")
+    parser.add_argument("--modes", nargs="+", default=["deploy", "check", "skip"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-warmup", action="store_true", help="Set OCR_WARMUP=0")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        runs = []
+        for i in range(args.runs):
+            result = measure_once(mode, args.port, not args.no_warmup, args.timeout)
+            print(f"  {mode:<7} run {i + 1}: health={result['health_s']} ready={result['ready_s']}")
+            runs.append(result)
+        results[mode] = runs
+
+    print("\n" + "=" * 60)
+    print("  STARTUP TIME (median)")
+    print("=" * 60)
+    print(f"   {'mode':<8} {'/health':<24} {'/ready':<24}")
+    for mode, runs in results.items():
+        print(
+            f"   {mode:<8} {_fmt(r['health_s'] for r in runs):<24} "
+            f"{_fmt(r['ready_s'] for r in runs):<24}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,16 @@ Test script untuk verify OCR pipeline:
 1. Test preprocessing
 2. Test Tesseract
 3. Test full pipeline
+
+Reprocess backlog folder (batch OCR):
+    python scripts/test_ocr.py --batch upload/receipts --workers 4 --output results.jsonl
 """
 
 import sys
 import os
+import json
+import time
+import argparse
 import logging
 from pathlib import Path
 
@@ -155,10 +161,74 @@ def test_preprocessing_only():
         traceback.print_exc()
         return False
 
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+def run_batch(folder: str, workers: int = None, ocr_workers: int = None, output: str = None):
+    """
+    Reprocess semua image di folder lewat OCRService.iter_batch
+    """
+    print("=" * 60)
+    print("BATCH OCR")
+    print("=" * 60)
+    
+    paths = sorted(
+        str(p) for p in Path(folder).rglob("*")
+        if p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    
+    if not paths:
+        print(f"\n⚠️  No images found in: {folder}")
+        return False
+    
+    print(f"\n📂 {len(paths)} images in {folder}")
+    
+    ocr_service = OCRService()
+    out_file = open(output, "w", encoding="utf-8") if output else None
+    start = time.perf_counter()
+    
+    try:
+        for done, result in enumerate(
+            ocr_service.iter_batch(paths, preprocess_workers=workers, ocr_workers=ocr_workers),
+            1
+        ):
+            rate = done / (time.perf_counter() - start)
+            if result["success"]:
+                print(f"   [{done}/{len(paths)}] ✅ {result['path']} "
+                      f"conf={result['metadata']['confidence']:.1f}% ({rate:.2f} img/s)")
+            else:
+                print(f"   [{done}/{len(paths)}] ❌ {result['path']}: {result['error']}")
+            
+            if out_file:
+                out_file.write(json.dumps(result, default=str) + "\n")
+    finally:
+        if out_file:
+            out_file.close()
+    
+    stats = ocr_service.last_batch_stats
+    print("\n" + "=" * 60)
+    print(f"Processed: {stats['success']}/{stats['images']} successful")
+    print(f"Elapsed:   {stats['elapsed_s']}s")
+    print(f"Throughput: {stats['images_per_sec']} images/sec")
+    if output:
+        print(f"Results:   {output}")
+    
+    return stats["success"] == stats["images"]
+
 def main():
     """
     Run all OCR tests
     """
+    parser = argparse.ArgumentParser(description="OCR pipeline tests / batch reprocess")
+    parser.add_argument("--batch", metavar="FOLDER", help="Reprocess semua image di folder")
+    parser.add_argument("--workers", type=int, default=None, help="Jumlah process preprocessing")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="Jumlah thread OCR")
+    parser.add_argument("--output", metavar="FILE", help="Simpan hasil batch ke JSONL")
+    args = parser.parse_args()
+    
+    if args.batch:
+        ok = run_batch(args.batch, args.workers, args.ocr_workers, args.output)
+        sys.exit(0 if ok else 1)
+    
     print("\n🧪 Starting OCR Tests...\n")
     
     # Test 1: Preprocessing only
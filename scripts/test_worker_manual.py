@@ -15,6 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.connection import connect_db, prisma
 from worker import process_text_message, process_image_message
+from worker.utils.compression import decompress_text
 
 # Setup logging
 logging.basicConfig(
@@ -211,7 +212,7 @@ async def view_transactions():
         print(f"   Source      : {tx.extra}")
         print(f"   Created     : {tx.createdAt}")
         if tx.llmResponse:
-            print(f"   Input Text  : {tx.llmResponse.inputText[:50]}...")
+            print(f"   Input Text  : {decompress_text(tx.llmResponse.inputText)[:50]}...")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+import pytest
+
+import worker.worker_main as worker_main
+from worker.services.category_cache import category_cache
+
+USER_ID = 900001
+
+
+@pytest.fixture(autouse=True)
+def learned_history(monkeypatch):
+    monkeypatch.setattr(worker_main, "CATEGORY_CACHE_ENABLED", True)
+    category_cache.learn(USER_ID, "kopi", "minuman", "expense")
+
+
+def test_clear_amount_is_resolved_from_cache():
+    result = worker_main._category_cache_parse(USER_ID, "kopi 20rb")
+
+    assert result is not None
+    assert result["parsed"]["amount"] == 20000
+    assert result["parsed"]["category"] == "minuman"
+    assert result["needs_review"] is False
+
+
+@pytest.mark.parametrize("text", [
+    "kopi Rp 25.000,00",  # regression: sempat tersimpan Rp 2.500.000 tanpa review
+    "kopi 25.000,50",
+    "kopi 1,5 juta",
+    "2 kopi 20rb",
+])
+def test_decimal_comma_or_ambiguous_amount_goes_to_llm(text):
+    assert worker_main._category_cache_parse(USER_ID, text) is None
+
+
+def test_sanity_flags_route_cache_hit_to_review(monkeypatch):
+    monkeypatch.setattr(worker_main, "CATEGORY_CACHE_CONFIDENCE", 0.5)
+
+    result = worker_main._category_cache_parse(USER_ID, "kopi 20rb")
+
+    assert result["needs_review"] is True
+    assert result["category_cache"]["sanity_flags"]
@@ -0,0 +1,40 @@
+import pytest
+
+from worker.services import sanity_checks
+from worker.services.sanity_checks import run_sanity_checks
+
+
+def _parsed(category, amount=25000, confidence=0.9):
+    return {"amount": amount, "confidence": confidence, "category": category}
+
+
+@pytest.mark.parametrize("category", ["makan", "food", "Transport"])
+def test_exact_or_alias_category_not_flagged(category):
+    result = run_sanity_checks(_parsed(category))
+
+    assert result["category_similarity"] == 1.0
+    assert "Low Category Similarity" not in result["flags"]
+    assert result["needs_review"] is False
+
+
+def test_unknown_category_fallback_needs_review():
+    result = run_sanity_checks(_parsed("zzzqqq"))
+
+    assert result["normalized_category"] == "lainnya"
+    assert result["category_similarity"] == 0.0
+    assert "Low Category Similarity" in result["flags"]
+    assert result["needs_review"] is True
+
+
+def test_fuzzy_category_below_threshold_needs_review(monkeypatch):
+    # "trasnport" → "transport" (1 transposisi, similarity ~0.89)
+    clear = run_sanity_checks(_parsed("trasnport"))
+    assert clear["normalized_category"] == "transportasi"
+    assert 0.0 < clear["category_similarity"] < 1.0
+    assert clear["needs_review"] is False
+
+    monkeypatch.setattr(sanity_checks, "CATEGORY_MIN_SIMILARITY", 0.95)
+    low = run_sanity_checks(_parsed("trasnport"))
+    assert "Low Category Similarity" in low["flags"]
+    assert low["needs_review"] is True
+    assert low["adjusted_confidence"] < clear["adjusted_confidence"]
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from PIL import Image
+
+from app.services import storage_service
+from app.services.storage_service import (
+    STATE_COMPRESS_FAILED,
+    STATE_COMPRESSED,
+    STATE_PURGED,
+    compress_processed_receipts,
+)
+
+
+class FakeReceipts:
+    """prisma.receipt minimal: find_many mengembalikan receipt state "original"."""
+
+    def __init__(self, receipts):
+        self.rows = {r.id: r for r in receipts}
+
+    async def find_many(self, where, order, take):
+        rows = [r for r in self.rows.values() if r.storageState == where["storageState"]]
+        return sorted(rows, key=lambda r: r.id)[:take]
+
+    async def update(self, where, data):
+        for key, value in data.items():
+            setattr(self.rows[where["id"]], key, value)
+
+
+def _receipt(receipt_id, path, size=1000):
+    return SimpleNamespace(
+        id=receipt_id, filePath=str(path), fileSize=size, storageState="original"
+    )
+
+
+def test_failed_rows_do_not_block_later_sweeps(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, "THUMBNAIL_FORMAT", "webp")
+
+    good = tmp_path / "good.jpg"
+    Image.new("RGB", (64, 64), "white").save(good)
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+
+    receipts = FakeReceipts([
+        _receipt(1, tmp_path / "missing.jpg"),
+        _receipt(2, broken),
+        _receipt(3, good),
+    ])
+    prisma = SimpleNamespace(receipt=receipts)
+
+    # Batch 2: dua receipt tertua gagal, tapi tidak diambil lagi di sweep berikutnya
+    first = asyncio.run(compress_processed_receipts(prisma, batch_size=2))
+    assert first["compressed"] == 0
+    assert receipts.rows[1].storageState == STATE_PURGED
+    assert receipts.rows[1].fileSize == 0
+    assert receipts.rows[2].storageState == STATE_COMPRESS_FAILED
+
+    second = asyncio.run(compress_processed_receipts(prisma, batch_size=2))
+    assert second["compressed"] == 1
+    assert receipts.rows[3].storageState == STATE_COMPRESSED
+    assert not good.exists()
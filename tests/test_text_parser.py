@@ -0,0 +1,33 @@
+import pytest
+
+from worker.services.text_parser import amount_tokens, parse_text_amount
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("kopi 20rb", 20000),
+    ("gaji 1,5jt", 1500000),
+    ("makan 25.000", 25000),
+    ("parkir 5000", 5000),
+    ("kopi Rp 25.000,00", 25000),
+    ("Rp 25.000,50", 25000),
+    ("makan 25.000,00", 25000),
+    ("makan 25.000,50", 25000),
+    ("bayar 1.500.000,00", 1500000),
+    ("bayar kos januari 2024 1500000", 1500000),
+    ("bayar 12/03/2024 50rb", 50000),
+    ("kopi 2 gelas", None),
+])
+def test_parse_text_amount(text, expected):
+    assert parse_text_amount(text) == expected
+
+
+@pytest.mark.parametrize("text", ["kopi Rp 25.000,00", "makan 25.000,00", "Rp 25.000,50", "kopi 20rb"])
+def test_cents_tail_is_clear_after_thousands(text):
+    [token] = amount_tokens(text)
+    assert token.clear
+
+
+@pytest.mark.parametrize("text", ["bayar 100.5", "Rp 125.00", "makan 25,000"])
+def test_ambiguous_tail_is_not_clear(text):
+    [token] = amount_tokens(text)
+    assert not token.clear
@@ -0,0 +1,50 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from worker.services.transaction_service import save_ocr_result
+
+
+class FakeOcrTexts:
+    """prisma.ocrtext minimal: find_first / create / update per receiptId."""
+
+    def __init__(self):
+        self.rows = []
+
+    async def find_first(self, where):
+        return next((r for r in self.rows if r.receiptId == where["receiptId"]), None)
+
+    async def create(self, data):
+        row = SimpleNamespace(id=len(self.rows) + 1, **data)
+        self.rows.append(row)
+        return row
+
+    async def update(self, where, data):
+        row = next(r for r in self.rows if r.id == where["id"])
+        for key, value in data.items():
+            setattr(row, key, value)
+        return row
+
+
+def test_save_ocr_result_retry_updates_existing_row():
+    db = SimpleNamespace(ocrtext=FakeOcrTexts())
+
+    first = asyncio.run(save_ocr_result(7, "kopi 25000", 80.0, db=db))
+    second = asyncio.run(save_ocr_result(7, "kopi 25.000", 91.0, db=db))
+
+    assert first["id"] == second["id"]
+    assert len(db.ocrtext.rows) == 1
+    row = db.ocrtext.rows[0]
+    assert row.ocrRaw == "kopi 25.000"
+    assert json.loads(row.ocrMeta) == {"confidence": 91.0}
+    assert isinstance(row.createdAt, datetime)
+
+
+def test_save_ocr_result_separate_receipts_get_own_rows():
+    db = SimpleNamespace(ocrtext=FakeOcrTexts())
+
+    asyncio.run(save_ocr_result(1, "a", 50.0, db=db))
+    asyncio.run(save_ocr_result(2, "b", 50.0, db=db))
+
+    assert [r.receiptId for r in db.ocrtext.rows] == [1, 2]
@@ -1,11 +1,30 @@
-from .worker_main import (
-    process_text_message,
-    process_image_message,
-    process_message_background
-)
-
-__all__ = [
-    "process_text_message",
-    "process_image_message",
-    "process_message_background"
-]
\ No newline at end of file
+# Worker Package
+#
+# Export di-load lazy (PEP 562): `import worker` tidak langsung memuat
+# worker_main beserta dependensinya. Modul baru di-import saat atribut
+# pertama kali diakses, mis. `worker.process_text_message(...)`.
+import importlib
+
+_LAZY_EXPORTS = {
+    "process_text_message": "worker_main",
+    "process_image_message": "worker_main",
+    "process_message_background": "worker_main",
+    "startup_worker": "worker_main",
+    "shutdown_worker": "worker_main",
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
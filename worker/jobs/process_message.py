@@ -5,7 +5,7 @@ from app.models import InputType, IntentType
 from worker.llm.prompts import build_prompt
 from .llm.llm_client import call_llm
 from worker.llm.parser import parse_llm_response
-from worker.services.ocr_service import OCRService
+from worker.ocr.engines import get_ocr_service
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +31,7 @@ class ProcessMessageJob:
             self.input_type = InputType.TEXT  # default ke text
             
         self.data = data
-        self.ocr_service = OCRService()
+        self.ocr_service = get_ocr_service()
 
     """Job buat ekseskusi pesan"""
     async def execute(self) -> Optional[Dict]:
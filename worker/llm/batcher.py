@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# handler(user_id, source, messages) -> satu hasil per pesan (urutan sama);
+# hasil berupa Exception diteruskan sebagai exception ke pemanggil pesan itu
+BatchHandler = Callable[[int, str, List[List[str]]], Awaitable[List[Any]]]
+
+
+class TextBatcher:
+    """
+    Kumpulkan pesan teks per user dalam window singkat, lalu proses
+    sekaligus dengan satu call LLM.
+
+    Tiap pesan sudah dipecah jadi list item (lihat
+    `prompts.split_multi_item_message`). Pemanggil `submit` menunggu
+    sampai batch-nya selesai dan menerima hasil untuk pesannya sendiri.
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        window_ms: int = 800,
+        max_items: int = 20
+    ):
+        """
+        Args:
+            handler: Coroutine yang memproses semua pesan dalam satu batch
+            window_ms: Lama window pengumpulan per user (0 = batching mati)
+            max_items: Batas item per batch; batch langsung di-flush jika tercapai
+        """
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._pending: Dict[Tuple[int, str], List[Tuple[List[str], asyncio.Future]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, user_id: int, source: str, items: List[str]) -> Any:
+        """Masukkan satu pesan ke batch user dan tunggu hasilnya."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (user_id, source)
+
+        bucket = self._pending.get(key)
+        if bucket is None:
+            bucket = self._pending[key] = []
+            loop.call_later(self.window, self._schedule_flush, key)
+
+        bucket.append((items, future))
+
+        if sum(len(entry[0]) for entry in bucket) >= self.max_items:
+            self._schedule_flush(key)
+
+        return await future
+
+    def _schedule_flush(self, key: Tuple[int, str]) -> None:
+        if key not in self._pending:
+            return
+        task = asyncio.ensure_future(self._flush(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key: Tuple[int, str]) -> None:
+        bucket = self._pending.pop(key, None)
+        if not bucket:
+            return
+
+        user_id, source = key
+        logger.info(
+            "Flushing text batch for user %s: %s messages",
+            user_id, len(bucket)
+        )
+
+        try:
+            results = await self.handler(user_id, source, [items for items, _ in bucket])
+            for (_, future), result in zip(bucket, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in bucket:
+                if not future.done():
+                    future.set_exception(e)
@@ -1,65 +1,376 @@
 import os
 import time
+import hashlib
 import logging
-from typing import Dict, Any
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional, Tuple
 
-from groq import Groq
+from app.utils.metrics import (
+    LLM_BREAKER_STATE,
+    LLM_CALL_DURATION,
+    LLM_ESCALATIONS,
+    LLM_LIMITER_WAIT,
+    LLM_PARSE_ATTEMPTS,
+    LLM_RATE_LIMITED,
+    LLM_RETRY_TOKENS,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TIME_TO_JSON,
+    PARSE_DURATION,
+    observe,
+    record_failure,
+    record_llm_usage,
+)
+from worker.llm.parser import IncrementalJSONExtractor, ParserError
+from worker.llm.prompts import REPAIR_SYSTEM_PROMPT, SYSTEM_PROMPT, build_repair_prompt
+from worker.llm.rate_limit import (
+    CircuitBreaker,
+    RateLimiter,
+    RateLimitTimeout,
+    parse_duration,
+)
+from worker.llm.router import LLM_ESCALATE_MIN_CONFIDENCE, LLM_MODEL_SMALL, router
+
+if TYPE_CHECKING:
+    from groq import Groq
 
 logger = logging.getLogger(__name__)
 
-DEFAULT_MODEL = "llama-3.1-8b-instant"
+DEFAULT_MODEL = LLM_MODEL_SMALL
+
+# Kuota tier Groq per model (0 = tidak dibatasi di sisi kita)
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+# Estimasi token completion untuk reservasi TPM sebelum call
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "200"))
+# Maksimal antri menunggu kuota; lebih dari ini → fallback
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "20"))
+
+# Circuit breaker: buka setelah N kegagalan beruntun, tutup lagi setelah cooldown
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Streaming: baca token bertahap dan tutup stream begitu blok JSON lengkap.
+# Hanya untuk call batch (JSON array): call satu object memakai JSON mode,
+# yang di Groq tidak bisa streaming
+LLM_STREAM_ENABLED = os.getenv("LLM_STREAM", "1") == "1"
+# Batas token completion (output transaksi hanya satu JSON kecil)
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "512"))
+
+# JSON mode (response_format json_object) untuk call yang mengharapkan satu
+# JSON object (pesan teks tunggal, struk). Selalu non-streaming.
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1") == "1"
+# Satu call perbaikan ke model yang sama saat output gagal validasi schema
+LLM_REPAIR_ENABLED = os.getenv("LLM_REPAIR", "1") == "1"
+
+# Cache response per (model, system prompt, prompt): retry job / eskalasi
+# yang gagal tidak membayar ulang call model primer (0 = mati)
+LLM_RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "256"))
+LLM_RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", "900"))
+
+_BREAKER_STATE_VALUES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
 
 
 class LLMAPIError(Exception):
     pass
 
 
-_client: Groq | None = None
+class LLMUnavailableError(LLMAPIError):
+    """
+    LLM sengaja tidak dipanggil: circuit open atau kuota rate limit
+    tidak tersedia dalam LLM_QUEUE_TIMEOUT_SECONDS. Pemanggil sebaiknya
+    memakai jalur fallback (parser rule-based / needsReview).
+    """
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(f"LLM tidak tersedia ({reason}), retry dalam {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+_client: Optional["Groq"] = None
+
 
+def get_breaker(model_name: str) -> CircuitBreaker:
+    """Circuit breaker per model (router bisa pindah ke model lain saat open)."""
+    breaker = _breakers.get(model_name)
+    if breaker is None:
+        def on_state_change(state: str) -> None:
+            LLM_BREAKER_STATE.labels(model=model_name).set(_BREAKER_STATE_VALUES[state])
+            logger.warning("LLM circuit breaker %s → %s", model_name, state)
 
-def _get_client() -> Groq:
+        with _limiters_lock:
+            breaker = _breakers.setdefault(model_name, CircuitBreaker(
+                failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+                cooldown_seconds=LLM_BREAKER_COOLDOWN_SECONDS,
+                on_state_change=on_state_change,
+            ))
+    return breaker
+
+
+def _breaker_available(model_name: str) -> bool:
+    return get_breaker(model_name).state != CircuitBreaker.OPEN
+
+
+class _ResponseCache:
+    """LRU + TTL kecil untuk response LLM (thread-safe)."""
+
+    def __init__(self, size: int, ttl_seconds: float):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name: str, system_prompt: str, prompt: str) -> str:
+        raw = "\x00".join((model_name, system_prompt, prompt))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_response_cache = _ResponseCache(LLM_RESPONSE_CACHE_SIZE, LLM_RESPONSE_CACHE_TTL_SECONDS)
+
+
+def get_limiter(model_name: str) -> RateLimiter:
+    """Token bucket per model (kuota Groq dihitung per model)."""
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.setdefault(
+                model_name, RateLimiter(GROQ_RPM_LIMIT, GROQ_TPM_LIMIT)
+            )
+    return limiter
+
+
+def _estimate_tokens(messages: list) -> int:
+    chars = sum(len(m["content"]) for m in messages)
+    return chars // 4 + LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+def _retry_after(error: Exception) -> float:
+    """Detik tunggu dari header 429 (retry-after, lalu x-ratelimit-reset-*)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return LLM_BREAKER_COOLDOWN_SECONDS
+
+
+def _get_client() -> "Groq":
     global _client
     if _client is None:
+        # Import lazy: SDK groq (+ httpx/pydantic models) baru di-load saat call pertama
+        from groq import Groq
+
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise LLMAPIError("GROQ_API_KEY tidak ditemukan di environment")
-        _client = Groq(api_key=api_key)
+        # Retry diatur call_llm (limiter + breaker), bukan retry bawaan SDK
+        _client = Groq(api_key=api_key, max_retries=0)
     return _client
 
 
+def _failed_generation(error: Exception) -> Optional[str]:
+    """
+    Output model yang ditolak validasi JSON mode Groq (400
+    json_validate_failed). Output ini tetap berguna untuk repair.
+    """
+    if getattr(error, "status_code", None) != 400:
+        return None
+    body = getattr(error, "body", None)
+    if not isinstance(body, dict):
+        return None
+    detail = body.get("error", body)
+    if not isinstance(detail, dict) or detail.get("code") != "json_validate_failed":
+        return None
+    generation = detail.get("failed_generation")
+    return generation if isinstance(generation, str) and generation.strip() else None
+
+
+def _complete(
+    client: "Groq",
+    model_name: str,
+    messages: list,
+    json_mode: bool = False
+) -> Tuple[str, Any, Any, Dict]:
+    """Call non-streaming. Returns (text, usage, headers, timing)."""
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    raw_response = client.chat.completions.with_raw_response.create(
+        model=model_name,
+        messages=messages,
+        temperature=0,
+        max_tokens=LLM_MAX_TOKENS,
+        **extra
+    )
+    response = raw_response.parse()
+    return (
+        response.choices[0].message.content,
+        getattr(response, "usage", None),
+        raw_response.headers,
+        {},
+    )
+
+
+def _stream_complete(
+    client: "Groq",
+    model_name: str,
+    messages: list,
+) -> Tuple[str, Any, Any, Dict]:
+    """
+    Call streaming (batch): token dikumpulkan ke IncrementalJSONExtractor
+    dan stream ditutup begitu blok JSON pertama lengkap (teks penutup
+    model tidak ditunggu).
+
+    Returns:
+        (text, usage, headers, timing) — timing berisi ttft_ms, json_ms,
+        early_stop. Jika stream ditutup sebelum chunk usage terakhir,
+        usage diestimasi dari panjang teks (usage_estimated=True).
+    """
+    start = time.perf_counter()
+    raw_response = client.chat.completions.with_raw_response.create(
+        model=model_name,
+        messages=messages,
+        temperature=0,
+        max_tokens=LLM_MAX_TOKENS,
+        stream=True
+    )
+    stream = raw_response.parse()
+    extractor = IncrementalJSONExtractor("array")
+    timing: Dict[str, Any] = {"ttft_ms": None, "json_ms": None, "early_stop": False}
+    usage = None
+
+    try:
+        for chunk in stream:
+            x_groq = getattr(chunk, "x_groq", None)
+            chunk_usage = getattr(chunk, "usage", None) or getattr(x_groq, "usage", None)
+            if chunk_usage is not None:
+                usage = chunk_usage
+
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content
+            if not piece:
+                continue
+
+            if timing["ttft_ms"] is None:
+                timing["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                LLM_TIME_TO_FIRST_TOKEN.labels(model=model_name).observe(timing["ttft_ms"] / 1000)
+
+            if extractor.feed(piece) is not None:
+                timing["json_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                LLM_TIME_TO_JSON.labels(model=model_name).observe(timing["json_ms"] / 1000)
+                timing["early_stop"] = chunk.choices[0].finish_reason is None
+                break
+    finally:
+        stream.close()
+
+    text = extractor.text
+    if usage is None:
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        completion_tokens = max(1, len(text) // 4)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        timing["usage_estimated"] = True
+
+    return text, usage, raw_response.headers, timing
+
+
 def call_llm(
     prompt: str,
-    model_name: str = DEFAULT_MODEL,
+    model_name: Optional[str] = None,
     max_retries: int = 3,
-    backoff_base: float = 0.8
+    backoff_base: float = 0.8,
+    system_prompt: Optional[str] = None,
+    input_source: str = "text",
+    stream: Optional[bool] = None,
+    json_mode: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Memanggil LLM dan SELALU mengembalikan dict dengan text string valid.
+
+    `system_prompt` bisa dioverride (mis. untuk mode batch yang meminta
+    JSON array); default-nya SYSTEM_PROMPT (satu JSON object).
+
+    Tanpa `model_name`, model dipilih router dari `input_source` dan
+    panjang prompt (lihat worker.llm.router).
+
+    Call batch (JSON array) streaming (default LLM_STREAM=1) dan berhenti
+    membaca begitu JSON lengkap; output maksimal LLM_MAX_TOKENS token.
+    Call yang mengharapkan satu JSON object selalu non-streaming, dengan
+    JSON mode (default LLM_JSON_MODE=1). Output yang ditolak validasi JSON
+    mode dikembalikan apa adanya (json_mode_rejected=True) untuk divalidasi
+    / diperbaiki pemanggil.
+
+    Call bersifat blocking (termasuk menunggu kuota di token bucket),
+    jalankan lewat asyncio.to_thread dari kode async.
+
+    Returns:
+        Dict text, model, usage, latency_ms, cached (+ ttft_ms, json_ms,
+        early_stop untuk streaming)
+
+    Raises:
+        LLMUnavailableError: Circuit open / kuota tidak tersedia (pakai fallback)
+        LLMAPIError: Semua retry gagal
     """
     if not isinstance(prompt, str) or not prompt.strip():
         raise LLMAPIError("Prompt harus berupa string non-kosong")
 
+    system_prompt = system_prompt or SYSTEM_PROMPT
+    if model_name is None:
+        model_name = router.choose(input_source, len(prompt), available=_breaker_available)
+
+    cache_key = _ResponseCache.key(model_name, system_prompt, prompt)
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("LLM response cache hit (%s)", model_name)
+        return {**cached, "latency_ms": 0.0, "cached": True}
+
+    breaker = get_breaker(model_name)
+    if not breaker.allow():
+        raise LLMUnavailableError("circuit_open", breaker.retry_after())
+
     last_err = None
     client = _get_client()
+    limiter = get_limiter(model_name)
 
     messages = [
         {
             "role": "system",
-            "content": (
-                "You are a transaction parser for a finance application.\n"
-                "Output MUST be a single valid JSON object.\n"
-                "Do NOT include explanations, markdown, or extra text.\n\n"
-                "JSON schema:\n"
-                "{\n"
-                '  "intent": "income | expense",\n'
-                '  "amount": number,\n'
-                '  "currency": "IDR",\n'
-                '  "date": string | null,\n'
-                '  "category": string,\n'
-                '  "note": string,\n'
-                '  "confidence": number\n'
-                "}"
-            )
+            "content": system_prompt
         },
         {
             "role": "user",
@@ -67,33 +378,289 @@ def call_llm(
         }
     ]
 
+    if stream is None:
+        stream = LLM_STREAM_ENABLED
+    if json_mode is None:
+        json_mode = LLM_JSON_MODE
+    # Batch (root array): streaming tanpa JSON mode. Root object: JSON mode
+    # Groq (hanya untuk object, tidak bisa streaming), tanpa streaming
+    batch = input_source == "text_batch"
+    stream = stream and batch
+    json_mode = json_mode and not batch
+
+    estimated_tokens = _estimate_tokens(messages)
+    start = time.perf_counter()
+
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                temperature=0
-            )
+            waited = limiter.acquire(estimated_tokens, LLM_QUEUE_TIMEOUT_SECONDS)
+        except RateLimitTimeout as e:
+            raise LLMUnavailableError("rate_limited", e.wait_seconds) from last_err
+        LLM_LIMITER_WAIT.observe(waited)
 
-            text = response.choices[0].message.content
+        attempt_start = time.perf_counter()
+        try:
+            if stream:
+                text, usage, headers, timing = _stream_complete(
+                    client, model_name, messages
+                )
+            else:
+                text, usage, headers, timing = _complete(
+                    client, model_name, messages, json_mode
+                )
 
             if not isinstance(text, str) or not text.strip():
                 raise LLMAPIError("LLM mengembalikan teks kosong atau invalid")
 
             logger.debug("RAW LLM OUTPUT:\n%s", text)
 
-            return {
+            breaker.record_success()
+            # Koreksi estimasi dengan usage, lalu clamp ke sisa kuota dari header
+            limiter.settle(estimated_tokens, getattr(usage, "total_tokens", None))
+            limiter.sync(headers)
+            LLM_CALL_DURATION.labels(model=model_name).observe(
+                time.perf_counter() - start
+            )
+            record_llm_usage(model_name, usage)
+            router.record(model_name, (time.perf_counter() - attempt_start) * 1000, ok=True)
+
+            result = {
                 "text": text,
                 "model": model_name,
-                "usage": getattr(response, "usage", None)
+                "usage": usage
+            }
+            _response_cache.put(cache_key, result)
+            return {
+                **result,
+                **timing,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                "cached": False,
             }
 
         except Exception as e:
+            rejected = _failed_generation(e)
+            if rejected is not None:
+                # Provider sehat, hanya output-nya yang tidak valid: bukan
+                # kegagalan breaker, dan tidak di-cache (retry job bisa dapat output lain)
+                logger.warning("LLM output rejected by JSON mode (%s)", model_name)
+                breaker.record_success()
+                router.record(model_name, (time.perf_counter() - attempt_start) * 1000, ok=True)
+                return {
+                    "text": rejected,
+                    "model": model_name,
+                    "usage": None,
+                    "json_mode_rejected": True,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "cached": False,
+                }
+
             last_err = e
+            record_failure("llm_call", e)
+            router.record(model_name, (time.perf_counter() - attempt_start) * 1000, ok=False)
             logger.warning(
                 "LLM error (attempt %s/%s): %s",
                 attempt + 1, max_retries, e
             )
+
+            if getattr(e, "status_code", None) == 429:
+                # Rate limit: tahan semua request di limiter selama retry-after.
+                # Jika terlalu lama untuk diantri, buka circuit → fallback.
+                LLM_RATE_LIMITED.labels(model=model_name).inc()
+                retry_after = _retry_after(e)
+                limiter.pause(retry_after)
+                if retry_after > LLM_QUEUE_TIMEOUT_SECONDS:
+                    breaker.trip(retry_after)
+                    raise LLMUnavailableError("rate_limited", retry_after) from e
+                continue
+
+            breaker.record_failure()
+            if breaker.state == CircuitBreaker.OPEN:
+                raise LLMUnavailableError("circuit_open", breaker.retry_after()) from e
             time.sleep(backoff_base * (2 ** attempt))
 
     raise LLMAPIError("Gagal memanggil LLM") from last_err
+
+
+def _call_stats(response: Dict[str, Any], escalated_reason: Optional[str] = None) -> Dict[str, Any]:
+    """Ringkasan per call untuk llmMeta (latency + token per model)."""
+    usage = response.get("usage")
+    stats = {
+        "model": response["model"],
+        "latency_ms": response.get("latency_ms"),
+        "cached": response.get("cached", False),
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+    }
+    for key in ("ttft_ms", "json_ms", "early_stop", "usage_estimated", "json_mode_rejected"):
+        if response.get(key) is not None:
+            stats[key] = response[key]
+    if escalated_reason:
+        stats["escalated"] = escalated_reason
+    return stats
+
+
+def _min_confidence(parsed: Any) -> float:
+    items = parsed if isinstance(parsed, list) else [parsed]
+    return min((float(item.get("confidence", 0.0)) for item in items), default=0.0)
+
+
+def _parse_attempt(parse: Callable[[str], Any], text: str, input_source: str, stage: str) -> Any:
+    """Parse + metrics per tahap (primary / repair / escalation)."""
+    try:
+        with observe(PARSE_DURATION, source=input_source):
+            parsed = parse(text)
+    except ParserError:
+        LLM_PARSE_ATTEMPTS.labels(source=input_source, stage=stage, result="error").inc()
+        raise
+    LLM_PARSE_ATTEMPTS.labels(source=input_source, stage=stage, result="ok").inc()
+    return parsed
+
+
+def _record_retry_tokens(response: Dict[str, Any], input_source: str, kind: str) -> None:
+    """Token yang dibayar untuk call tambahan (repair / eskalasi)."""
+    if response.get("cached"):
+        return
+    total = getattr(response.get("usage"), "total_tokens", None)
+    if total:
+        LLM_RETRY_TOKENS.labels(source=input_source, kind=kind).inc(total)
+
+
+def _repair(
+    response: Dict[str, Any],
+    error: ParserError,
+    parse: Callable[[str], Any],
+    input_source: str,
+) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """
+    Minta model yang sama memperbaiki output yang gagal validasi schema,
+    dengan daftar error validasi sebagai konteks.
+
+    Returns:
+        (response repair, hasil parse). Hasil parse None jika output
+        masih invalid; keduanya None jika call repair gagal
+    """
+    try:
+        repaired = call_llm(
+            build_repair_prompt(response["text"], error.validation_errors),
+            model_name=response["model"],
+            max_retries=1,
+            system_prompt=REPAIR_SYSTEM_PROMPT,
+            input_source=input_source
+        )
+    except LLMAPIError as e:
+        logger.warning("LLM repair call failed (%s): %s", response["model"], e)
+        return None, None
+
+    _record_retry_tokens(repaired, input_source, "repair")
+    try:
+        parsed = _parse_attempt(parse, repaired["text"], input_source, "repair")
+    except ParserError as e:
+        logger.info("LLM repair output still invalid (%s): %s", response["model"], e)
+        return repaired, None
+    return repaired, parsed
+
+
+def call_llm_routed(
+    prompt: str,
+    parse: Callable[[str], Any],
+    input_source: str = "text",
+    system_prompt: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Call model pilihan router, parse, lalu eskalasi ke model besar hanya
+    jika parse gagal atau confidence < LLM_ESCALATE_MIN_CONFIDENCE.
+
+    Output yang gagal validasi schema lebih dulu diperbaiki dengan satu
+    call repair ke model yang sama (LLM_REPAIR=1, lebih murah dari
+    eskalasi); eskalasi hanya jika repair juga gagal.
+
+    Args:
+        prompt: User prompt
+        parse: parse_llm_response / parse_llm_batch_response (boleh lambda)
+        input_source: "text", "text_batch" atau "ocr" (untuk routing + metrics)
+        system_prompt: Override system prompt
+
+    Returns:
+        Dict seperti `call_llm` (dari call yang dipakai) plus:
+            parsed: hasil `parse`
+            calls: list statistik per call (model, latency_ms, token, cached)
+            escalated: alasan eskalasi (None jika tidak)
+            repaired: True jika hasil berasal dari call repair
+
+    Raises:
+        LLMUnavailableError: Call pertama tidak bisa dilakukan
+        ParserError: Output tidak bisa diparse (termasuk setelah eskalasi)
+    """
+    response = call_llm(prompt, system_prompt=system_prompt, input_source=input_source)
+    calls = [_call_stats(response)]
+
+    parse_error: Optional[ParserError] = None
+    parsed = None
+    try:
+        parsed = _parse_attempt(parse, response["text"], input_source, "primary")
+    except ParserError as e:
+        parse_error = e
+
+    if parse_error is not None and LLM_REPAIR_ENABLED:
+        repaired, repaired_parsed = _repair(response, parse_error, parse, input_source)
+        if repaired is not None:
+            calls.append({**_call_stats(repaired), "repair": True})
+        if repaired_parsed is not None:
+            if _min_confidence(repaired_parsed) >= LLM_ESCALATE_MIN_CONFIDENCE:
+                return {
+                    **repaired,
+                    "parsed": repaired_parsed,
+                    "calls": calls,
+                    "escalated": None,
+                    "repaired": True,
+                }
+            # Repair valid tapi confidence rendah: jadi hasil primer untuk eskalasi
+            response, parsed, parse_error = {**repaired, "repaired": True}, repaired_parsed, None
+
+    if parse_error is not None:
+        reason = "parse_error"
+    elif _min_confidence(parsed) < LLM_ESCALATE_MIN_CONFIDENCE:
+        reason = "low_confidence"
+    else:
+        reason = None
+
+    escalation_model = router.escalation_model(response["model"]) if reason else None
+    if escalation_model is None:
+        if parse_error is not None:
+            raise parse_error
+        return {**response, "parsed": parsed, "calls": calls, "escalated": None}
+
+    LLM_ESCALATIONS.labels(
+        from_model=response["model"], to_model=escalation_model, reason=reason
+    ).inc()
+    logger.info("Escalating LLM call %s → %s (%s)", response["model"], escalation_model, reason)
+
+    try:
+        escalated = call_llm(
+            prompt,
+            model_name=escalation_model,
+            system_prompt=system_prompt,
+            input_source=input_source
+        )
+        calls.append(_call_stats(escalated, reason))
+        _record_retry_tokens(escalated, input_source, "escalation")
+        escalated_parsed = _parse_attempt(parse, escalated["text"], input_source, "escalation")
+    except LLMAPIError as e:
+        # Model besar tidak tersedia → pakai hasil primer (jika ada);
+        # tanpa hasil primer, LLMUnavailableError diteruskan ke jalur fallback worker
+        if parse_error is not None:
+            if isinstance(e, LLMUnavailableError):
+                raise
+            raise parse_error from e
+        logger.warning("Escalation to %s failed, keeping primary result: %s", escalation_model, e)
+        return {**response, "parsed": parsed, "calls": calls, "escalated": None}
+    except ParserError:
+        if parse_error is not None:
+            raise
+        return {**response, "parsed": parsed, "calls": calls, "escalated": None}
+
+    # Eskalasi hanya dipakai jika tidak lebih buruk dari hasil primer
+    if parse_error is None and _min_confidence(escalated_parsed) < _min_confidence(parsed):
+        return {**response, "parsed": parsed, "calls": calls, "escalated": None}
+
+    return {**escalated, "parsed": escalated_parsed, "calls": calls, "escalated": reason}
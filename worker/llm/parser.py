@@ -1,10 +1,101 @@
-import json
-import re
-from decimal import Decimal, InvalidOperation
+from pydantic import TypeAdapter, ValidationError
+
+from app.models.schemas import LLMBatchItemSchema, LLMOutputSchema
 
 
 class ParserError(Exception):
-    pass
+    """
+    Output LLM tidak bisa diparse / tidak sesuai schema.
+
+    `validation_errors` berisi daftar error ringkas (tanpa RAW output)
+    untuk repair retry ke LLM.
+    """
+
+    def __init__(self, message: str, validation_errors: str | None = None):
+        super().__init__(message)
+        self.validation_errors = validation_errors or message
+
+
+def _extract_balanced_block(text: str, open_ch: str, close_ch: str) -> str | None:
+    """Ambil blok pertama yang seimbang antara `open_ch` dan `close_ch`."""
+    depth = 0
+    start = None
+
+    for i, ch in enumerate(text):
+        if ch == open_ch:
+            if start is None:
+                start = i
+            depth += 1
+        elif ch == close_ch:
+            if depth:
+                depth -= 1
+                if not depth and start is not None:
+                    return text[start:i + 1]
+
+    return None
+
+
+class IncrementalJSONExtractor:
+    """
+    Versi incremental `_extract_json_block` untuk output streaming.
+
+    Potongan teks di-`feed` satu per satu; begitu blok JSON pertama
+    seimbang, `feed` mengembalikan teks sampai akhir blok sehingga stream
+    bisa ditutup tanpa menunggu sisa output model. Kurung di dalam string
+    JSON (termasuk escape) tidak dihitung.
+
+    Args:
+        root: "object" → tunggu {...}; "array" → [...] atau {...}, mana
+            yang muncul lebih dulu (sama dengan `_extract_json_array_block`)
+    """
+
+    def __init__(self, root: str = "object"):
+        self._openers = "{" if root == "object" else "[{"
+        self._parts: list[str] = []
+        self._open_ch: str | None = None
+        self._close_ch: str | None = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str | None:
+        """Tambah potongan output; return teks lengkap jika blok JSON sudah selesai."""
+        if self.done:
+            return None
+
+        for i, ch in enumerate(chunk):
+            if self._open_ch is None:
+                if ch in self._openers:
+                    self._open_ch = ch
+                    self._close_ch = "}" if ch == "{" else "]"
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == self._open_ch:
+                self._depth += 1
+            elif ch == self._close_ch:
+                self._depth -= 1
+                if not self._depth:
+                    self._parts.append(chunk[:i + 1])
+                    self.done = True
+                    return self.text
+
+        self._parts.append(chunk)
+        return None
 
 
 def _extract_json_block(text: str) -> str:
@@ -16,97 +107,126 @@ def _extract_json_block(text: str) -> str:
         raise ParserError(f"Expected string, got {type(text)}")
 
     # Ambil JSON pertama yang seimbang {}
-    stack = []
-    start = None
+    block = _extract_balanced_block(text, "{", "}")
+    if block is None:
+        raise ParserError("JSON object tidak ditemukan dalam output LLM")
+    return block
 
-    for i, ch in enumerate(text):
-        if ch == "{":
-            if start is None:
-                start = i
-            stack.append(ch)
-        elif ch == "}":
-            if stack:
-                stack.pop()
-                if not stack and start is not None:
-                    return text[start:i + 1]
 
-    raise ParserError("JSON object tidak ditemukan dalam output LLM")
+def _extract_json_array_block(text: str) -> str:
+    """
+    Mengambil JSON array pertama dari teks LLM (mode batch).
+    Jika LLM ternyata hanya mengembalikan satu object, object itu
+    dibungkus menjadi array satu elemen.
+    """
+    if not isinstance(text, str):
+        raise ParserError(f"Expected string, got {type(text)}")
+
+    array_start = text.find("[")
+    object_start = text.find("{")
 
+    if array_start != -1 and (object_start == -1 or array_start < object_start):
+        block = _extract_balanced_block(text, "[", "]")
+        if block is not None:
+            return block
 
-def _normalize_intent(value: str) -> str:
-    if not value:
-        raise ParserError("Intent kosong")
+    return "[" + _extract_json_block(text) + "]"
 
-    v = value.lower()
 
-    if v in ("income", "pemasukan", "masuk"):
-        return "income"
-    if v in ("expense", "pengeluaran", "keluar"):
-        return "expense"
+_BATCH_ADAPTER = TypeAdapter(list[LLMBatchItemSchema])
 
-    raise ParserError(f"Intent tidak dikenali: {value}")
+# Error pydantic yang berarti teks bukan JSON murni (ada teks tambahan)
+_NOT_PURE_JSON = {"json_invalid", "list_type", "model_type"}
 
 
-def _parse_amount(value) -> Decimal:
+def _format_validation_errors(error: ValidationError) -> str:
+    """ValidationError → daftar "- field: pesan" (satu per baris)."""
+    lines = []
+    for err in error.errors():
+        loc = ".".join(str(part) for part in err["loc"]) or "(root)"
+        lines.append(f"- {loc}: {err['msg']}")
+    return "\n".join(lines)
+
+
+def _is_not_pure_json(error: ValidationError) -> bool:
+    return any(err["type"] in _NOT_PURE_JSON and not err["loc"] for err in error.errors())
+
+
+def _validate(validate_json, llm_text: str, extract, label: str):
+    """
+    Parse + validasi schema dalam satu langkah (output JSON mode).
+    Jika teks bukan JSON murni, ambil blok JSON pertama lalu validasi ulang.
+    """
+    if not isinstance(llm_text, str):
+        raise ParserError(f"Expected string, got {type(llm_text)}")
+
     try:
-        if isinstance(value, (int, float, Decimal)):
-            return Decimal(str(value))
+        return validate_json(llm_text)
+    except ValidationError as e:
+        if not _is_not_pure_json(e):
+            errors = _format_validation_errors(e)
+            raise ParserError(f"{label} tidak sesuai schema:\n{errors}\nRAW:\n{llm_text}", errors) from e
 
-        if isinstance(value, str):
-            v = value.lower().replace(" ", "")
-            v = v.replace("jt", "000000")
-            v = v.replace("juta", "000000")
-            v = v.replace("rb", "000")
-            return Decimal(v)
+    block = extract(llm_text)
+    try:
+        return validate_json(block)
+    except ValidationError as e:
+        errors = _format_validation_errors(e)
+        raise ParserError(f"{label} tidak sesuai schema:\n{errors}\nRAW:\n{llm_text}", errors) from e
 
-        raise ParserError(f"Format amount tidak valid: {value}")
 
-    except InvalidOperation:
-        raise ParserError(f"Gagal parse amount: {value}")
+def _to_transaction(item: LLMOutputSchema, llm_text: str) -> dict:
+    data = item.model_dump(include=set(LLMOutputSchema.model_fields))
+    data["raw_output"] = llm_text
+    return data
 
 
 def parse_llm_response(llm_text: str) -> dict:
     """
-    Mengubah teks LLM menjadi dict transaksi yang tervalidasi dan ternormalisasi.
+    Mengubah teks LLM menjadi dict transaksi yang tervalidasi
+    (app.models.schemas.LLMOutputSchema) dan ternormalisasi.
     """
-    try:
-        json_text = _extract_json_block(llm_text)
-        data = json.loads(json_text)
-
-        required_fields = [
-            "intent",
-            "amount",
-            "currency",
-            "date",
-            "category",
-            "note",
-            "confidence"
-        ]
-
-        for field in required_fields:
-            if field not in data:
-                raise ParserError(f"Field '{field}' tidak ditemukan")
-
-        intent = _normalize_intent(data["intent"])
-        amount = _parse_amount(data["amount"])
-
-        try:
-            confidence = float(data["confidence"])
-        except (TypeError, ValueError):
-            raise ParserError(f"Confidence tidak valid: {data['confidence']}")
-
-        return {
-            "intent": intent,
-            "amount": amount,
-            "currency": str(data["currency"]).upper(),
-            "date": data["date"],
-            "category": str(data["category"]).lower(),
-            "note": str(data["note"]),
-            "confidence": confidence,
-            "raw_output": llm_text
-        }
-
-    except (json.JSONDecodeError, TypeError, ValueError) as e:
+    item = _validate(
+        LLMOutputSchema.model_validate_json, llm_text, _extract_json_block, "LLM response"
+    )
+    return _to_transaction(item, llm_text)
+
+
+def parse_llm_batch_response(llm_text: str, expected_count: int | None = None) -> list[dict]:
+    """
+    Parse output mode batch (JSON array) menjadi list transaksi.
+
+    Tiap item punya key "ref" (nomor item input, 1-based). Jika LLM tidak
+    mengisi "ref", urutan array dipakai sebagai ref.
+
+    Raises:
+        ParserError: Jika array tidak valid, jumlah item tidak sesuai, atau
+            ref bukan tepat 1..n tanpa duplikat
+    """
+    items = _validate(
+        _BATCH_ADAPTER.validate_json, llm_text, _extract_json_array_block, "LLM batch response"
+    )
+    if not items:
+        raise ParserError("JSON array kosong atau tidak valid", "- (root): array is empty")
+
+    results = []
+    for position, item in enumerate(items, 1):
+        parsed = _to_transaction(item, llm_text)
+        parsed["ref"] = item.ref if item.ref is not None else position
+        results.append(parsed)
+
+    if expected_count is not None and len(results) != expected_count:
         raise ParserError(
-            f"Gagal parse LLM response: {e}\nRAW:\n{llm_text}"
-        ) from e
+            f"Jumlah item tidak sesuai: expected {expected_count}, got {len(results)}",
+            f"- (root): expected {expected_count} items, got {len(results)}"
+        )
+
+    # Ref dipakai sebagai index item input: harus tepat 1..n tanpa duplikat
+    refs = sorted(parsed["ref"] for parsed in results)
+    if refs != list(range(1, len(results) + 1)):
+        raise ParserError(
+            f"Ref item tidak valid: {refs}",
+            f"- ref: must be 1..{len(results)} without duplicates, got {refs}"
+        )
+
+    return results
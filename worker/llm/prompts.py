@@ -1,147 +1,356 @@
-def build_prompt(input_text: str) -> str:
-    system = """Kamu adalah AI parser untuk transaksi keuangan pribadi.
-
-Format output JSON:
-{
-  "intent": "pemasukan|Pengeluaran",
-  "amount": <integer>,
-  "currency": "IDR",
-  "date": "<ISO8601 or null>",
-  "category": "<string>",
-  "note": "<string>",
-  "confidence": <0.0-1.0>
-}
-
-Rules untuk INTENT:
-- "pemasukan": Uang pemasukan (gaji, bonus, transfer masuk, dapat uang, dll)
-- "Pengeluaran": Uang Pengeluaran (bayar, beli, transfer keluar, hilang, dll)
-
-Rules untuk CATEGORY:
-Pilih salah satu: makan, minuman, belanja, transportasi, tagihan, hiburan, kesehatan, pendidikan, gaji, transfer, lainnya
-
-Gunakan "lainnya" HANYA jika:
-✅ User lupa/tidak ingat untuk apa
-✅ Transaksi multi-kategori yang tidak bisa dipisah
-
-JANGAN gunakan "lainnya" jika:
-❌ Ada category yang jelas cocok
-❌ Bisa diinfer dari kata kunci (beli→belanja, transfer→transfer, dst)
-
-Amount rules:
-- Parse Indonesian slang: "25rb"→25000, "5jt"→5000000, "150k"→150000
-- Jika tidak ada nominal, set amount=0
-
-Confidence:
-- 0.9-1.0: Sangat jelas (ada nominal + category jelas)
-- 0.7-0.9: Jelas (ada nominal, category bisa diinfer)
-- 0.5-0.7: Cukup jelas (ada ambiguitas)
-- 0.3-0.5: Tidak jelas (perlu estimasi/asumsi)
-- 0.0-0.3: Sangat tidak jelas
-"""
-
-    examples = """
-Examples:
-
-Input: "Makan siang warteg 25rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":25000,
-   "currency":"IDR",
-   "date":null,
-   "category":"makan",
-   "note":"Makan siang di warteg",
-   "confidence":0.95
-   }
-
-Input: "Gaji bulan ini masuk 5jt"
-Output: {
-   "intent":"Pemasukan",
-   "amount":5000000,
-   "currency":"IDR",
-   "date":null,
-   "category":"gaji",
-   "note":"Gaji bulanan",
-   "confidence":0.92
-   }
-
-Input: "Transfer ke teman 100rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":100000,
-   "currency":"IDR",
-   "date":null,
-   "category":"transfer",
-   "note":"Transfer ke teman",
-   "confidence":0.90
-   }
-
-Input: "Beli barang random 50rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":50000,
-   "currency":"IDR",
-   "date":null,
-   "category":"belanja",
-   "note":"Beli barang (tidak dispesifikkan)",
-   "confidence":0.70
-   }
-
-Input: "Bayar 50rb entah buat apa lupa"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":50000,
-   "currency":"IDR",
-   "date":null,
-   "category":"lainnya",
-   "note":"Pembayaran 50rb (lupa untuk apa)",
-   "confidence":0.40
-   }
-
-Input: "Uang hilang 30rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":30000,
-   "currency":"IDR",
-   "date":null,
-   "category":"lainnya",
-   "note":"Uang hilang",
-   "confidence":0.60
-   }
-
-Input: "Dapat uang dari mana ya 200rb"
-Output: {
-   "intent":"Pemasukan",
-   "amount":200000,
-   "currency":"IDR",
-   "date":null,
-   "category":"lainnya",
-   "note":"Pemasukan (sumber tidak jelas)",
-   "confidence":0.35
-   }
-
-Input: "Bayar denda parkir 20rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":20000,
-   "currency":"IDR",
-   "date":null,
-   "category":"parkir",
-   "note":"Denda parkir",
-   "confidence":0.80
-   }
-
-Input: "Kasih uang ke pengemis 5rb"
-Output: {
-   "intent":"Pengeluaran",
-   "amount":5000,
-   "currency":"IDR",
-   "date":null,
-   "category":"lainnya",
-   "note":"Sedekah/donasi",
-   "confidence":0.85
-   }
-"""
-
-    user_input = f"\nInput: \"{input_text}\"\nOutput:"
-    
-    return system + "\n" + examples + "\n" + user_input
\ No newline at end of file
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# =========================
+# SYSTEM PROMPT
+# =========================
+# Satu-satunya system prompt untuk ekstraksi transaksi. Dikirim oleh
+# `call_llm` sebagai pesan system, jadi `build_prompt` TIDAK boleh
+# mengulang schema/rules ini di user prompt.
+SYSTEM_PROMPT = (
+    "You are a transaction parser for a finance application.\n"
+    "Output MUST be a single valid JSON object.\n"
+    "Do NOT include explanations, markdown, or extra text.\n\n"
+    "JSON schema:\n"
+    "{\n"
+    '  "intent": "income | expense",\n'
+    '  "amount": number,\n'
+    '  "currency": "IDR",\n'
+    '  "date": string | null,\n'
+    '  "category": string,\n'
+    '  "note": string,\n'
+    '  "confidence": number\n'
+    "}\n\n"
+    "Rules:\n"
+    "- intent: income (gaji, bonus, transfer masuk) | expense (bayar, beli, transfer keluar, hilang)\n"
+    "- category: makan, minuman, belanja, transportasi, tagihan, hiburan, kesehatan, "
+    "pendidikan, gaji, transfer, lainnya. Pakai \"lainnya\" HANYA jika benar-benar "
+    "tidak bisa diinfer dari kata kunci.\n"
+    '- amount: "25rb"→25000, "5jt"→5000000, "150k"→150000; struk: pakai TOTAL akhir; '
+    "tanpa nominal → 0\n"
+    "- date: YYYY-MM-DD jika ada, selain itu null\n"
+    "- confidence: 0.9-1.0 sangat jelas, 0.7-0.9 jelas, 0.5-0.7 ambigu, <0.5 tidak jelas"
+)
+
+# Few-shot examples, urut dari yang paling informatif. Dipakai sebanyak
+# yang muat di token budget.
+FEW_SHOT_EXAMPLES: List[Tuple[str, Dict]] = [
+    ("Makan siang warteg 25rb", {
+        "intent": "expense", "amount": 25000, "currency": "IDR", "date": None,
+        "category": "makan", "note": "Makan siang di warteg", "confidence": 0.95,
+    }),
+    ("Gaji bulan ini masuk 5jt", {
+        "intent": "income", "amount": 5000000, "currency": "IDR", "date": None,
+        "category": "gaji", "note": "Gaji bulanan", "confidence": 0.92,
+    }),
+    ("Transfer ke teman 100rb", {
+        "intent": "expense", "amount": 100000, "currency": "IDR", "date": None,
+        "category": "transfer", "note": "Transfer ke teman", "confidence": 0.90,
+    }),
+    ("Bayar denda parkir 20rb", {
+        "intent": "expense", "amount": 20000, "currency": "IDR", "date": None,
+        "category": "transportasi", "note": "Denda parkir", "confidence": 0.80,
+    }),
+    ("Beli barang random 50rb", {
+        "intent": "expense", "amount": 50000, "currency": "IDR", "date": None,
+        "category": "belanja", "note": "Beli barang (tidak dispesifikkan)", "confidence": 0.70,
+    }),
+    ("Bayar 50rb entah buat apa lupa", {
+        "intent": "expense", "amount": 50000, "currency": "IDR", "date": None,
+        "category": "lainnya", "note": "Pembayaran 50rb (lupa untuk apa)", "confidence": 0.40,
+    }),
+    ("Dapat uang dari mana ya 200rb", {
+        "intent": "income", "amount": 200000, "currency": "IDR", "date": None,
+        "category": "lainnya", "note": "Pemasukan (sumber tidak jelas)", "confidence": 0.35,
+    }),
+]
+
+# Estimasi overhead prompt OCR versi lama (system prompt di build_prompt +
+# 9 examples pretty-printed + system prompt call_llm), tanpa input.
+# Dipakai sebagai baseline untuk melaporkan penghematan token di llmMeta.
+LEGACY_PROMPT_OVERHEAD_TOKENS = 870
+
+# Budget token untuk user prompt (examples + input)
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "700"))
+
+# Kata kunci yang membuat baris OCR tetap disimpan walau tanpa angka
+OCR_KEYWORDS = (
+    "total", "jumlah", "grand", "subtotal", "sub total", "bayar", "tunai",
+    "cash", "kembali", "change", "diskon", "disc", "ppn", "pajak", "tax",
+    "tanggal", "tgl", "date", "debit", "kredit", "credit", "qris",
+)
+
+# Baris yang menandai region total di struk
+_TOTAL_LINE = re.compile(r"\b(grand\s*total|total|jumlah|tagihan|bayar)\b", re.IGNORECASE)
+
+# Jumlah baris awal struk (nama merchant/alamat) yang selalu disimpan
+_OCR_HEADER_LINES = 2
+
+# Konteks di sekitar baris TOTAL yang dipertahankan
+_TOTAL_CONTEXT_BEFORE = 2
+_TOTAL_CONTEXT_AFTER = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimasi kasar jumlah token (~4 karakter per token)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+def _render_example(input_text: str, output: Dict) -> str:
+    return f'Input: "{input_text}"\nOutput: {json.dumps(output, separators=(",", ":"))}'
+
+
+def compact_ocr_text(ocr_text: str, token_budget: Optional[int] = None) -> Tuple[str, Dict]:
+    """
+    Ringkas teks OCR struk supaya hemat token.
+
+    - Collapse whitespace dan buang baris duplikat berurutan
+    - Buang baris tanpa angka dan tanpa kata kunci (noise OCR)
+    - Selalu simpan header (merchant) dan region TOTAL
+    - Jika masih melebihi budget, baris di luar region TOTAL dipotong
+
+    Returns:
+        Tuple (teks ringkas, stats)
+    """
+    raw_lines = [re.sub(r"\s+", " ", ln).strip() for ln in (ocr_text or "").splitlines()]
+    raw_lines = [ln for ln in raw_lines if ln]
+
+    lines: List[str] = []
+    for ln in raw_lines:
+        if not lines or lines[-1] != ln:
+            lines.append(ln)
+
+    def is_relevant(line: str) -> bool:
+        lower = line.lower()
+        return any(ch.isdigit() for ch in line) or any(k in lower for k in OCR_KEYWORDS)
+
+    keep = set(range(min(_OCR_HEADER_LINES, len(lines))))
+    keep.update(i for i, ln in enumerate(lines) if is_relevant(ln))
+
+    # Region TOTAL (pakai kemunculan terakhir, biasanya total akhir)
+    total_idx = [i for i, ln in enumerate(lines) if _TOTAL_LINE.search(ln)]
+    priority = set(keep & set(range(_OCR_HEADER_LINES)))
+    if total_idx:
+        last = total_idx[-1]
+        region = range(
+            max(0, last - _TOTAL_CONTEXT_BEFORE),
+            min(len(lines), last + _TOTAL_CONTEXT_AFTER + 1)
+        )
+        keep.update(region)
+        priority.update(region)
+
+    selected = sorted(keep)
+
+    # Potong baris non-prioritas (dari atas, item awal struk) jika melebihi budget
+    if token_budget is not None:
+        def cost(indices):
+            return estimate_tokens("\n".join(lines[i] for i in indices))
+
+        droppable = [i for i in selected if i not in priority]
+        while droppable and cost(selected) > token_budget:
+            selected.remove(droppable.pop(0))
+
+    compacted = "\n".join(lines[i] for i in selected)
+    stats = {
+        "ocr_lines_total": len(raw_lines),
+        "ocr_lines_kept": len(selected),
+        "ocr_tokens_raw_est": estimate_tokens(ocr_text or ""),
+        "ocr_tokens_compacted_est": estimate_tokens(compacted),
+    }
+    return compacted, stats
+
+
+# Placeholder input di template prompt (aman dari kurung kurawal JSON examples)
+INPUT_PLACEHOLDER = "<<input>>"
+
+
+def build_prompt_parts(
+    input_text: str,
+    token_budget: Optional[int] = None,
+    compact_ocr: bool = True
+) -> Tuple[str, str, Dict]:
+    """
+    Bangun user prompt sebagai template + variabel input.
+
+    Template (few-shot examples) sama untuk banyak pesan sehingga bisa
+    disimpan sekali di registry (lihat worker.services.prompt_store),
+    sedangkan per row cukup menyimpan input yang sudah diringkas.
+
+    Returns:
+        Tuple (template dengan INPUT_PLACEHOLDER, input ringkas, stats)
+    """
+    budget = token_budget or DEFAULT_PROMPT_TOKEN_BUDGET
+
+    raw_input_tokens = estimate_tokens(input_text)
+
+    if compact_ocr:
+        # Input boleh pakai maksimal ~70% budget, sisanya untuk examples
+        input_text, stats = compact_ocr_text(input_text, token_budget=int(budget * 0.7))
+    else:
+        stats = {}
+
+    user_input = f'Input: "{input_text}"\nOutput:'
+    remaining = budget - estimate_tokens(user_input)
+
+    examples = []
+    for example_input, example_output in FEW_SHOT_EXAMPLES:
+        rendered = _render_example(example_input, example_output)
+        if estimate_tokens(rendered) > remaining:
+            break
+        examples.append(rendered)
+        remaining -= estimate_tokens(rendered)
+
+    input_line = f'Input: "{INPUT_PLACEHOLDER}"\nOutput:'
+    parts = (["Examples:"] + examples + [""] if examples else []) + [input_line]
+    template = "\n".join(parts)
+
+    prompt_tokens = (
+        estimate_tokens(SYSTEM_PROMPT)
+        + estimate_tokens(template) - estimate_tokens(INPUT_PLACEHOLDER)
+        + estimate_tokens(input_text)
+    )
+    baseline_tokens = LEGACY_PROMPT_OVERHEAD_TOKENS + raw_input_tokens
+
+    stats.update({
+        "prompt_token_budget": budget,
+        "prompt_tokens_est": prompt_tokens,
+        "prompt_tokens_baseline_est": baseline_tokens,
+        "prompt_tokens_saved_est": baseline_tokens - prompt_tokens,
+        "few_shot_examples": len(examples),
+    })
+    return template, input_text, stats
+
+
+def render_prompt(template: str, input_text: str) -> str:
+    """Isi INPUT_PLACEHOLDER di template dengan input."""
+    return template.replace(INPUT_PLACEHOLDER, input_text)
+
+
+def build_prompt_with_stats(
+    input_text: str,
+    token_budget: Optional[int] = None,
+    compact_ocr: bool = True
+) -> Tuple[str, Dict]:
+    """
+    Bangun user prompt (few-shot + input) di dalam token budget.
+
+    System prompt TIDAK disertakan (sudah dikirim `call_llm`).
+    Input OCR diringkas dulu, sisa budget diisi few-shot examples.
+
+    Returns:
+        Tuple (prompt, stats) — stats dicatat ke llmMeta
+    """
+    template, prompt_input, stats = build_prompt_parts(
+        input_text, token_budget=token_budget, compact_ocr=compact_ocr
+    )
+    return render_prompt(template, prompt_input), stats
+
+
+def build_prompt(input_text: str, token_budget: Optional[int] = None) -> str:
+    prompt, _ = build_prompt_with_stats(input_text, token_budget=token_budget)
+    return prompt
+
+
+# =========================
+# BATCH (multi-item) PROMPT
+# =========================
+BATCH_SYSTEM_PROMPT = (
+    "You are a transaction parser for a finance application.\n"
+    "The user sends several numbered transaction items.\n"
+    "Output MUST be a single valid JSON array with exactly one object per item, "
+    "in the same order.\n"
+    "Do NOT include explanations, markdown, or extra text.\n\n"
+    "Object schema:\n"
+    "{\n"
+    '  "ref": number (nomor item input),\n'
+    '  "intent": "income | expense",\n'
+    '  "amount": number,\n'
+    '  "currency": "IDR",\n'
+    '  "date": string | null,\n'
+    '  "category": string,\n'
+    '  "note": string,\n'
+    '  "confidence": number\n'
+    "}\n\n"
+    "Category: makan, minuman, belanja, transportasi, tagihan, hiburan, "
+    "kesehatan, pendidikan, gaji, transfer, lainnya.\n"
+    'Amount: "25rb"→25000, "5jt"→5000000, "150k"→150000.'
+)
+
+# Nominal yang jelas → penanda satu item transaksi: angka dengan slang
+# rb/ribu/k/jt/juta, prefix Rp, atau minimal 3 digit ("1.500.000", "25000").
+# Angka kecil tanpa satuan ("3 kopi", "2 bulan") bukan nominal.
+_AMOUNT_PATTERN = re.compile(
+    r"\brp\.?\s*\d"
+    r"|\d+(?:[.,]\d+)?\s*(?:rb|ribu|k|jt|juta)\b"
+    r"|\d{1,3}(?:\.\d{3})+\b"
+    r"|\d{3,}",
+    re.IGNORECASE,
+)
+
+# Pemisah antar item: baris baru, titik koma, koma (bukan desimal), "dan", "+", "&"
+_ITEM_SEPARATOR = re.compile(r"\n|;|,(?!\d)|\s+\+\s+|\s+&\s+|\s+dan\s+", re.IGNORECASE)
+
+
+def split_multi_item_message(text: str) -> list[str]:
+    """
+    Pecah pesan berisi beberapa transaksi, contoh:
+    "kopi 20rb, parkir 5rb, makan 35rb" → ["kopi 20rb", "parkir 5rb", "makan 35rb"]
+
+    Hanya dipecah jika SEMUA bagian punya nominal. Kalau ambigu
+    (mis. "beli kopi, roti 20rb") pesan dikembalikan utuh.
+    """
+    if not text:
+        return []
+
+    parts = [p.strip() for p in _ITEM_SEPARATOR.split(text) if p and p.strip()]
+
+    if len(parts) < 2:
+        return [text.strip()]
+
+    if not all(_AMOUNT_PATTERN.search(p) for p in parts):
+        return [text.strip()]
+
+    return parts
+
+
+def build_batch_prompt(items: list[str]) -> str:
+    """Bangun user prompt bernomor untuk ekstraksi banyak item sekaligus."""
+    lines = [f"{i}. {item}" for i, item in enumerate(items, 1)]
+    return "Items:\n" + "\n".join(lines) + "\n\nOutput (JSON array):"
+
+
+# =========================
+# REPAIR PROMPT
+# =========================
+REPAIR_SYSTEM_PROMPT = (
+    "You fix JSON produced by a transaction parser.\n"
+    "You receive the previous output and the schema validation errors.\n"
+    "Return ONLY the corrected JSON with the same structure. "
+    "Do NOT include explanations, markdown, or extra text.\n"
+    "intent: income | expense; amount: number; date: YYYY-MM-DD or null; "
+    "confidence: number 0-1."
+)
+
+# Output sebelumnya dipotong agar repair tetap murah
+REPAIR_MAX_OUTPUT_CHARS = 2000
+
+
+def build_repair_prompt(previous_output: str, validation_errors: Optional[str]) -> str:
+    """
+    Prompt repair: hanya output lama + error validasi (tanpa prompt awal,
+    few-shot, atau teks OCR) sehingga retry jauh lebih murah.
+    """
+    validation_errors = validation_errors or "- (root): output is not valid JSON"
+    return (
+        "Previous output:\n"
+        f"{previous_output[:REPAIR_MAX_OUTPUT_CHARS]}\n\n"
+        "Validation errors:\n"
+        f"{validation_errors}\n\n"
+        "Corrected JSON:"
+    )
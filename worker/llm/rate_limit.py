@@ -0,0 +1,236 @@
+"""
+Rate limiter (token bucket RPM/TPM) dan circuit breaker untuk call LLM.
+
+Dipakai `llm_client.call_llm`:
+- `RateLimiter` menahan (mengantrikan) request sampai kuota RPM/TPM tier
+  Groq tersedia, alih-alih menembak lalu kena 429. Kuota disesuaikan
+  dari header `x-ratelimit-*` dan `retry-after` response.
+- `CircuitBreaker` memutus call saat provider jelas tidak tersedia
+  (rate limit panjang / gagal beruntun) supaya worker langsung memakai
+  jalur fallback tanpa retry yang memperparah beban.
+
+Semua method thread-safe (call_llm dijalankan lewat asyncio.to_thread).
+"""
+
+import re
+import threading
+import time
+from typing import Callable, Mapping, Optional
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RateLimitTimeout(Exception):
+    """Kuota tidak tersedia dalam batas waktu antri."""
+
+    def __init__(self, wait_seconds: float):
+        super().__init__(f"Kuota LLM baru tersedia dalam {wait_seconds:.1f}s")
+        self.wait_seconds = wait_seconds
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse durasi header rate limit ke detik.
+
+    "12" → 12.0, "7.66s" → 7.66, "2m59.56s" → 179.56, "450ms" → 0.45
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """
+    Token bucket dua dimensi: request per menit dan token per menit.
+
+    `acquire` memblok thread pemanggil sampai kedua bucket cukup (atau
+    sampai `timeout`), jadi burst pesan diratakan sesuai kuota tier.
+    Limit 0 = dimensi itu tidak dibatasi.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = (1 - self._requests) * 60 / self.rpm
+        if self.tpm:
+            # Prompt lebih besar dari TPM tetap boleh lewat saat bucket penuh
+            needed = min(tokens, self.tpm)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def acquire(self, tokens: int, timeout: float) -> float:
+        """
+        Ambil 1 request + `tokens` token dari bucket.
+
+        Returns:
+            Lama menunggu (detik)
+
+        Raises:
+            RateLimitTimeout: Jika kuota tidak tersedia sebelum `timeout`
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(tokens, now)
+
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= min(tokens, self.tpm)
+                    return now - start
+
+                if now + wait > deadline:
+                    raise RateLimitTimeout(wait)
+                self._cond.wait(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Koreksi bucket token dengan usage sebenarnya dari response."""
+        if not self.tpm or actual is None:
+            return
+        with self._cond:
+            self._tokens = min(float(self.tpm), self._tokens + estimated - actual)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Tahan semua request selama `seconds` (dari retry-after 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            if self.rpm:
+                self._requests = min(self._requests, 0.0)
+
+    def sync(self, headers: Mapping[str, str]) -> None:
+        """
+        Sesuaikan bucket dengan sisa kuota yang dilaporkan provider
+        (header Groq `x-ratelimit-remaining-tokens` = sisa TPM,
+        `x-ratelimit-remaining-requests` = sisa kuota request harian).
+        """
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+
+        with self._cond:
+            if self.tpm and remaining_tokens is not None:
+                try:
+                    self._tokens = min(self._tokens, float(remaining_tokens))
+                except ValueError:
+                    pass
+
+            if remaining_requests is not None and remaining_requests.strip() == "0":
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker tiga state:
+    - closed: call normal
+    - open: semua call langsung ditolak sampai cooldown habis
+    - half_open: satu call percobaan; sukses → closed, gagal → open lagi
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        cooldown_seconds: float,
+        on_state_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._probe_started = 0.0
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            self._state = state
+            if self._on_state_change:
+                self._on_state_change(state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._open_until:
+                self._set_state(self.HALF_OPEN)
+            return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self) -> bool:
+        """Boleh call? Saat half_open hanya satu probe per cooldown."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._probe_started >= self.cooldown_seconds:
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open(self.cooldown_seconds)
+
+    def trip(self, seconds: float) -> None:
+        """Buka circuit minimal `seconds` (mis. retry-after yang panjang)."""
+        with self._lock:
+            self._open(max(seconds, self.cooldown_seconds))
+
+    def _open(self, seconds: float) -> None:
+        self._open_until = max(self._open_until, time.monotonic() + seconds)
+        self._set_state(self.OPEN)
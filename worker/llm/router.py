@@ -0,0 +1,124 @@
+"""
+Routing model LLM berdasarkan kompleksitas input dan kesehatan model.
+
+- Pesan teks pendek → model kecil (murah, cepat)
+- Dump OCR panjang → model besar
+- Model dengan error rate / latency terbaru yang buruk (atau circuit
+  breaker open) dilewati selama ada alternatif
+- Hasil model kecil dengan confidence rendah / gagal parse dieskalasi
+  ke model besar (lihat `llm_client.call_llm_routed`)
+"""
+
+import os
+import statistics
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+LLM_MODEL_SMALL = os.getenv("LLM_MODEL_SMALL", "llama-3.1-8b-instant")
+LLM_MODEL_LARGE = os.getenv("LLM_MODEL_LARGE", "llama-3.3-70b-versatile")
+
+# Panjang prompt (karakter) yang langsung memakai model besar
+LLM_ROUTER_LONG_OCR_CHARS = int(os.getenv("LLM_ROUTER_LONG_OCR_CHARS", "1500"))
+LLM_ROUTER_LONG_TEXT_CHARS = int(os.getenv("LLM_ROUTER_LONG_TEXT_CHARS", "4000"))
+
+# Eskalasi ke model besar jika confidence hasil model kecil di bawah ini
+LLM_ESCALATE_MIN_CONFIDENCE = float(os.getenv("LLM_ESCALATE_MIN_CONFIDENCE", "0.6"))
+
+# Model dianggap tidak sehat jika di window terakhir error rate / p50 latency melebihi ini
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "50"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+LLM_ROUTER_MAX_LATENCY_MS = float(os.getenv("LLM_ROUTER_MAX_LATENCY_MS", "10000"))
+_MIN_SAMPLES = 5
+
+
+class ModelStats:
+    """Window bergulir (latency ms, sukses) per model."""
+
+    def __init__(self, window: int):
+        self._calls: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def record(self, latency_ms: float, ok: bool) -> None:
+        self._calls.append((latency_ms, ok))
+
+    def snapshot(self) -> Dict:
+        calls = list(self._calls)
+        latencies = [latency for latency, ok in calls if ok]
+        return {
+            "samples": len(calls),
+            "error_rate": round(sum(1 for _, ok in calls if not ok) / len(calls), 3) if calls else 0.0,
+            "p50_ms": round(statistics.median(latencies), 1) if latencies else None,
+        }
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        small_model: str = LLM_MODEL_SMALL,
+        large_model: str = LLM_MODEL_LARGE,
+        window: int = LLM_ROUTER_WINDOW,
+    ):
+        self.small_model = small_model
+        self.large_model = large_model
+        self._window = window
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats.setdefault(model, ModelStats(self._window))
+        return stats
+
+    def record(self, model: str, latency_ms: float, ok: bool) -> None:
+        with self._lock:
+            self._get_stats(model).record(latency_ms, ok)
+
+    def stats(self, model: str) -> Dict:
+        with self._lock:
+            return self._get_stats(model).snapshot()
+
+    def healthy(self, model: str) -> bool:
+        stats = self.stats(model)
+        if stats["samples"] < _MIN_SAMPLES:
+            return True
+        if stats["error_rate"] > LLM_ROUTER_MAX_ERROR_RATE:
+            return False
+        return stats["p50_ms"] is None or stats["p50_ms"] <= LLM_ROUTER_MAX_LATENCY_MS
+
+    def primary_model(self, input_source: str, prompt_chars: int) -> str:
+        """Model berdasarkan kompleksitas input saja."""
+        limit = LLM_ROUTER_LONG_OCR_CHARS if input_source == "ocr" else LLM_ROUTER_LONG_TEXT_CHARS
+        return self.large_model if prompt_chars >= limit else self.small_model
+
+    def choose(
+        self,
+        input_source: str,
+        prompt_chars: int,
+        available: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """
+        Pilih model untuk call pertama.
+
+        Args:
+            input_source: "text", "text_batch" atau "ocr"
+            prompt_chars: Panjang prompt (user message)
+            available: Cek tambahan per model (mis. circuit breaker tidak open)
+        """
+        primary = self.primary_model(input_source, prompt_chars)
+        candidates: List[str] = [primary] + [
+            m for m in (self.small_model, self.large_model) if m != primary
+        ]
+        usable = [m for m in candidates if available is None or available(m)]
+
+        for model in usable:
+            if self.healthy(model):
+                return model
+        return usable[0] if usable else primary
+
+    def escalation_model(self, model: str) -> Optional[str]:
+        """Model besar untuk eskalasi (None jika sudah di model besar)."""
+        return None if model == self.large_model else self.large_model
+
+
+router = ModelRouter()
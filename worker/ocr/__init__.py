@@ -1,8 +1,27 @@
 # OCR Package
 from .preprocessor import ImagePreprocessor
 from .tesseract import TesseractOCR
+from .regions import TextRegionDetector, RegionOCR
+from .engines import (
+    get_preprocessor,
+    get_tesseract,
+    get_region_ocr,
+    get_ocr_service,
+    warm_up,
+    get_warmup_stats,
+    reset_engines
+)
 
 __all__ = [
     "ImagePreprocessor",
-    "TesseractOCR"
+    "TesseractOCR",
+    "TextRegionDetector",
+    "RegionOCR",
+    "get_preprocessor",
+    "get_tesseract",
+    "get_region_ocr",
+    "get_ocr_service",
+    "warm_up",
+    "get_warmup_stats",
+    "reset_engines"
 ]
\ No newline at end of file
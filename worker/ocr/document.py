@@ -0,0 +1,257 @@
+"""
+Ekstraksi teks dokumen PDF (e-receipt, mutasi rekening) per halaman.
+
+`cv2.imread` tidak bisa membaca PDF, jadi dokumen PDF punya jalur sendiri
+sebelum parser struk / LLM:
+
+- halaman dengan text layer (PDF digital) dipakai langsung, tanpa OCR
+- halaman tanpa text layer (hasil scan) di-render ke grayscale pada
+  PDF_RENDER_DPI lalu di-OCR paralel di thread pool
+
+Dokumen dibaca streaming: halaman dibuka, diambil teksnya / di-render, lalu
+ditutup satu per satu, dan maksimal 2 x PDF_OCR_WORKERS halaman ter-render
+menunggu OCR sekaligus. PDF 50 halaman tidak pernah ada di memori penuh.
+
+Hasil per halaman digabung menjadi satu teks (dengan penanda halaman) dan
+metadata per halaman, lalu masuk ke record OcrText / LlmResponse /
+Transaction yang sama seperti foto struk.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # optional dependency
+    pdfium = None
+
+from app.utils.metrics import DOCUMENT_PAGE_DURATION, DOCUMENT_PAGES
+from .engines import get_tesseract
+
+logger = logging.getLogger(__name__)
+
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", "4"))
+# Halaman dengan karakter huruf/angka di text layer kurang dari ini dianggap hasil scan
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "32"))
+
+# Header PDF boleh didahului byte sampah (maks. 1024 byte)
+PDF_MAGIC = b"%PDF-"
+_PDF_HEADER_BYTES = 1024
+
+# Confidence teks dari text layer (bukan tebakan OCR)
+TEXT_LAYER_CONFIDENCE = 100.0
+
+HINTS = {
+    "unsupported": "Dokumen PDF belum bisa diproses saat ini. Kirim foto atau screenshot struknya ya.",
+    "encrypted": "PDF-nya dikunci password. Kirim versi tanpa password atau screenshot struknya ya.",
+    "unreadable": "PDF-nya tidak bisa dibaca (rusak / bukan PDF valid). Coba kirim ulang ya.",
+    "empty": "Aku tidak menemukan tulisan di PDF ini. Coba kirim screenshot struknya ya.",
+}
+
+# pdfium tidak thread-safe, bahkan untuk dokumen berbeda: semua call pdfium lewat lock ini
+_pdfium_lock = threading.Lock()
+
+
+class DocumentError(Exception):
+    """PDF tidak bisa diproses; `hint` siap dikirim ke user."""
+
+    def __init__(self, reason: str, message: Optional[str] = None):
+        super().__init__(message or reason)
+        self.reason = reason
+        self.hint = HINTS[reason]
+
+
+class PageText(NamedTuple):
+    page: int  # 1-based
+    text: str
+    source: str  # "text_layer" | "ocr"
+    confidence: float
+    duration_ms: float
+
+
+def is_pdf(path: str) -> bool:
+    """Deteksi PDF dari magic bytes (extension / mime dari chat app tidak selalu benar)."""
+    try:
+        with open(path, "rb") as f:
+            return PDF_MAGIC in f.read(_PDF_HEADER_BYTES)
+    except OSError:
+        return False
+
+
+def _has_text(text: str) -> bool:
+    return sum(ch.isalnum() for ch in text) >= PDF_TEXT_MIN_CHARS
+
+
+def _read_page(pdf, index: int, scale: float) -> Tuple[str, Optional[np.ndarray]]:
+    """Text layer halaman, atau render grayscale jika halaman tidak punya teks."""
+    with _pdfium_lock:
+        page = pdf[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_bounded().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+            if _has_text(text):
+                return text, None
+
+            bitmap = page.render(scale=scale, grayscale=True)
+            try:
+                # Copy: buffer numpy milik bitmap pdfium yang langsung ditutup
+                image = np.array(bitmap.to_numpy(), copy=True)
+            finally:
+                bitmap.close()
+            return "", image
+        finally:
+            page.close()
+
+
+def _ocr_page(page: int, image: np.ndarray, start: float) -> PageText:
+    text, metadata = get_tesseract().extract_text(image)
+    return PageText(
+        page,
+        text.strip(),
+        "ocr",
+        float(metadata.get("confidence", 0.0)),
+        (time.perf_counter() - start) * 1000,
+    )
+
+
+def _record_page(page: PageText) -> PageText:
+    DOCUMENT_PAGES.labels(source=page.source).inc()
+    DOCUMENT_PAGE_DURATION.labels(source=page.source).observe(page.duration_ms / 1000)
+    return page
+
+
+def _open(path: str):
+    if pdfium is None:
+        raise DocumentError("unsupported", "pypdfium2 is not installed")
+    try:
+        with _pdfium_lock:
+            return pdfium.PdfDocument(path)
+    except pdfium.PdfiumError as e:
+        reason = "encrypted" if "password" in str(e).lower() else "unreadable"
+        raise DocumentError(reason, str(e)) from e
+
+
+def _aggregate(pages: List[PageText], page_count: int, dpi: int) -> Tuple[str, Dict]:
+    with_text = [page for page in pages if page.text]
+    if len(pages) == 1:
+        text = pages[0].text
+    else:
+        text = "\n\n".join(f"--- Halaman {page.page} ---\n{page.text}" for page in with_text)
+
+    # Confidence dokumen = rata-rata confidence halaman, dibobot panjang teks
+    chars = sum(len(page.text) for page in with_text)
+    confidence = (
+        sum(page.confidence * len(page.text) for page in with_text) / chars if chars else 0.0
+    )
+
+    sources = {page.source for page in pages}
+    if sources == {"text_layer"}:
+        mode = "pdf_text"
+    elif sources == {"ocr"}:
+        mode = "pdf_ocr"
+    else:
+        mode = "pdf_mixed"
+
+    metadata = {
+        "confidence": round(confidence, 2),
+        "ocr_mode": mode,
+        "page_count": page_count,
+        "pages_processed": len(pages),
+        "truncated": page_count > len(pages),
+        "dpi": dpi,
+        "pages": [
+            {
+                "page": page.page,
+                "source": page.source,
+                "confidence": round(page.confidence, 2),
+                "chars": len(page.text),
+                "duration_ms": round(page.duration_ms, 1),
+            }
+            for page in pages
+        ],
+    }
+    return text, metadata
+
+
+def extract_pdf_text(
+    path: str,
+    dpi: int = PDF_RENDER_DPI,
+    max_pages: int = PDF_MAX_PAGES,
+    workers: int = PDF_OCR_WORKERS
+) -> Tuple[str, Dict]:
+    """
+    Ekstrak teks PDF per halaman (blocking, jalankan di thread).
+
+    Args:
+        path: Path file PDF
+        dpi: Resolusi render halaman hasil scan
+        max_pages: Halaman setelah batas ini diabaikan (metadata `truncated`)
+        workers: Jumlah OCR paralel untuk halaman hasil scan
+
+    Returns:
+        Tuple (teks gabungan, metadata) dengan format metadata sama seperti
+        OCR foto (confidence, ocr_mode) plus detail per halaman
+
+    Raises:
+        DocumentError: pypdfium2 tidak terinstall, PDF rusak / terkunci,
+            atau tidak ada teks sama sekali
+    """
+    pdf = _open(path)
+    scale = dpi / 72
+    workers = max(1, workers)
+    results: Dict[int, PageText] = {}
+    pending: Deque[Future] = deque()
+
+    try:
+        with _pdfium_lock:
+            page_count = len(pdf)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-ocr") as pool:
+            for index in range(min(page_count, max_pages)):
+                start = time.perf_counter()
+                text, image = _read_page(pdf, index, scale)
+                if image is None:
+                    results[index] = _record_page(PageText(
+                        index + 1,
+                        text.strip(),
+                        "text_layer",
+                        TEXT_LAYER_CONFIDENCE,
+                        (time.perf_counter() - start) * 1000,
+                    ))
+                    continue
+
+                # Backpressure: render berikutnya menunggu jika antrean OCR penuh
+                while len(pending) >= workers * 2:
+                    page = _record_page(pending.popleft().result())
+                    results[page.page - 1] = page
+                pending.append(pool.submit(_ocr_page, index + 1, image, start))
+
+            while pending:
+                page = _record_page(pending.popleft().result())
+                results[page.page - 1] = page
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+    pages = [results[index] for index in sorted(results)]
+    if not any(page.text for page in pages):
+        raise DocumentError("empty", f"No text found in {len(pages)} page(s)")
+
+    text, metadata = _aggregate(pages, page_count, dpi)
+    logger.info(
+        "PDF %s: %d/%d pages (%s), %d chars, confidence %.1f",
+        path, len(pages), page_count, metadata["ocr_mode"], len(text), metadata["confidence"]
+    )
+    return text, metadata
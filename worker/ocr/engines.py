@@ -0,0 +1,123 @@
+"""
+Registry engine OCR per process.
+
+`ImagePreprocessor`, `TesseractOCR`, `RegionOCR` dan `OCRService` cukup
+dibuat sekali per process lalu dipakai ulang untuk semua struk. Membuat
+`TesseractOCR` baru berarti spawn `tesseract --version` lagi, jadi worker
+dan job memakai getter di sini, bukan constructor langsung.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from .preprocessor import ImagePreprocessor
+from .regions import RegionOCR
+from .tesseract import TesseractOCR, get_tesseract_version
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+_preprocessor: Optional[ImagePreprocessor] = None
+_tesseract: Optional[TesseractOCR] = None
+_region_ocr: Dict[int, RegionOCR] = {}
+_ocr_service = None
+_warmup_stats: Optional[Dict] = None
+
+
+def get_preprocessor() -> ImagePreprocessor:
+    global _preprocessor
+    if _preprocessor is None:
+        with _lock:
+            if _preprocessor is None:
+                _preprocessor = ImagePreprocessor()
+    return _preprocessor
+
+
+def get_tesseract() -> TesseractOCR:
+    global _tesseract
+    if _tesseract is None:
+        with _lock:
+            if _tesseract is None:
+                _tesseract = TesseractOCR()
+    return _tesseract
+
+
+def get_region_ocr(max_workers: int = 4) -> RegionOCR:
+    """RegionOCR yang memakai TesseractOCR bersama (satu instance per jumlah worker)."""
+    region_ocr = _region_ocr.get(max_workers)
+    if region_ocr is None:
+        engine = get_tesseract()
+        with _lock:
+            region_ocr = _region_ocr.setdefault(
+                max_workers, RegionOCR(engine, max_workers=max_workers)
+            )
+    return region_ocr
+
+
+def get_ocr_service():
+    """OCRService bersama (dipakai job/script), memakai TesseractOCR yang sama."""
+    global _ocr_service
+    if _ocr_service is None:
+        # Import lokal: services bergantung ke package ocr, bukan sebaliknya
+        from worker.services.ocr_service import OCRService
+
+        engine = get_tesseract()
+        with _lock:
+            if _ocr_service is None:
+                _ocr_service = OCRService(ocr_engine=engine)
+    return _ocr_service
+
+
+def warm_up(run_ocr: bool = True) -> Dict:
+    """
+    Bangun semua engine di awal (startup) supaya struk pertama tidak
+    menanggung biaya inisialisasi.
+
+    Args:
+        run_ocr: Jalankan satu OCR kecil agar traineddata ikut ter-load
+
+    Returns:
+        Dict durasi warm-up (ms) dan versi Tesseract
+    """
+    global _warmup_stats
+    start = time.perf_counter()
+
+    preprocessor = get_preprocessor()
+    engine = get_tesseract()
+
+    # Objek CLAHE dibuat di sini (thread startup); thread lain membuat miliknya sendiri
+    preprocessor._get_clahe()
+
+    if run_ocr:
+        blank = np.full((64, 256), 255, dtype=np.uint8)
+        engine.extract_line(blank)
+
+    stats = {
+        "tesseract_version": get_tesseract_version(),
+        "warmup_ms": int((time.perf_counter() - start) * 1000),
+    }
+    _warmup_stats = stats
+    logger.info(f"OCR engines warmed up: {stats}")
+    return stats
+
+
+def get_warmup_stats() -> Optional[Dict]:
+    """Hasil `warm_up` terakhir (None = belum warm-up), untuk readiness check."""
+    return _warmup_stats
+
+
+def reset_engines() -> None:
+    """Buang semua instance (mis. setelah config Tesseract berubah)."""
+    global _preprocessor, _tesseract, _ocr_service, _warmup_stats
+    with _lock:
+        _warmup_stats = None
+        _preprocessor = None
+        _tesseract = None
+        _ocr_service = None
+        _region_ocr.clear()
+    get_tesseract_version.cache_clear()
@@ -1,10 +1,20 @@
 import cv2
 import numpy as np
+import threading
 from typing import Tuple, Optional
 import logging
 
+from app.utils.metrics import PREPROCESS_STAGE_DURATION, observe
+
 logger = logging.getLogger(__name__)
 
+# Kernel sharpen dibuat sekali, bukan per image
+SHARPEN_KERNEL = np.array([
+    [0, -1, 0],
+    [-1, 5, -1],
+    [0, -1, 0]
+], dtype=np.float32)
+
 class ImagePreprocessor:
     """
     Image preprocessor untuk OCR
@@ -52,6 +62,10 @@ class ImagePreprocessor:
         self.apply_sharpen = apply_sharpen
         self.enable_binarize = enable_binarize
         self.enable_morphology = enable_morphology
+
+        # Objek CLAHE di-cache per thread (instance preprocessor dipakai ulang
+        # lewat worker.ocr.engines, dan objek CLAHE OpenCV tidak thread-safe)
+        self._local = threading.local()
         
     def preprocess(self, img: np.ndarray) -> np.ndarray:
         """
@@ -66,34 +80,41 @@ class ImagePreprocessor:
         logger.info(f"Starting preprocessing, input shape: {img.shape}")
         
         # Resize jika terlalu besar
-        img = self._resize(img) 
+        with observe(PREPROCESS_STAGE_DURATION, stage="resize"):
+            img = self._resize(img)
         logger.info(f"After resize, shape: {img.shape}")
         
         # Convert ke grayscale
-        gray = self._to_grayscale(img)
+        with observe(PREPROCESS_STAGE_DURATION, stage="grayscale"):
+            gray = self._to_grayscale(img)
         logger.info(f"After grayscale conversion, shape: {gray.shape}")
         
         if self.use_clahe:
-            gray = self._enhance_contrast(gray)
+            with observe(PREPROCESS_STAGE_DURATION, stage="clahe"):
+                gray = self._enhance_contrast(gray)
             logger.info("After contrast enhancement (CLAHE)")
 
         if self.apply_sharpen:
-            gray = self._sharpen(gray)
+            with observe(PREPROCESS_STAGE_DURATION, stage="sharpen"):
+                gray = self._sharpen(gray)
             logger.info("After sharpening")
         
         # Deskewing(luruskan)
         if self.auto_deskew:
-            gray = self._deskew(gray)
+            with observe(PREPROCESS_STAGE_DURATION, stage="deskew"):
+                gray = self._deskew(gray)
             logger.info("After deskewing")
             
         # Denoising
         if self.denoise:
-            gray = self._denoise(gray)
+            with observe(PREPROCESS_STAGE_DURATION, stage="denoise"):
+                gray = self._denoise(gray)
             logger.info("After denoising")
         
         # Binarization (opsional)
         if self.enable_binarize:
-            binary = self._binarize(gray)
+            with observe(PREPROCESS_STAGE_DURATION, stage="binarize"):
+                binary = self._binarize(gray)
             logger.info("After binarization")
         else:
             binary = gray
@@ -101,7 +122,8 @@ class ImagePreprocessor:
         
         # Morphological operations (clean up, opsional)
         if self.enable_morphology and self.enable_binarize:
-            result = self._morphology(binary)
+            with observe(PREPROCESS_STAGE_DURATION, stage="morphology"):
+                result = self._morphology(binary)
             logger.info("After morphological operations")
         else:
             result = binary
@@ -150,21 +172,21 @@ class ImagePreprocessor:
         gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         return gray_img
 
+    def _get_clahe(self):
+        clahe = getattr(self._local, "clahe", None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(
+                clipLimit=self.clahe_clip_limit,
+                tileGridSize=(self.clahe_tile_size, self.clahe_tile_size)
+            )
+            self._local.clahe = clahe
+        return clahe
+
     def _enhance_contrast(self, img: np.ndarray) -> np.ndarray:
-        clahe = cv2.createCLAHE(
-            clipLimit=self.clahe_clip_limit,
-            tileGridSize=(self.clahe_tile_size, self.clahe_tile_size)
-        )
-        
-        return clahe.apply(img)
+        return self._get_clahe().apply(img)
 
     def _sharpen(self, img: np.ndarray) -> np.ndarray:
-        kernel = np.array([
-            [0, -1, 0],
-            [-1, 5, -1],
-            [0, -1, 0]
-        ], dtype=np.float32)
-        return cv2.filter2D(img, -1, kernel)
+        return cv2.filter2D(img, -1, SHARPEN_KERNEL)
     
     def _deskew(self, img: np.ndarray) -> np.ndarray:
         """
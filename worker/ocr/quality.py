@@ -0,0 +1,183 @@
+"""
+Quality gate foto struk sebelum preprocessing + OCR.
+
+Foto blur, gelap, silau atau terpotong tetap melewati preprocess, OCR
+(sampai 3 PSM) dan call LLM hanya untuk gagal di akhir. Gate ini
+(target < 20 ms) menilai:
+
+- ukuran & rasio aspek gambar asli (terpotong / terlalu kecil)
+- histogram exposure (gelap, silau, kontras rendah) dan kepadatan edge
+  Canny sebagai estimasi ada-tidaknya teks, di salinan kecil (sisi
+  terpanjang ~QUALITY_WORK_SIZE px)
+- variance Laplacian (blur) di potongan tengah gambar pada skala kerja
+  preprocessor (max_width x max_height), karena blur yang mengganggu OCR
+  hilang jika diukur di salinan kecil
+
+Salinan dibuat dengan subsample stride (view numpy tanpa copy), bukan
+resize: resize foto 12MP sendiri sudah melewati budget waktu.
+
+Dengan IMAGE_QUALITY_GATE=enforce foto yang gagal ditolak dengan hint
+spesifik ke user; default "log" hanya mencatat hasilnya (shadow mode).
+Jumlah penolakan dan estimasi waktu pipeline yang dihemat dicatat di metrics.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from app.utils.metrics import (
+    IMAGE_QUALITY_CHECKS,
+    IMAGE_QUALITY_DURATION,
+    IMAGE_QUALITY_SAVED_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# "enforce" = tolak foto buruk, "log" = hanya dicatat (shadow mode), "off" = mati.
+# Default "log" sampai false-reject rate terukur dari metrics
+# finance_image_quality_checks_total di traffic asli
+QUALITY_GATE_MODE = os.getenv("IMAGE_QUALITY_GATE", "log").lower()
+
+# Sisi terpanjang salinan untuk exposure / edge, dan ukuran potongan untuk blur
+QUALITY_WORK_SIZE = int(os.getenv("QUALITY_WORK_SIZE", "512"))
+QUALITY_BLUR_PATCH = int(os.getenv("QUALITY_BLUR_PATCH", "384"))
+
+# Batas penolakan
+QUALITY_MIN_SIDE = int(os.getenv("QUALITY_MIN_SIDE", "150"))
+QUALITY_MAX_ASPECT = float(os.getenv("QUALITY_MAX_ASPECT", "10"))
+QUALITY_MIN_MEAN = float(os.getenv("QUALITY_MIN_MEAN", "50"))
+QUALITY_MIN_CONTRAST = float(os.getenv("QUALITY_MIN_CONTRAST", "32"))
+QUALITY_MIN_BLUR_VARIANCE = float(os.getenv("QUALITY_MIN_BLUR_VARIANCE", "20"))
+QUALITY_MIN_EDGE_DENSITY = float(os.getenv("QUALITY_MIN_EDGE_DENSITY", "0.01"))
+
+HINTS = {
+    "too_small": "Fotonya terlalu kecil atau terpotong. Foto ulang struk secara utuh ya.",
+    "aspect": "Fotonya sepertinya terpotong. Pastikan seluruh struk masuk dalam frame ya.",
+    "dark": "Fotonya terlalu gelap. Coba foto ulang di tempat yang lebih terang ya.",
+    "overexposed": "Fotonya terlalu silau/terang. Hindari pantulan lampu atau flash langsung ya.",
+    "low_contrast": "Tulisan di struk kurang kontras. Coba foto ulang dengan cahaya yang lebih merata ya.",
+    "blurry": "Fotonya buram. Tahan kamera lebih stabil dan pastikan fokus ke tulisan struk ya.",
+    "no_text": "Aku tidak menemukan tulisan di foto ini. Pastikan struk terlihat jelas dan memenuhi frame ya.",
+}
+
+# Estimasi waktu pipeline (preprocess + OCR) untuk foto yang lolos, dipakai
+# menghitung waktu yang dihemat saat foto ditolak (EWMA)
+_PIPELINE_EWMA_ALPHA = 0.2
+_pipeline_seconds: Optional[float] = None
+_pipeline_lock = threading.Lock()
+
+
+class QualityReport(NamedTuple):
+    ok: bool
+    reason: Optional[str]
+    hint: Optional[str]
+    metrics: Dict[str, float]
+    duration_ms: float
+
+
+def _gray(img: np.ndarray) -> np.ndarray:
+    img = np.ascontiguousarray(img)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def _overview(img: np.ndarray) -> np.ndarray:
+    """Grayscale dengan sisi terpanjang ~QUALITY_WORK_SIZE (subsample stride)."""
+    step = max(1, round(max(img.shape[:2]) / QUALITY_WORK_SIZE))
+    return _gray(img[::step, ::step])
+
+
+def _blur_patch(img: np.ndarray, max_width: int, max_height: int) -> np.ndarray:
+    """Potongan tengah QUALITY_BLUR_PATCH px pada skala resize preprocessor."""
+    h, w = img.shape[:2]
+    scale = min(max_width / w, max_height / h, 1.0)
+    step = max(1, round(1 / scale))
+    half = QUALITY_BLUR_PATCH * step // 2
+    cy, cx = h // 2, w // 2
+    patch = img[max(0, cy - half):cy + half:step, max(0, cx - half):cx + half:step]
+    return _gray(patch)
+
+
+def _reject(reason: str, metrics: Dict[str, float], start: float) -> QualityReport:
+    return QualityReport(False, reason, HINTS[reason], metrics, round((time.perf_counter() - start) * 1000, 2))
+
+
+def check_image_quality(
+    img: np.ndarray,
+    max_width: int = 1920,
+    max_height: int = 1080
+) -> QualityReport:
+    """
+    Nilai kelayakan foto struk untuk OCR.
+
+    Args:
+        img: Gambar asli (BGR / grayscale) dari load_image
+        max_width: Batas resize preprocessor (skala penilaian blur)
+        max_height: Batas resize preprocessor (skala penilaian blur)
+
+    Returns:
+        QualityReport: ok, reason + hint jika ditolak, metrics mentah, durasi
+    """
+    start = time.perf_counter()
+    h, w = img.shape[:2]
+    metrics: Dict[str, float] = {"width": w, "height": h}
+
+    # 1. Ukuran & aspek (gambar asli)
+    short_side, long_side = min(h, w), max(h, w)
+    metrics["aspect"] = round(long_side / max(short_side, 1), 2)
+    if short_side < QUALITY_MIN_SIDE:
+        return _reject("too_small", metrics, start)
+    if metrics["aspect"] > QUALITY_MAX_ASPECT:
+        return _reject("aspect", metrics, start)
+
+    gray = _overview(img)
+
+    # 2. Exposure: rata-rata dan rentang persentil 5-95
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    cumulative = np.cumsum(hist) / gray.size
+    p5 = int(np.searchsorted(cumulative, 0.05))
+    p95 = int(np.searchsorted(cumulative, 0.95))
+    mean = float(np.dot(hist, np.arange(256)) / gray.size)
+    metrics.update({"mean": round(mean, 1), "p5": p5, "p95": p95})
+    if mean < QUALITY_MIN_MEAN:
+        return _reject("dark", metrics, start)
+    if p95 - p5 < QUALITY_MIN_CONTRAST:
+        return _reject("overexposed" if mean > 215 else "low_contrast", metrics, start)
+
+    # 3. Blur: variance Laplacian di potongan tengah (skala preprocessor)
+    patch = _blur_patch(img, max_width, max_height)
+    blur_variance = float(cv2.Laplacian(patch, cv2.CV_32F).var())
+    metrics["blur_variance"] = round(blur_variance, 1)
+    if blur_variance < QUALITY_MIN_BLUR_VARIANCE:
+        return _reject("blurry", metrics, start)
+
+    # 4. Estimasi kepadatan teks: proporsi pixel edge
+    edges = cv2.Canny(gray, 50, 150)
+    edge_density = float(np.count_nonzero(edges)) / edges.size
+    metrics["edge_density"] = round(edge_density, 4)
+    if edge_density < QUALITY_MIN_EDGE_DENSITY:
+        return _reject("no_text", metrics, start)
+
+    return QualityReport(True, None, None, metrics, round((time.perf_counter() - start) * 1000, 2))
+
+
+def record_quality_result(report: QualityReport, enforced: bool) -> None:
+    """Metrics per hasil gate; waktu pipeline yang dihemat hanya saat foto benar-benar ditolak."""
+    IMAGE_QUALITY_DURATION.observe(report.duration_ms / 1000)
+    IMAGE_QUALITY_CHECKS.labels(result=report.reason or "accepted").inc()
+    if not report.ok and enforced and _pipeline_seconds is not None:
+        IMAGE_QUALITY_SAVED_SECONDS.inc(_pipeline_seconds)
+
+
+def record_pipeline_seconds(seconds: float) -> None:
+    """Update estimasi durasi preprocess + OCR foto yang lolos gate."""
+    global _pipeline_seconds
+    with _pipeline_lock:
+        if _pipeline_seconds is None:
+            _pipeline_seconds = seconds
+        else:
+            _pipeline_seconds += _PIPELINE_EWMA_ALPHA * (seconds - _pipeline_seconds)
@@ -0,0 +1,257 @@
+import cv2
+import numpy as np
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from app.utils.metrics import PREPROCESS_STAGE_DURATION, observe
+from .tesseract import TesseractOCR
+
+logger = logging.getLogger(__name__)
+
+# Baris yang menandakan total struk sudah ikut ter-OCR
+_TOTAL_LINE = re.compile(r"\b(grand\s*total|total|jumlah|tagihan)\b", re.IGNORECASE)
+_SUBTOTAL_LINE = re.compile(r"\bsub\s*-?\s*total\b", re.IGNORECASE)
+
+
+class TextRegionDetector:
+    """
+    Deteksi region baris teks pada gambar struk hasil ImagePreprocessor.
+
+    Metode:
+    - Morphological gradient (menonjolkan tepi karakter)
+    - Otsu threshold
+    - Closing horizontal (menyambung karakter jadi satu baris)
+    - Contours → bounding box, lalu digabung per baris
+    """
+
+    def __init__(
+        self,
+        min_height: int = 8,
+        min_width: int = 12,
+        max_height_ratio: float = 0.2,
+        min_fill_ratio: float = 0.08,
+        padding: int = 4
+    ):
+        """
+        Args:
+            min_height: Tinggi minimal region (px)
+            min_width: Lebar minimal region (px)
+            max_height_ratio: Tinggi maksimal region relatif tinggi gambar
+            min_fill_ratio: Rasio piksel tepi minimal (buang noise/garis)
+            padding: Padding crop di sekitar region (px)
+        """
+        self.min_height = min_height
+        self.min_width = min_width
+        self.max_height_ratio = max_height_ratio
+        self.min_fill_ratio = min_fill_ratio
+        self.padding = padding
+
+    def detect(self, img: np.ndarray) -> List[Dict]:
+        """
+        Deteksi region baris teks.
+
+        Args:
+            img: Grayscale (atau BGR) image
+
+        Returns:
+            List region {"x", "y", "w", "h"} urut dari atas ke bawah
+        """
+        gray = img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape[:2]
+
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+        # Kernel horizontal ~2.5% lebar gambar untuk menyambung kata dalam satu baris
+        connect_width = max(9, width // 40)
+        connect = cv2.getStructuringElement(cv2.MORPH_RECT, (connect_width, 1))
+        connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, connect)
+
+        contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+
+            if h < self.min_height or w < self.min_width:
+                continue
+            if h > height * self.max_height_ratio:
+                continue
+
+            fill_ratio = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+            if fill_ratio < self.min_fill_ratio:
+                continue
+
+            boxes.append({"x": x, "y": y, "w": w, "h": h})
+
+        return self._merge_lines(boxes)
+
+    def _merge_lines(self, boxes: List[Dict]) -> List[Dict]:
+        """Gabungkan box yang berada di baris yang sama (overlap vertikal)."""
+        lines: List[Dict] = []
+
+        for box in sorted(boxes, key=lambda b: b["y"]):
+            center_y = box["y"] + box["h"] / 2
+            for line in lines:
+                if line["y"] <= center_y <= line["y"] + line["h"]:
+                    x1 = min(line["x"], box["x"])
+                    y1 = min(line["y"], box["y"])
+                    x2 = max(line["x"] + line["w"], box["x"] + box["w"])
+                    y2 = max(line["y"] + line["h"], box["y"] + box["h"])
+                    line.update({"x": x1, "y": y1, "w": x2 - x1, "h": y2 - y1})
+                    break
+            else:
+                lines.append(dict(box))
+
+        return sorted(lines, key=lambda b: b["y"])
+
+    def crop(self, img: np.ndarray, region: Dict) -> np.ndarray:
+        """Crop satu region (dengan padding) dari image."""
+        height, width = img.shape[:2]
+        x1 = max(0, region["x"] - self.padding)
+        y1 = max(0, region["y"] - self.padding)
+        x2 = min(width, region["x"] + region["w"] + self.padding)
+        y2 = min(height, region["y"] + region["h"] + self.padding)
+        return img[y1:y2, x1:x2]
+
+
+class RegionOCR:
+    """
+    OCR berbasis region: hanya baris teks yang terdeteksi yang di-OCR,
+    secara paralel (pytesseract menjalankan proses tesseract terpisah,
+    jadi thread cukup untuk paralelisme).
+
+    Mode fast hanya meng-OCR header (merchant/tanggal) dan bagian bawah
+    struk (area TOTAL). Jika TOTAL tidak ditemukan, fallback ke OCR
+    full page biasa.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[TesseractOCR] = None,
+        detector: Optional[TextRegionDetector] = None,
+        max_workers: int = 4,
+        header_fraction: float = 0.15,
+        bottom_fraction: float = 0.45,
+        line_psm: int = 7
+    ):
+        """
+        Args:
+            engine: TesseractOCR yang dipakai (default: instance baru)
+            detector: TextRegionDetector (default: instance baru)
+            max_workers: Jumlah thread OCR paralel
+            header_fraction: Porsi atas gambar yang dianggap header
+            bottom_fraction: Porsi bawah gambar yang di-OCR di mode fast
+            line_psm: PSM Tesseract untuk crop satu baris (7 = single line)
+        """
+        self.engine = engine or TesseractOCR()
+        self.detector = detector or TextRegionDetector()
+        self.max_workers = max_workers
+        self.header_fraction = header_fraction
+        self.bottom_fraction = bottom_fraction
+        self.line_psm = line_psm
+
+    def extract_text(self, img: np.ndarray, fast: bool = True) -> Tuple[str, Dict]:
+        """
+        Extract text lewat region detection.
+
+        Args:
+            img: Output ImagePreprocessor
+            fast: True = header + bagian bawah dulu, full page jika TOTAL tidak ketemu
+
+        Returns:
+            Tuple (text, metadata) — format sama dengan TesseractOCR.extract_text
+        """
+        with observe(PREPROCESS_STAGE_DURATION, stage="detect_regions"):
+            regions = self.detector.detect(img)
+
+        if not regions:
+            logger.info("No text regions detected, fallback to full page OCR")
+            return self._full_page(img, regions_total=0)
+
+        height = img.shape[0]
+        if fast:
+            header_limit = height * self.header_fraction
+            bottom_start = height * (1 - self.bottom_fraction)
+            selected = [
+                r for r in regions
+                if r["y"] + r["h"] <= header_limit or r["y"] >= bottom_start
+            ]
+        else:
+            selected = regions
+
+        lines = self._ocr_regions(img, selected)
+        text = "\n".join(line["text"] for line in lines if line["text"])
+
+        if fast and not self._has_total(text):
+            logger.info(
+                "TOTAL not found in %s/%s regions, fallback to full page OCR",
+                len(selected), len(regions)
+            )
+            return self._full_page(img, regions_total=len(regions))
+
+        metadata = self._build_metadata(text, lines)
+        metadata.update({
+            "ocr_mode": "roi_fast" if fast else "roi",
+            "regions_total": len(regions),
+            "regions_ocr": len(selected),
+        })
+
+        logger.info(
+            "Region OCR (%s): %s/%s regions, confidence=%.2f",
+            metadata["ocr_mode"], len(selected), len(regions), metadata["confidence"]
+        )
+        return text, metadata
+
+    def _ocr_regions(self, img: np.ndarray, regions: List[Dict]) -> List[Dict]:
+        """OCR semua region secara paralel, hasil tetap urut atas → bawah."""
+        crops = [self.detector.crop(img, region) for region in regions]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(
+                lambda crop: self.engine.extract_line(crop, psm=self.line_psm),
+                crops
+            ))
+
+        return [
+            {"text": text, "confidence": confidence, "words": words}
+            for text, confidence, words in results
+        ]
+
+    def _has_total(self, text: str) -> bool:
+        return any(
+            _TOTAL_LINE.search(line) and not _SUBTOTAL_LINE.search(line)
+            and any(ch.isdigit() for ch in line)
+            for line in text.splitlines()
+        )
+
+    def _full_page(self, img: np.ndarray, regions_total: int) -> Tuple[str, Dict]:
+        text, metadata = self.engine.extract_text(img)
+        metadata.update({
+            "ocr_mode": "full_fallback",
+            "regions_total": regions_total,
+            "regions_ocr": 0,
+        })
+        return text, metadata
+
+    def _build_metadata(self, text: str, lines: List[Dict]) -> Dict:
+        """Metadata setara TesseractOCR (confidence = rata-rata berbobot jumlah kata)."""
+        total_words = sum(line["words"] for line in lines)
+        if total_words:
+            confidence = sum(line["confidence"] * line["words"] for line in lines) / total_words
+        else:
+            confidence = 0.0
+
+        return {
+            "confidence": confidence,
+            "word_count": total_words,
+            "char_count": len(text),
+            "line_count": len([ln for ln in text.split("\n") if ln.strip()]) or 1,
+            "language": self.engine.lang,
+            "psm": self.line_psm,
+            "oem": self.engine.oem,
+        }
@@ -4,9 +4,27 @@ import numpy as np
 from typing import Dict, Optional, Tuple
 import logging
 import os
+from functools import lru_cache
+
+from app.utils.metrics import OCR_ATTEMPT_DURATION, observe
 
 logger = logging.getLogger(__name__)
 
+# Karakter yang umum di struk; None di TesseractOCR = tanpa whitelist
+DEFAULT_CHAR_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789./:-, "
+
+
+@lru_cache(maxsize=1)
+def get_tesseract_version() -> str:
+    """
+    Versi Tesseract (di-cache per process).
+
+    `pytesseract.get_tesseract_version()` menjalankan `tesseract --version`
+    sebagai subprocess, jadi cukup dipanggil sekali.
+    """
+    return str(pytesseract.get_tesseract_version())
+
+
 class TesseractOCR:
     """
     Tesseract OCR Engine
@@ -25,7 +43,8 @@ class TesseractOCR:
         oem: int = 3,
         tesseract_cmd: Optional[str] = None,
         fallback_psm_modes: Optional[list[int]] = None,
-        min_break_confidence: float = 65.0
+        min_break_confidence: float = 65.0,
+        char_whitelist: Optional[str] = DEFAULT_CHAR_WHITELIST
     ):
         """
         Initialize Tesseract OCR
@@ -43,6 +62,7 @@ class TesseractOCR:
                  - 1: LSTM only (faster, modern)
                  - 0: Legacy only (slower, sometimes more accurate)
             tesseract_cmd: Path ke tesseract binary (optional)
+            char_whitelist: Karakter yang boleh dikenali (None = tanpa whitelist)
         """
         self.lang = lang
         self.psm = psm
@@ -50,9 +70,11 @@ class TesseractOCR:
         # Fokus ke mode blok teks/sedikit otomatis: 6 (block), 3 (auto), 4 (single column)
         self.fallback_psm_modes = fallback_psm_modes or [psm, 3, 4]
         self.min_break_confidence = min_break_confidence
+        self.char_whitelist = char_whitelist
         
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+            get_tesseract_version.cache_clear()
             logger.info(f"Set tesseract command to: {tesseract_cmd}")
             
         # Verify Tesseract installed
@@ -68,7 +90,7 @@ class TesseractOCR:
             RuntimeError: Jika Tesseract tidak ditemukan
         """
         try:
-            version = pytesseract.get_tesseract_version()
+            version = get_tesseract_version()
             logger.info(f"Tesseract version: {version}")
         except Exception as e:
             logger.error("Tesseract tidak ditemukan atau tidak terinstall dengan benar.")
@@ -89,17 +111,18 @@ class TesseractOCR:
             config = self._build_config(psm_override=attempt_psm)
 
             # Jalankan OCR
-            text = pytesseract.image_to_string(
-                img,
-                lang=self.lang,
-                config=config,
-            )
-            data = pytesseract.image_to_data(
-                img,
-                lang=self.lang,
-                config=config,
-                output_type=pytesseract.Output.DICT,
-            )
+            with observe(OCR_ATTEMPT_DURATION, psm=str(attempt_psm)):
+                text = pytesseract.image_to_string(
+                    img,
+                    lang=self.lang,
+                    config=config,
+                )
+                data = pytesseract.image_to_data(
+                    img,
+                    lang=self.lang,
+                    config=config,
+                    output_type=pytesseract.Output.DICT,
+                )
 
             metadata = self._calculate_metadata(text, data)
             metadata["psm_used"] = attempt_psm
@@ -117,7 +140,38 @@ class TesseractOCR:
 
         best_metadata["attempts"] = attempts
         return best_text, best_metadata
-           
+
+    def extract_line(self, img: np.ndarray, psm: int = 7) -> Tuple[str, float, int]:
+        """
+        OCR satu crop region (satu baris teks) dengan satu call Tesseract.
+
+        Teks disusun ulang dari `image_to_data` sehingga tidak perlu
+        memanggil `image_to_string` terpisah.
+
+        Returns:
+            Tuple (teks, rata-rata confidence 0-100, jumlah kata)
+        """
+        config = self._build_config(psm_override=psm)
+
+        with observe(OCR_ATTEMPT_DURATION, psm=str(psm)):
+            data = pytesseract.image_to_data(
+                img,
+                lang=self.lang,
+                config=config,
+                output_type=pytesseract.Output.DICT,
+            )
+
+        words = []
+        confidences = []
+        for conf, txt in zip(data["conf"], data["text"]):
+            if txt.strip():
+                words.append(txt.strip())
+                if int(float(conf)) != -1:
+                    confidences.append(float(conf))
+
+        avg_confidence = float(np.mean(confidences)) if confidences else 0.0
+        return " ".join(words), avg_confidence, len(words)
+
     def _build_config(self, psm_override: Optional[int] = None) -> str:
         """
         Build Tesseract configuration string
@@ -140,10 +194,9 @@ class TesseractOCR:
         # Additional optimizations untuk struk
         # - Preserve interword spaces
         # - Batasi karakter ke huruf, angka, dan tanda baca umum
-        config_parts.extend([
-            "-c preserve_interword_spaces=1",
-            "-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789./:-, ",
-        ])
+        config_parts.append("-c preserve_interword_spaces=1")
+        if self.char_whitelist:
+            config_parts.append(f"-c tessedit_char_whitelist={self.char_whitelist}")
         
         return " ".join(config_parts)
 
@@ -186,7 +239,7 @@ class TesseractOCR:
             "word_count": word_count,
             "char_count": len(text),
             "line_count": line_count,
-            "tesseract_version": str(pytesseract.get_tesseract_version()),
+            "tesseract_version": get_tesseract_version(),
             "language": self.lang,
             "psm": self.psm,
             "oem": self.oem,
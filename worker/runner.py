@@ -0,0 +1,230 @@
+"""
+Entry point role worker / export.
+
+Mengambil job dari tabel `jobs` (diisi role ingest, APP_ROLE=ingest) dan
+menjalankan handler yang sama dengan mode satu process (BackgroundTasks).
+
+    python -m worker.runner --role worker    # OCR + LLM (pesan teks & struk)
+    python -m worker.runner --role export    # report Excel
+
+Concurrency per role diatur lewat env (atau --concurrency):
+- WORKER_CONCURRENCY (default: jumlah CPU) → sizing OCR per CPU
+- EXPORT_CONCURRENCY (default: 1)
+
+Metrics Prometheus (OCR/LLM/DB + kedalaman antrian) di-expose di
+http://<host>:METRICS_PORT/metrics (default 9100, 0 = nonaktif).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Callable, Dict, Optional
+
+import httpx
+from prometheus_client import start_http_server
+
+import worker
+from app.db.connection import connect_db, prisma
+from app.services.job_queue import (
+    JOB_TELEGRAM_EXPORT,
+    JOB_TELEGRAM_RECEIPT,
+    JOB_TELEGRAM_TEXT,
+    JOB_WHATSAPP_RECEIPT,
+    JOB_WHATSAPP_TEXT,
+    JOB_MAX_ATTEMPTS,
+    QUEUE_EXPORT,
+    QUEUE_WORKER,
+    claim_jobs,
+    complete_job,
+    fail_job,
+    get_queue_depth,
+    requeue_stale_jobs,
+)
+from app.utils.metrics import JOB_QUEUE_DEPTH, record_failure
+
+logger = logging.getLogger(__name__)
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(os.cpu_count() or 2)))
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "1"))
+# Interval polling saat antrian kosong
+JOB_POLL_INTERVAL_MS = int(os.getenv("JOB_POLL_INTERVAL_MS", "500"))
+# Interval cek job "running" yang worker-nya mati
+JOB_REAPER_INTERVAL_SECONDS = int(os.getenv("JOB_REAPER_INTERVAL_SECONDS", "60"))
+# Interval update gauge kedalaman antrian
+JOB_DEPTH_INTERVAL_SECONDS = int(os.getenv("JOB_DEPTH_INTERVAL_SECONDS", "15"))
+# Port HTTP /metrics untuk role worker / export (0 = nonaktif)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+ROLE_QUEUES = {"worker": QUEUE_WORKER, "export": QUEUE_EXPORT}
+ROLE_CONCURRENCY = {"worker": WORKER_CONCURRENCY, "export": EXPORT_CONCURRENCY}
+
+
+def _load_handlers() -> Dict[str, Callable]:
+    """Handler job = fungsi background webhook (import lokal, hindari circular)."""
+    from app.webhook.telegram import handle_text_message, process_receipt_background
+    from app.webhook.whatsapp import (
+        handle_whatsapp_text_message,
+        process_whatsapp_receipt_background,
+    )
+
+    return {
+        JOB_TELEGRAM_TEXT: handle_text_message,
+        JOB_TELEGRAM_RECEIPT: process_receipt_background,
+        JOB_TELEGRAM_EXPORT: handle_text_message,
+        JOB_WHATSAPP_TEXT: handle_whatsapp_text_message,
+        JOB_WHATSAPP_RECEIPT: process_whatsapp_receipt_background,
+    }
+
+
+class JobRunner:
+    """
+    Loop polling antrian: claim job (SKIP LOCKED) sebanyak slot kosong,
+    jalankan paralel sampai `concurrency`, tandai done/failed.
+    """
+
+    def __init__(self, role: str, concurrency: Optional[int] = None):
+        self.role = role
+        self.queue = ROLE_QUEUES[role]
+        self.concurrency = concurrency or ROLE_CONCURRENCY[role]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{role}"
+
+        self.handlers = _load_handlers()
+        self.client: Optional[httpx.AsyncClient] = None
+        self._stop = asyncio.Event()
+        self._in_flight: set[asyncio.Task] = set()
+
+    def stop(self) -> None:
+        logger.info("Stop requested, finishing %s in-flight jobs", len(self._in_flight))
+        self._stop.set()
+
+    async def _run_job(self, job: dict) -> None:
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            # Handler meneruskan exception (retry / failed lewat fail_job);
+            # pesan error ke user hanya dikirim pada attempt terakhir
+            await handler(
+                client=self.client,
+                raise_errors=True,
+                notify_errors=job["attempts"] >= JOB_MAX_ATTEMPTS,
+                **job["payload"],
+            )
+        except Exception as e:
+            record_failure("job", e)
+            logger.error("Job #%s (%s) failed: %s", job_id, job["kind"], e, exc_info=True)
+            await fail_job(prisma, job_id, str(e), attempts=job["attempts"])
+            return
+
+        await complete_job(prisma, job_id)
+
+    async def _reaper(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await requeue_stale_jobs(prisma, self.queue)
+            except Exception as e:
+                logger.warning("Stale job check failed: %s", e)
+            try:
+                await asyncio.wait_for(self._stop.wait(), JOB_REAPER_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _queue_depth(self) -> None:
+        while not self._stop.is_set():
+            try:
+                depth = await get_queue_depth(prisma, self.queue)
+                JOB_QUEUE_DEPTH.labels(queue=self.queue).set(depth)
+            except Exception as e:
+                logger.warning("Queue depth check failed: %s", e)
+            try:
+                await asyncio.wait_for(self._stop.wait(), JOB_DEPTH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        logger.info(
+            "Job runner started: role=%s queue=%s concurrency=%s id=%s",
+            self.role, self.queue, self.concurrency, self.worker_id
+        )
+        reaper = asyncio.create_task(self._reaper())
+        depth = asyncio.create_task(self._queue_depth())
+        poll_interval = JOB_POLL_INTERVAL_MS / 1000
+
+        while not self._stop.is_set():
+            free_slots = self.concurrency - len(self._in_flight)
+            jobs = []
+            try:
+                jobs = await claim_jobs(prisma, self.queue, free_slots, self.worker_id)
+            except Exception as e:
+                record_failure("job_claim", e)
+                logger.error("Claim jobs failed: %s", e)
+
+            for job in jobs:
+                task = asyncio.create_task(self._run_job(job))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            # Antrian kosong / semua slot terpakai → tunggu sebelum polling lagi
+            if not jobs or len(self._in_flight) >= self.concurrency:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await reaper
+        await depth
+
+
+async def run_role(role: str, concurrency: Optional[int] = None) -> None:
+    runner = JobRunner(role, concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, runner.stop)
+        except NotImplementedError:  # Windows
+            pass
+
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logger.info("Metrics server listening on :%s", METRICS_PORT)
+
+    await connect_db()
+    await worker.startup_worker()
+    runner.client = httpx.AsyncClient(timeout=20.0)
+
+    if role == "worker" and os.getenv("OCR_WARMUP", "1") == "1":
+        from worker.ocr.engines import warm_up
+
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            logger.warning("OCR warm-up failed: %s", e)
+
+    try:
+        await runner.run()
+    finally:
+        await worker.shutdown_worker()
+        await runner.client.aclose()
+        await prisma.disconnect()
+        logger.info("Job runner stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Job runner (role worker / export)")
+    parser.add_argument("--role", choices=list(ROLE_QUEUES), default="worker")
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    asyncio.run(run_role(args.role, args.concurrency))
@@ -1,13 +1,31 @@
 from .transaction_service import (
+    build_bundle,
+    save_bundle,
+    save_bundles,
     save_transaction,
+    save_transaction_batch,
     save_ocr_result,
     TransactionServiceError,
     DatabaseSaveError
 )
+from .prompt_store import (
+    ensure_template,
+    expand_prompt,
+    pack_llm_fields,
+    unpack_text
+)
 
 __all__ = [
+    "build_bundle",
+    "save_bundle",
+    "save_bundles",
     "save_transaction",
+    "save_transaction_batch",
     "save_ocr_result",
     "TransactionServiceError",
-    "DatabaseSaveError"
+    "DatabaseSaveError",
+    "ensure_template",
+    "expand_prompt",
+    "pack_llm_fields",
+    "unpack_text"
 ]
\ No newline at end of file
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .transaction_service import save_bundles
+
+logger = logging.getLogger(__name__)
+
+
+class BundleWriter:
+    """
+    Buffer write bundle (OcrText + LlmResponse + Transaction) dari banyak
+    job yang berjalan bersamaan, lalu tulis sekaligus dengan satu statement
+    (`save_bundles`).
+
+    Pemanggil `submit` menunggu sampai batch-nya ter-commit dan menerima
+    hasil untuk bundle-nya sendiri.
+    """
+
+    def __init__(self, window_ms: int = 50, max_items: int = 100, db: Optional[Any] = None):
+        """
+        Args:
+            window_ms: Lama window pengumpulan (0 = langsung tulis per bundle)
+            max_items: Batas bundle per batch; langsung di-flush jika tercapai
+            db: Prisma client (optional)
+        """
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self.db = db
+        self._pending: List[Tuple[Dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, bundle: Dict) -> dict:
+        """Masukkan satu bundle ke buffer dan tunggu hasil commit-nya."""
+        if not self.enabled:
+            return (await save_bundles([bundle], db=self.db))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((bundle, future))
+
+        if len(self._pending) >= self.max_items:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+        return await future
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: List[Tuple[Dict, asyncio.Future]]) -> None:
+        logger.info("Flushing bundle buffer: %s bundles", len(batch))
+
+        try:
+            results = await save_bundles([bundle for bundle, _ in batch], db=self.db)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self) -> None:
+        """Flush sisa buffer (dipanggil saat shutdown)."""
+        self._schedule_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,217 @@
+"""
+Cache kategori per user yang dipelajari dari transaksi terkonfirmasi.
+
+User mencatat merchant / barang yang sama berulang kali ("indomaret",
+"gofood", "kos"). Keputusan note → (kategori, intent) dari transaksi
+tanpa needsReview disimpan per user sebagai vektor trigram karakter
+(in-memory, tanpa layanan eksternal). Pesan baru yang cukup mirip dengan
+riwayat user bisa diparse rule-based tanpa call LLM, dan parser fallback
+saat LLM tidak tersedia memakai kategori yang sama.
+
+Memori dibatasi: maksimal CATEGORY_CACHE_USER_ENTRIES note per user,
+CATEGORY_CACHE_MAX_ENTRIES note total dan CATEGORY_CACHE_MAX_USERS user;
+user yang paling lama tidak aktif
+dikeluarkan lebih dulu (LRU), lalu dimuat ulang dari DB saat aktif lagi.
+"""
+
+import logging
+import math
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.utils.metrics import CATEGORY_CACHE_ENTRIES, CATEGORY_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_CACHE_ENABLED = os.getenv("CATEGORY_CACHE", "1") == "1"
+# Batas memori: note per user, total note, dan jumlah user di cache
+CATEGORY_CACHE_USER_ENTRIES = int(os.getenv("CATEGORY_CACHE_USER_ENTRIES", "64"))
+CATEGORY_CACHE_MAX_ENTRIES = int(os.getenv("CATEGORY_CACHE_MAX_ENTRIES", "100000"))
+CATEGORY_CACHE_MAX_USERS = int(os.getenv("CATEGORY_CACHE_MAX_USERS", "20000"))
+# Similarity cosine trigram minimal agar note dianggap sama
+CATEGORY_CACHE_MIN_SIMILARITY = float(os.getenv("CATEGORY_CACHE_MIN_SIMILARITY", "0.8"))
+# Pesan lebih panjang dari ini (tanpa nominal) tidak diresolve dari cache
+CATEGORY_CACHE_MAX_WORDS = int(os.getenv("CATEGORY_CACHE_MAX_WORDS", "5"))
+# Confidence hasil yang diresolve dari cache (di atas ambang needs review 0.6)
+CATEGORY_CACHE_CONFIDENCE = float(os.getenv("CATEGORY_CACHE_CONFIDENCE", "0.8"))
+# Hanya hasil dengan confidence minimal ini yang dipelajari
+CATEGORY_CACHE_LEARN_MIN_CONFIDENCE = float(os.getenv("CATEGORY_CACHE_LEARN_MIN_CONFIDENCE", "0.6"))
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+class CategoryMatch(NamedTuple):
+    category: str
+    intent: str
+    similarity: float
+    note: str
+
+
+class _Entry:
+    __slots__ = ("category", "intent", "trigrams", "norm", "hits")
+
+    def __init__(self, category: str, intent: str, trigrams: Tuple[str, ...], norm: float):
+        self.category = category
+        self.intent = intent
+        self.trigrams = trigrams
+        self.norm = norm
+        self.hits = 1
+
+
+def normalize_note(note: str) -> str:
+    """Lowercase, hanya huruf/angka, spasi tunggal ("GoFood - Ayam!" → "gofood ayam")."""
+    return _NON_WORD.sub(" ", (note or "").lower()).strip()
+
+
+def trigrams(key: str) -> FrozenSet[str]:
+    """Trigram karakter per kata dengan padding ("kos" → " ko", "kos", "os ")."""
+    grams = set()
+    for word in key.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class CategoryCache:
+    """
+    Index note → (kategori, intent) per user.
+
+    Tiap user punya OrderedDict note ternormalisasi → entry (LRU per user);
+    lookup mencoba exact match dulu lalu cosine similarity trigram
+    terhadap semua note user (maksimal `user_entries`, cukup linear scan).
+    """
+
+    def __init__(
+        self,
+        user_entries: int = CATEGORY_CACHE_USER_ENTRIES,
+        max_entries: int = CATEGORY_CACHE_MAX_ENTRIES,
+        max_users: int = CATEGORY_CACHE_MAX_USERS,
+        min_similarity: float = CATEGORY_CACHE_MIN_SIMILARITY,
+    ):
+        self.user_entries = user_entries
+        self.max_entries = max_entries
+        self.max_users = max_users
+        self.min_similarity = min_similarity
+        self._users: "OrderedDict[int, OrderedDict[str, _Entry]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def loaded(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def learn(self, user_id: int, note: str, category: str, intent: str) -> None:
+        """Simpan keputusan kategori dari transaksi terkonfirmasi."""
+        key = normalize_note(note)
+        if not key or not category:
+            return
+
+        with self._lock:
+            entries = self._touch_user(user_id)
+            entry = entries.get(key)
+            if entry is not None:
+                # Koreksi user menang atas keputusan lama
+                entry.category, entry.intent = category, intent
+                entry.hits += 1
+                entries.move_to_end(key)
+                return
+
+            # Tuple trigram yang di-intern jauh lebih kecil dari frozenset per note
+            grams = tuple(sys.intern(gram) for gram in trigrams(key))
+            entries[key] = _Entry(category, intent, grams, math.sqrt(len(grams)))
+            self._size += 1
+            if len(entries) > self.user_entries:
+                entries.popitem(last=False)
+                self._size -= 1
+            self._evict()
+
+    def learn_many(self, user_id: int, rows: Iterable[Dict]) -> None:
+        """
+        Isi cache user dari riwayat (urut terbaru dulu, seperti query DB);
+        user ditandai loaded walau riwayatnya kosong.
+        """
+        with self._lock:
+            self._touch_user(user_id)
+        for row in reversed(list(rows)):
+            self.learn(user_id, row.get("note") or "", row.get("category"), row.get("intent"))
+
+    def lookup(self, user_id: int, note: str) -> Optional[CategoryMatch]:
+        """Kategori note paling mirip dari riwayat user (None jika di bawah min_similarity)."""
+        key = normalize_note(note)
+        if not key:
+            return None
+
+        with self._lock:
+            entries = self._users.get(user_id)
+            if not entries:
+                CATEGORY_CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            self._users.move_to_end(user_id)
+
+            entry = entries.get(key)
+            if entry is not None:
+                CATEGORY_CACHE_LOOKUPS.labels(result="exact").inc()
+                return CategoryMatch(entry.category, entry.intent, 1.0, key)
+
+            grams = trigrams(key)
+            if not grams:
+                CATEGORY_CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            norm = math.sqrt(len(grams))
+
+            best_key, best, best_score = None, None, 0.0
+            for entry_key, entry in entries.items():
+                score = len(grams.intersection(entry.trigrams)) / (norm * entry.norm)
+                # Seri: note yang lebih sering dikonfirmasi menang
+                if score > best_score or (best is not None and score == best_score and entry.hits > best.hits):
+                    best_key, best, best_score = entry_key, entry, score
+
+        if best is None or best_score < self.min_similarity:
+            CATEGORY_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        CATEGORY_CACHE_LOOKUPS.labels(result="similar").inc()
+        return CategoryMatch(best.category, best.intent, round(best_score, 3), best_key)
+
+    def _touch_user(self, user_id: int) -> "OrderedDict[str, _Entry]":
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = OrderedDict()
+            self._evict()
+        self._users.move_to_end(user_id)
+        return entries
+
+    def _evict(self) -> None:
+        # User paling lama tidak aktif keluar dulu (user aktif tidak pernah dikeluarkan)
+        while len(self._users) > 1 and (
+            self._size > self.max_entries or len(self._users) > self.max_users
+        ):
+            _, entries = self._users.popitem(last=False)
+            self._size -= len(entries)
+        CATEGORY_CACHE_ENTRIES.set(self._size)
+
+
+category_cache = CategoryCache()
+
+
+async def ensure_user_loaded(
+    user_id: int,
+    loader: Callable[[int], Awaitable[List[Dict]]],
+) -> None:
+    """
+    Muat riwayat user ke cache sekali (sampai user dikeluarkan LRU).
+    Gagal load tidak menghentikan pemrosesan pesan.
+    """
+    if not CATEGORY_CACHE_ENABLED or category_cache.loaded(user_id):
+        return
+    try:
+        rows = await loader(user_id)
+    except Exception as e:
+        logger.warning("Category cache load failed for user %s: %s", user_id, e)
+        return
+    category_cache.learn_many(user_id, rows)
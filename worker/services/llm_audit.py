@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.db.connection import prisma
+from app.utils.metrics import DB_WRITE_DURATION, observe, record_failure
+
+logger = logging.getLogger(__name__)
+
+# Ambil blok ID llm_responses sekaligus (1 round trip per blok, bukan per pesan)
+_RESERVE_IDS_SQL = (
+    "SELECT nextval(pg_get_serial_sequence('llm_responses', 'id')) AS id "
+    "FROM generate_series(1, $1)"
+)
+
+# Sambungkan transaksi ke LlmResponse setelah audit row ter-insert
+_PATCH_TRANSACTIONS_SQL = """
+UPDATE transactions AS t
+SET llm_response_id = v.llm_id
+FROM jsonb_to_recordset($1::jsonb) AS v(tx_id bigint, llm_id int)
+WHERE t.id = v.tx_id
+"""
+
+DEFAULT_SPILL_FILE = Path(os.getenv("LLM_AUDIT_SPILL_FILE", "logs/llm_audit_spill.jsonl"))
+# Row yang gagal di-flush sebanyak ini dicoba satu per satu, lalu di-spill
+LLM_AUDIT_MAX_ATTEMPTS = int(os.getenv("LLM_AUDIT_MAX_ATTEMPTS", "3"))
+# Batas row di buffer; kelebihan (row tertua) di-spill ke file
+LLM_AUDIT_MAX_PENDING = int(os.getenv("LLM_AUDIT_MAX_PENDING", "5000"))
+
+
+class LlmAuditBuffer:
+    """
+    Write-behind buffer untuk audit log LLM (tabel llm_responses).
+
+    Alur pesan teks:
+    1. `reserve_id()` → ID LlmResponse dari blok yang sudah dialokasikan
+    2. Transaksi disimpan dulu (tanpa FK) → balasan ke user tidak menunggu
+       insert LlmResponse yang besar
+    3. `enqueue()` → audit row masuk buffer, di-flush tiap `flush_ms`
+       dengan `create_many` lalu FK transaksi di-patch dengan satu UPDATE
+
+    Jika flush gagal, row dikembalikan ke buffer dengan counter percobaan.
+    Row yang sudah gagal `max_attempts` kali ditulis satu per satu supaya
+    satu row rusak tidak menahan row lain; yang tetap gagal, kelebihan
+    buffer di atas `max_pending`, dan sisa buffer saat shutdown ditulis ke
+    file spill lalu di-replay saat startup berikutnya.
+    """
+
+    def __init__(
+        self,
+        flush_ms: int = 500,
+        max_items: int = 200,
+        id_block_size: int = 50,
+        spill_path: Path = DEFAULT_SPILL_FILE,
+        db: Optional[Any] = None,
+        max_attempts: int = LLM_AUDIT_MAX_ATTEMPTS,
+        max_pending: int = LLM_AUDIT_MAX_PENDING
+    ):
+        """
+        Args:
+            flush_ms: Interval flush (0 = write-behind mati, insert langsung)
+            max_items: Batas row per flush; langsung di-flush jika tercapai
+            id_block_size: Jumlah ID yang dialokasikan per round trip
+            spill_path: File JSONL untuk row yang gagal di-flush saat shutdown
+            db: Prisma client (optional)
+            max_attempts: Percobaan flush per row sebelum diisolasi / di-spill
+            max_pending: Batas row di buffer (kelebihan di-spill)
+        """
+        self.window = flush_ms / 1000
+        self.max_items = max_items
+        self.id_block_size = id_block_size
+        self.spill_path = spill_path
+        self._db = db
+        self.max_attempts = max(1, max_attempts)
+        self.max_pending = max_pending
+
+        self._pending: List[Dict] = []
+        self._reserved_ids: List[int] = []
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @property
+    def db(self):
+        return self._db or prisma
+
+    async def reserve_id(self) -> int:
+        """Ambil satu ID LlmResponse yang sudah dialokasikan dari sequence."""
+        async with self._id_lock:
+            if not self._reserved_ids:
+                rows = await self.db.query_raw(_RESERVE_IDS_SQL, self.id_block_size)
+                self._reserved_ids = [int(row["id"]) for row in rows]
+            return self._reserved_ids.pop(0)
+
+    def enqueue(self, llm_id: int, data: Dict, transaction_ids: List[int]) -> None:
+        """
+        Masukkan audit row ke buffer.
+
+        Args:
+            llm_id: ID dari `reserve_id`
+            data: Data untuk llmresponse (tanpa id)
+            transaction_ids: Transaksi yang harus di-link ke row ini
+        """
+        self._pending.append({
+            "id": llm_id,
+            "data": data,
+            "transaction_ids": [int(tx_id) for tx_id in transaction_ids],
+            "attempts": 0,
+        })
+        self._enforce_cap()
+
+        if len(self._pending) >= self.max_items:
+            self._schedule_flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> int:
+        """
+        Tulis semua row di buffer (create_many + patch FK, satu DB transaction).
+
+        Returns:
+            Jumlah row yang berhasil ditulis
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                links = await self._write(batch)
+            except Exception as e:
+                record_failure("llm_audit_flush", e)
+                for entry in batch:
+                    entry["attempts"] = entry.get("attempts", 0) + 1
+                retry = [entry for entry in batch if entry["attempts"] < self.max_attempts]
+                exhausted = [entry for entry in batch if entry["attempts"] >= self.max_attempts]
+                logger.error(
+                    "LLM audit flush failed (%s rows requeued, %s exhausted): %s",
+                    len(retry), len(exhausted), e
+                )
+                written = await self._write_individually(exhausted, isolate=len(batch) > 1)
+                self._requeue(retry)
+                return written
+
+            logger.info("LLM audit flushed: %s rows, %s links", len(batch), links)
+            return len(batch)
+
+    async def _write(self, entries: List[Dict]) -> int:
+        links = [
+            {"tx_id": tx_id, "llm_id": entry["id"]}
+            for entry in entries
+            for tx_id in entry["transaction_ids"]
+        ]
+        with observe(DB_WRITE_DURATION, table="llm_responses_buffered"):
+            async with self.db.tx() as tx:
+                await tx.llmresponse.create_many(
+                    data=[{"id": entry["id"], **entry["data"]} for entry in entries],
+                    skip_duplicates=True
+                )
+                if links:
+                    await tx.execute_raw(_PATCH_TRANSACTIONS_SQL, json.dumps(links))
+        return len(links)
+
+    async def _write_individually(self, entries: List[Dict], isolate: bool) -> int:
+        """Row yang habis percobaan: tulis satu per satu (isolasi row rusak), sisanya di-spill."""
+        if not entries:
+            return 0
+        if not isolate:
+            self._spill(entries)
+            return 0
+
+        written = 0
+        failed = []
+        for entry in entries:
+            try:
+                await self._write([entry])
+                written += 1
+            except Exception as e:
+                logger.error("LLM audit row %s failed individually: %s", entry["id"], e)
+                failed.append(entry)
+        if failed:
+            self._spill(failed)
+        return written
+
+    def _requeue(self, entries: List[Dict]) -> None:
+        self._pending = entries + self._pending
+        self._enforce_cap()
+        if self._pending and self._timer is None and self.enabled:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._schedule_flush
+            )
+
+    def _enforce_cap(self) -> None:
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            self._spill(self._pending[:overflow])
+            self._pending = self._pending[overflow:]
+
+    async def close(self) -> None:
+        """Flush terakhir saat shutdown; row yang gagal ditulis ke file spill."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        await self.flush()
+
+        if self._pending:
+            self._spill(self._pending)
+            self._pending = []
+
+    def _spill(self, entries: List[Dict]) -> None:
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.spill_path.open("a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+        logger.warning("LLM audit: %s rows spilled to %s", len(entries), self.spill_path)
+
+    async def replay_spill(self) -> int:
+        """Masukkan kembali row dari file spill (dipanggil saat startup)."""
+        if not self.spill_path.exists():
+            return 0
+
+        lines = self.spill_path.read_text(encoding="utf-8").splitlines()
+        self.spill_path.unlink()
+
+        for line in lines:
+            if line.strip():
+                entry = json.loads(line)
+                created_at = entry["data"].get("createdAt")
+                if isinstance(created_at, str):
+                    entry["data"]["createdAt"] = datetime.fromisoformat(created_at)
+                entry["attempts"] = 0
+                self._pending.append(entry)
+
+        written = await self.flush()
+        logger.info("LLM audit spill replayed: %s rows", written)
+        return written
@@ -1,6 +1,12 @@
 import os
 import time
-from typing import Dict, Tuple, Optional
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
+from typing import Dict, Iterable, Iterator, Tuple, Optional
 import logging
 
 from ..ocr.preprocessor import ImagePreprocessor
@@ -9,6 +15,34 @@ from ..utils.image_utils import load_image, save_image, get_image_info
 
 logger = logging.getLogger(__name__)
 
+
+# Preprocessor per process pool worker (dibuat sekali per process, bukan per image)
+_pool_preprocessors: Dict[Tuple, ImagePreprocessor] = {}
+
+
+def _load_and_preprocess(image_path: str, preprocessor_kwargs: Dict) -> Dict:
+    """
+    Load + preprocess satu image (dijalankan di process pool).
+
+    Harus fungsi module-level agar bisa di-pickle oleh ProcessPoolExecutor.
+    """
+    start = time.perf_counter()
+    img = load_image(image_path)
+    img_info = get_image_info(img)
+
+    key = tuple(sorted(preprocessor_kwargs.items()))
+    preprocessor = _pool_preprocessors.get(key)
+    if preprocessor is None:
+        preprocessor = _pool_preprocessors[key] = ImagePreprocessor(**preprocessor_kwargs)
+    preprocessed = preprocessor.preprocess(img)
+
+    return {
+        "image": preprocessed,
+        "info": img_info,
+        "preprocess_ms": int((time.perf_counter() - start) * 1000),
+    }
+
+
 class OCRService:
     """
     OCR Service
@@ -24,7 +58,8 @@ class OCRService:
         self,
         tesseract_cmd: Optional[str] = None,
         save_preprocessed: bool = False,
-        preprocessed_dir: str = "upload/temp"
+        preprocessed_dir: str = "upload/temp",
+        ocr_engine: Optional[TesseractOCR] = None
     ):
         """
         Initialize OCR Service
@@ -33,17 +68,19 @@ class OCRService:
             tesseract_cmd: Path ke Tesseract binary (optional)
             save_preprocessed: Save preprocessed images untuk debugging
             preprocessed_dir: Directory untuk save preprocessed images
+            ocr_engine: TesseractOCR yang sudah ada (lihat worker.ocr.engines)
         """
-        # Initialize preprocessor
-        self.preprocessor = ImagePreprocessor(
-            max_width=1920,
-            max_height=1080,
-            auto_deskew=True,
-            denoise=True
-        )
+        # Initialize preprocessor (kwargs disimpan untuk process pool batch)
+        self._preprocessor_kwargs = {
+            "max_width": 1920,
+            "max_height": 1080,
+            "auto_deskew": True,
+            "denoise": True,
+        }
+        self.preprocessor = ImagePreprocessor(**self._preprocessor_kwargs)
         
-        # Initialize Tesseract OCR
-        self.ocr_engine = TesseractOCR(
+        # Initialize Tesseract OCR (pakai engine bersama jika diberikan)
+        self.ocr_engine = ocr_engine or TesseractOCR(
             lang="ind+eng",
             psm=6,  # Uniform block of text
             oem=3,  # LSTM + Legacy
@@ -52,6 +89,7 @@ class OCRService:
         
         self.save_preprocessed = save_preprocessed
         self.preprocessed_dir = preprocessed_dir
+        self.last_batch_stats: Dict = {}
         
         # Create directory jika belum ada
         if self.save_preprocessed:
@@ -99,33 +137,7 @@ class OCRService:
             
             # Step 4: Build complete metadata
             processing_time = time.time() - start_time
-            
-            metadata = {
-                # OCR metadata
-                **ocr_metadata,
-                
-                # Image metadata
-                "original_width": img_info['width'],
-                "original_height": img_info['height'],
-                "original_size_kb": img_info['size_kb'],
-                
-                # Processing metadata
-                "processing_time_ms": int(processing_time * 1000),
-                "preprocessed": True,
-                "preprocessing_steps": [
-                    "resize",
-                    "grayscale",
-                    "deskew" if self.preprocessor.auto_deskew else None,
-                    "denoise" if self.preprocessor.denoise else None,
-                    "binarize",
-                    "morphology"
-                ]
-            }
-            
-            # Remove None values dari preprocessing_steps
-            metadata["preprocessing_steps"] = [
-                step for step in metadata["preprocessing_steps"] if step
-            ]
+            metadata = self._build_metadata(ocr_metadata, img_info, processing_time)
             
             logger.info(f"OCR complete: {len(text)} chars extracted, "
                        f"confidence={ocr_metadata['confidence']:.2f}%, "
@@ -163,40 +175,189 @@ class OCRService:
         except Exception as e:
             logger.warning(f"Failed to save preprocessed image: {e}")
     
-    def process_batch(self, image_paths: list) -> list:
+    def _build_metadata(self, ocr_metadata: Dict, img_info: Dict, processing_time: float) -> Dict:
+        """
+        Gabungkan metadata OCR, image, dan processing
+        
+        Args:
+            ocr_metadata: Metadata dari TesseractOCR
+            img_info: Info image original (get_image_info)
+            processing_time: Total waktu proses (detik)
+        """
+        metadata = {
+            # OCR metadata
+            **ocr_metadata,
+            
+            # Image metadata
+            "original_width": img_info['width'],
+            "original_height": img_info['height'],
+            "original_size_kb": img_info['size_kb'],
+            
+            # Processing metadata
+            "processing_time_ms": int(processing_time * 1000),
+            "preprocessed": True,
+            "preprocessing_steps": [
+                "resize",
+                "grayscale",
+                "deskew" if self.preprocessor.auto_deskew else None,
+                "denoise" if self.preprocessor.denoise else None,
+                "binarize",
+                "morphology"
+            ]
+        }
+        
+        # Remove None values dari preprocessing_steps
+        metadata["preprocessing_steps"] = [
+            step for step in metadata["preprocessing_steps"] if step
+        ]
+        return metadata
+    
+    def _ocr_preprocessed(self, image_path: str, preprocessed: Dict, start_time: float) -> Tuple[str, Dict]:
+        """
+        OCR image yang sudah di-preprocess (dijalankan di thread pool)
+        
+        Args:
+            image_path: Path image original
+            preprocessed: Output `_load_and_preprocess`
+            start_time: Waktu mulai item ini (time.time())
+        """
+        if self.save_preprocessed:
+            self._save_preprocessed_image(image_path, preprocessed["image"])
+        
+        text, ocr_metadata = self.ocr_engine.extract_text(preprocessed["image"])
+        
+        metadata = self._build_metadata(
+            ocr_metadata, preprocessed["info"], time.time() - start_time
+        )
+        metadata["preprocess_ms"] = preprocessed["preprocess_ms"]
+        return text, metadata
+    
+    def iter_batch(
+        self,
+        image_paths: Iterable[str],
+        preprocess_workers: Optional[int] = None,
+        ocr_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Process banyak image sebagai pipeline, hasil di-stream saat selesai
+        
+        Pipeline:
+        - Load + preprocess di process pool (CPU-bound, lewat GIL)
+        - OCR di thread pool (Tesseract jalan sebagai subprocess, jadi
+          thread cukup untuk memakai semua core)
+        - Image berikutnya baru di-submit saat satu item selesai, sehingga
+          memory tetap dibatasi `max_in_flight`
+        
+        Args:
+            image_paths: Iterable path image
+            preprocess_workers: Jumlah process preprocessing (default: cpu_count)
+            ocr_workers: Jumlah thread OCR (default: sama dengan preprocess_workers)
+            max_in_flight: Maksimal image yang diproses bersamaan (default: 2x workers)
+            
+        Yields:
+            Dict per image (urutan selesai, bukan urutan input):
+                index, path, success, text, metadata / error
+        """
+        preprocess_workers = preprocess_workers or os.cpu_count() or 1
+        ocr_workers = ocr_workers or preprocess_workers
+        max_in_flight = max_in_flight or preprocess_workers * 2
+        
+        pending = iter(enumerate(image_paths))
+        preprocess_futures = {}
+        ocr_futures = {}
+        started_at = {}
+        
+        batch_start = time.perf_counter()
+        total = 0
+        success_count = 0
+        
+        with ProcessPoolExecutor(max_workers=preprocess_workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=ocr_workers) as thread_pool:
+            
+            def submit_next() -> None:
+                try:
+                    index, path = next(pending)
+                except StopIteration:
+                    return
+                started_at[index] = time.time()
+                future = process_pool.submit(
+                    _load_and_preprocess, path, self._preprocessor_kwargs
+                )
+                preprocess_futures[future] = (index, path)
+            
+            for _ in range(max_in_flight):
+                submit_next()
+            
+            while preprocess_futures or ocr_futures:
+                done, _ = wait(
+                    list(preprocess_futures) + list(ocr_futures),
+                    return_when=FIRST_COMPLETED
+                )
+                
+                for future in done:
+                    if future in preprocess_futures:
+                        index, path = preprocess_futures.pop(future)
+                        try:
+                            preprocessed = future.result()
+                        except Exception as e:
+                            logger.error(f"Failed to preprocess {path}: {e}")
+                            total += 1
+                            yield {"index": index, "path": path, "success": False, "error": str(e)}
+                            submit_next()
+                            continue
+                        
+                        ocr_future = thread_pool.submit(
+                            self._ocr_preprocessed, path, preprocessed, started_at[index]
+                        )
+                        ocr_futures[ocr_future] = (index, path)
+                        continue
+                    
+                    index, path = ocr_futures.pop(future)
+                    started_at.pop(index, None)
+                    total += 1
+                    try:
+                        text, metadata = future.result()
+                        success_count += 1
+                        yield {
+                            "index": index,
+                            "path": path,
+                            "success": True,
+                            "text": text,
+                            "metadata": metadata
+                        }
+                    except Exception as e:
+                        logger.error(f"Failed to process {path}: {e}")
+                        yield {"index": index, "path": path, "success": False, "error": str(e)}
+                    submit_next()
+        
+        elapsed = time.perf_counter() - batch_start
+        self.last_batch_stats = {
+            "images": total,
+            "success": success_count,
+            "elapsed_s": round(elapsed, 2),
+            "images_per_sec": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+        logger.info(
+            f"Batch processing complete: {success_count}/{total} successful, "
+            f"{self.last_batch_stats['images_per_sec']} images/sec"
+        )
+    
+    def process_batch(self, image_paths: list, **kwargs) -> list:
         """
         Process multiple images in batch
         
         Args:
             image_paths: List of image paths
+            **kwargs: Diteruskan ke `iter_batch` (jumlah worker, dll)
             
         Returns:
-            List of tuples (text, metadata) untuk setiap image
+            List hasil untuk setiap image, urut sesuai input
         """
         logger.info(f"Processing batch of {len(image_paths)} images")
         
-        results = []
-        
-        for i, path in enumerate(image_paths, 1):
-            logger.info(f"Processing image {i}/{len(image_paths)}: {path}")
-            
-            try:
-                text, metadata = self.process_image(path)
-                results.append({
-                    "path": path,
-                    "success": True,
-                    "text": text,
-                    "metadata": metadata
-                })
-            except Exception as e:
-                logger.error(f"Failed to process {path}: {e}")
-                results.append({
-                    "path": path,
-                    "success": False,
-                    "error": str(e)
-                })
-        
-        success_count = sum(1 for r in results if r["success"])
-        logger.info(f"Batch processing complete: {success_count}/{len(image_paths)} successful")
-        
-        return results
\ No newline at end of file
+        results = sorted(self.iter_batch(image_paths, **kwargs), key=lambda r: r["index"])
+        for result in results:
+            result.pop("index")
+        
+        return results
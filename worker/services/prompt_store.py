@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from app.db.connection import prisma
+from worker.llm.prompts import SYSTEM_PROMPT, render_prompt
+from worker.utils.compression import compress_text, decompress_text, is_compressed
+
+logger = logging.getLogger(__name__)
+
+# prompt_used berisi "tpl:<template_id>" (+ "\n<input prompt>" jika input
+# prompt berbeda dari inputText, mis. OCR yang sudah diringkas)
+TEMPLATE_PREFIX = "tpl:"
+
+# Template yang sudah di-upsert di process ini
+_registered: set[str] = set()
+
+
+def template_id(name: str, body: str) -> str:
+    """ID template berversi: nama + hash isi (berubah jika template berubah)."""
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:12]
+    return f"{name}@{digest}"
+
+
+def template_body(template: str, system_prompt: Optional[str]) -> str:
+    """Gabungkan system prompt + template user prompt menjadi satu body registry."""
+    if not system_prompt:
+        return template
+    return f"[system]\n{system_prompt}\n[user]\n{template}"
+
+
+async def ensure_template(name: str, body: str, db: Optional[Any] = None) -> str:
+    """
+    Daftarkan template ke tabel prompt_templates (sekali per process).
+
+    Returns:
+        Template ID
+    """
+    tid = template_id(name, body)
+    if tid in _registered:
+        return tid
+
+    db_client = db or prisma
+    await db_client.prompttemplate.upsert(
+        where={"id": tid},
+        data={
+            "create": {"id": tid, "name": name, "body": body},
+            "update": {},
+        },
+    )
+    _registered.add(tid)
+    logger.info(f"Prompt template registered: {tid}")
+    return tid
+
+
+def prompt_ref(tid: str, prompt_input: Optional[str], input_text: Optional[str]) -> str:
+    """Nilai prompt_used: referensi template + input prompt jika beda dari inputText."""
+    if prompt_input is None or prompt_input == input_text:
+        return f"{TEMPLATE_PREFIX}{tid}"
+    return f"{TEMPLATE_PREFIX}{tid}\n{compress_text(prompt_input)}"
+
+
+def pack_llm_output(llm_output: Optional[str]) -> Optional[str]:
+    """
+    llmOutput (kolom Json, dikirim sebagai raw JSON string).
+    Versi terkompresi disimpan sebagai JSON string.
+    """
+    packed = compress_text(llm_output)
+    if packed is not llm_output and is_compressed(packed):
+        return json.dumps(packed)
+    return llm_output
+
+
+async def pack_llm_fields(
+    name: str,
+    template: Optional[str],
+    prompt_input: Optional[str],
+    input_text: str,
+    llm_output: str,
+    system_prompt: Optional[str] = SYSTEM_PROMPT,
+    db: Optional[Any] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Siapkan field inputText / promptUsed / llmOutput untuk llm_responses:
+    prompt disimpan sebagai referensi template, teks besar dikompres.
+
+    Args:
+        name: Nama template ("ocr", "text", "text_batch", ...)
+        template: User prompt dengan INPUT_PLACEHOLDER (None = tanpa prompt)
+        prompt_input: Nilai yang mengisi placeholder
+        input_text: Input asli (inputText)
+        llm_output: Output LLM mentah
+        system_prompt: System prompt yang dipakai untuk call ini
+    """
+    prompt_used = None
+    if template is not None:
+        tid = await ensure_template(name, template_body(template, system_prompt), db=db)
+        prompt_used = prompt_ref(tid, prompt_input, input_text)
+
+    return {
+        "inputText": compress_text(input_text),
+        "promptUsed": prompt_used,
+        "llmOutput": pack_llm_output(llm_output),
+    }
+
+
+def unpack_text(value: Any) -> Any:
+    """Dekompres inputText / llmOutput yang tersimpan terkompresi."""
+    return decompress_text(value) if is_compressed(value) else value
+
+
+async def expand_prompt(
+    prompt_used: Optional[str],
+    input_text: Optional[str],
+    db: Optional[Any] = None
+) -> Optional[str]:
+    """Rekonstruksi prompt lengkap (system + user) dari referensi template."""
+    if not prompt_used or not prompt_used.startswith(TEMPLATE_PREFIX):
+        return unpack_text(prompt_used)
+
+    ref, _, prompt_input = prompt_used[len(TEMPLATE_PREFIX):].partition("\n")
+    db_client = db or prisma
+    template = await db_client.prompttemplate.find_unique(where={"id": ref})
+    if template is None:
+        logger.warning(f"Prompt template not found: {ref}")
+        return prompt_used
+
+    variable = unpack_text(prompt_input) if prompt_input else unpack_text(input_text)
+    return render_prompt(template.body, variable or "")
@@ -0,0 +1,358 @@
+"""
+Parser deterministik untuk teks OCR struk.
+
+Sebagian besar struk punya baris "TOTAL", "GRAND TOTAL" atau "JUMLAH"
+yang jelas. Untuk struk seperti itu hasilnya bisa diambil langsung dari
+teks OCR tanpa call LLM. Parser memberi skor confidence sendiri; worker
+hanya melewati LLM jika skornya tinggi.
+
+Output memakai format yang sama dengan `parse_llm_response` sehingga
+bisa langsung masuk `run_sanity_checks` dan `save_transaction`.
+"""
+
+import json
+import logging
+import re
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Nominal struk yang masuk akal (IDR)
+MIN_AMOUNT = 100
+MAX_AMOUNT = 100_000_000
+
+# Keyword baris total beserta bobotnya (semakin spesifik semakin tinggi)
+TOTAL_KEYWORDS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"\bgrand\s*total\b", re.IGNORECASE), 0.20),
+    (re.compile(r"\btotal\s*(bayar|belanja|harga|tagihan|pembayaran)\b", re.IGNORECASE), 0.18),
+    (re.compile(r"\btotal\b", re.IGNORECASE), 0.12),
+    (re.compile(r"\bjumlah\b", re.IGNORECASE), 0.08),
+]
+
+# Baris yang mengandung kata "total" tapi bukan total akhir
+NON_TOTAL_LINE = re.compile(
+    r"\b(sub\s*-?\s*total|total\s*(item|qty|disc|diskon|hemat|pajak|ppn)|"
+    r"jumlah\s*(item|barang|qty))\b",
+    re.IGNORECASE
+)
+
+SUBTOTAL_LINE = re.compile(r"\bsub\s*-?\s*total\b", re.IGNORECASE)
+CASH_LINE = re.compile(r"\b(tunai|cash|bayar|dibayar)\b", re.IGNORECASE)
+CHANGE_LINE = re.compile(r"\b(kembali|kembalian|change)\b", re.IGNORECASE)
+PAYMENT_LINE = re.compile(r"\b(debit|kredit|credit|qris|edc|ovo|gopay|dana|shopeepay)\b", re.IGNORECASE)
+
+# Nominal format Indonesia: 125.000 | 1.250.000,00 | Rp125,000 | 25000
+_AMOUNT_TOKEN = re.compile(
+    r"(?<![\d.,])(?:rp\.?\s*)?(\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d{3,9}(?:[.,]\d{1,2})?)(?![\d.,]*\d)",
+    re.IGNORECASE
+)
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "mei": 5, "may": 5, "jun": 6,
+    "jul": 7, "agu": 8, "agt": 8, "aug": 8, "sep": 9, "okt": 10, "oct": 10,
+    "nov": 11, "des": 12, "dec": 12,
+}
+
+_DATE_NUMERIC = re.compile(r"\b(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{2,4})\b")
+_DATE_ISO = re.compile(r"\b(\d{4})[/.\-](\d{1,2})[/.\-](\d{1,2})\b")
+_DATE_TEXT = re.compile(r"\b(\d{1,2})\s*[-\s]?\s*([a-z]{3})[a-z]*\.?\s*[-\s]?\s*(\d{2,4})\b", re.IGNORECASE)
+
+# Merchant → kategori (dicocokkan ke header struk)
+MERCHANT_CATEGORY = {
+    "indomaret": "belanja",
+    "alfamart": "belanja",
+    "alfamidi": "belanja",
+    "superindo": "belanja",
+    "hypermart": "belanja",
+    "transmart": "belanja",
+    "giant": "belanja",
+    "lottemart": "belanja",
+    "spbu": "transportasi",
+    "pertamina": "transportasi",
+    "shell": "transportasi",
+    "parkir": "transportasi",
+    "apotek": "kesehatan",
+    "kimia farma": "kesehatan",
+    "guardian": "kesehatan",
+    "klinik": "kesehatan",
+    "starbucks": "minuman",
+    "kopi": "minuman",
+    "coffee": "minuman",
+    "cafe": "minuman",
+    "chatime": "minuman",
+    "resto": "makan",
+    "restoran": "makan",
+    "rumah makan": "makan",
+    "warung": "makan",
+    "bakso": "makan",
+    "mcdonald": "makan",
+    "kfc": "makan",
+    "pizza": "makan",
+    "solaria": "makan",
+    "cinema": "hiburan",
+    "xxi": "hiburan",
+    "cgv": "hiburan",
+    "pln": "tagihan",
+    "telkom": "tagihan",
+}
+
+# Skor minimal agar hasil parser dipakai tanpa LLM
+DEFAULT_MIN_CONFIDENCE = 0.85
+
+_MERCHANT_HEADER_LINES = 4
+
+
+def parse_amount_id(token: str) -> Optional[int]:
+    """
+    Parse nominal format Indonesia/Inggris menjadi integer rupiah.
+
+    "125.000" → 125000, "1.250.000,00" → 1250000, "125,000" → 125000,
+    "25000" → 25000, "12.50" → 12 (desimal dibuang, tapi ambigu — lihat
+    `is_ambiguous_amount`)
+    """
+    if not token:
+        return None
+
+    value = re.sub(r"(?i)rp\.?\s*", "", token.strip())
+
+    # Satu-dua digit terakhir setelah separator = desimal (sen)
+    decimal_match = re.search(r"[.,](\d{1,2})$", value)
+    if decimal_match:
+        value = value[:decimal_match.start()]
+
+    digits = re.sub(r"[.,\s]", "", value)
+    if not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def is_ambiguous_amount(token: str) -> bool:
+    """
+    True jika ekor 1-2 digit diperlakukan sebagai sen tanpa bukti jelas.
+
+    Sen dianggap jelas hanya untuk koma + tepat 2 digit ("12,50",
+    "1.250.000,00") atau jika ada separator ribuan sebelumnya ("1,250.00").
+    "125.00" / "100.5" bisa juga "125.000" yang terpotong OCR.
+    """
+    value = re.sub(r"(?i)rp\.?\s*", "", (token or "").strip())
+    decimal_match = re.search(r"([.,])(\d{1,2})$", value)
+    if not decimal_match:
+        return False
+    if decimal_match.group(1) == "," and len(decimal_match.group(2)) == 2:
+        return False
+    return not re.search(r"[.,]", value[:decimal_match.start()])
+
+
+def _amount_tokens(line: str) -> List[str]:
+    return [
+        match.group(1)
+        for match in _AMOUNT_TOKEN.finditer(line)
+        if parse_amount_id(match.group(1)) is not None
+    ]
+
+
+def _line_amount_token(lines: List[str], index: int) -> Optional[str]:
+    """
+    Token nominal terakhir di baris `index`. Jika baris hanya berisi label
+    (nominal tercetak di baris berikutnya), pakai baris setelahnya.
+    """
+    tokens = _amount_tokens(lines[index])
+    if tokens:
+        return tokens[-1]
+    if index + 1 < len(lines):
+        next_tokens = _amount_tokens(lines[index + 1])
+        if next_tokens and not re.search(r"[a-z]{3,}", lines[index + 1], re.IGNORECASE):
+            return next_tokens[-1]
+    return None
+
+
+def _line_amount(lines: List[str], index: int) -> Optional[int]:
+    token = _line_amount_token(lines, index)
+    return parse_amount_id(token) if token else None
+
+
+def _find_amount_by_pattern(lines: List[str], pattern: re.Pattern) -> Optional[int]:
+    for i in range(len(lines) - 1, -1, -1):
+        if pattern.search(lines[i]):
+            amount = _line_amount(lines, i)
+            if amount is not None:
+                return amount
+    return None
+
+
+def detect_date(lines: List[str]) -> Optional[str]:
+    """Cari tanggal transaksi pertama di struk, format YYYY-MM-DD."""
+    for line in lines:
+        for pattern in (_DATE_ISO, _DATE_NUMERIC, _DATE_TEXT):
+            match = pattern.search(line)
+            if not match:
+                continue
+
+            try:
+                if pattern is _DATE_ISO:
+                    year, month, day = (int(g) for g in match.groups())
+                elif pattern is _DATE_NUMERIC:
+                    day, month, year = (int(g) for g in match.groups())
+                else:
+                    month = _MONTHS.get(match.group(2).lower()[:3])
+                    if month is None:
+                        continue
+                    day, year = int(match.group(1)), int(match.group(3))
+
+                if year < 100:
+                    year += 2000
+                return date(year, month, day).isoformat()
+            except ValueError:
+                continue
+
+    return None
+
+
+def detect_merchant(lines: List[str]) -> Optional[str]:
+    """Merchant = baris header pertama yang dominan huruf."""
+    for line in lines[:_MERCHANT_HEADER_LINES]:
+        letters = sum(ch.isalpha() for ch in line)
+        digits = sum(ch.isdigit() for ch in line)
+        if letters >= 3 and letters > digits * 2 and not NON_TOTAL_LINE.search(line):
+            return line.strip(" -*=:")
+    return None
+
+
+def guess_category(lines: List[str]) -> Tuple[str, bool]:
+    """
+    Tebak kategori dari header struk.
+
+    Returns:
+        Tuple (kategori, apakah berasal dari merchant yang dikenal)
+    """
+    header = " ".join(lines[:_MERCHANT_HEADER_LINES]).lower()
+    for keyword, category in MERCHANT_CATEGORY.items():
+        if keyword in header:
+            return category, True
+    return "belanja", False
+
+
+def _find_total_candidates(lines: List[str]) -> List[Dict]:
+    candidates = []
+    for i, line in enumerate(lines):
+        if NON_TOTAL_LINE.search(line):
+            continue
+        for pattern, weight in TOTAL_KEYWORDS:
+            if pattern.search(line):
+                token = _line_amount_token(lines, i)
+                if token is not None:
+                    candidates.append({
+                        "line": i,
+                        "amount": parse_amount_id(token),
+                        "token": token,
+                        "weight": weight,
+                    })
+                break
+    return candidates
+
+
+def parse_receipt_text(ocr_text: str, ocr_confidence: Optional[float] = None) -> Optional[Dict]:
+    """
+    Ekstrak total, tanggal dan merchant dari teks OCR struk.
+
+    Args:
+        ocr_text: Teks hasil TesseractOCR
+        ocr_confidence: Confidence OCR (0-100), dipakai sebagai penalti skor
+
+    Returns:
+        Dict format `parse_llm_response` (plus "merchant" dan "signals"),
+        atau None jika tidak ada baris total yang bisa dipakai
+    """
+    lines = [re.sub(r"\s+", " ", ln).strip() for ln in (ocr_text or "").splitlines()]
+    lines = [ln for ln in lines if ln]
+    if not lines:
+        return None
+
+    candidates = _find_total_candidates(lines)
+    if not candidates:
+        return None
+
+    # Ambil kandidat terkuat; jika bobot sama, yang paling bawah (total akhir)
+    best = max(candidates, key=lambda c: (c["weight"], c["line"]))
+    total = best["amount"]
+
+    signals = [f"total_line:{best['line']}"]
+    confidence = 0.6 + best["weight"]
+
+    # Kandidat lain dengan nominal berbeda → ambigu
+    conflicting = {c["amount"] for c in candidates if c["weight"] >= best["weight"]} - {total}
+    if conflicting:
+        confidence -= 0.2
+        signals.append("conflicting_totals")
+
+    # Cross-check dengan subtotal, tunai - kembalian, dan baris pembayaran
+    subtotal = _find_amount_by_pattern(lines, SUBTOTAL_LINE)
+    if subtotal is not None:
+        if subtotal == total or total >= subtotal * 0.9:
+            confidence += 0.05
+            signals.append("subtotal_consistent")
+        else:
+            confidence -= 0.1
+            signals.append("subtotal_mismatch")
+
+    cash = _find_amount_by_pattern(lines[best["line"] + 1:], CASH_LINE)
+    change = _find_amount_by_pattern(lines[best["line"] + 1:], CHANGE_LINE)
+    if cash is not None and change is not None:
+        if cash - change == total:
+            confidence += 0.15
+            signals.append("cash_minus_change")
+        else:
+            confidence -= 0.05
+            signals.append("cash_change_mismatch")
+
+    payment = _find_amount_by_pattern(lines[best["line"] + 1:], PAYMENT_LINE)
+    if payment is not None and payment == total:
+        confidence += 0.1
+        signals.append("payment_matches_total")
+
+    if not MIN_AMOUNT <= total <= MAX_AMOUNT:
+        confidence = min(confidence, 0.3)
+        signals.append("amount_out_of_range")
+
+    # "125.00" bisa 125 (sen) atau 125.000 terpotong → jangan lewati LLM
+    if is_ambiguous_amount(best["token"]):
+        confidence = min(confidence, 0.5)
+        signals.append("ambiguous_decimal")
+
+    if ocr_confidence is not None and ocr_confidence < 60:
+        confidence -= 0.1
+        signals.append("low_ocr_confidence")
+
+    confidence = round(max(0.0, min(confidence, 0.99)), 2)
+
+    merchant = detect_merchant(lines)
+    tx_date = detect_date(lines)
+    category, known_merchant = guess_category(lines)
+    if known_merchant:
+        signals.append("known_merchant")
+
+    note = f"Belanja di {merchant}" if merchant else "Pembayaran struk"
+
+    result = {
+        "intent": "expense",
+        "amount": Decimal(total),
+        "currency": "IDR",
+        "date": tx_date,
+        "category": category,
+        "note": note,
+        "confidence": confidence,
+        "merchant": merchant,
+        "signals": signals,
+    }
+    result["raw_output"] = json.dumps(
+        {k: v for k, v in result.items() if k != "signals"},
+        default=str
+    )
+
+    logger.debug(
+        "Receipt parser: total=%s confidence=%.2f signals=%s",
+        total, confidence, signals
+    )
+    return result
@@ -1,9 +1,17 @@
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, NamedTuple, Optional, Set
 import logging
+import os
+import re
 
 logger = logging.getLogger(__name__)
 
+# Similarity minimal (1 - edit distance / panjang) untuk koreksi typo kategori
+CATEGORY_FUZZY_MIN_SIMILARITY = float(os.getenv("CATEGORY_FUZZY_MIN_SIMILARITY", "0.75"))
+# Di bawah similarity ini kategori hasil normalisasi perlu dicek user
+# (koreksi typo yang jauh, atau fallback "lainnya" dengan similarity 0.0)
+CATEGORY_MIN_SIMILARITY = float(os.getenv("CATEGORY_MIN_SIMILARITY", "0.85"))
+
 VALID_CATEGORIES = [
     "makan",
     "minuman",
@@ -21,6 +29,7 @@ VALID_CATEGORIES = [
 CATEGORY_MAPPING = {
     # Typo / singkatan
     "mkn": "makan",
+    "makanan": "makan",
     "minum": "minuman",
     "transport": "transportasi",
     "bill": "tagihan",
@@ -53,6 +62,154 @@ CATEGORY_MAPPING = {
     "transfer uang": "transfer",
 }
 
+
+class CategoryMatch(NamedTuple):
+    category: str
+    similarity: float
+    alias: str
+
+
+def _deletes(word: str, max_edits: int) -> Set[str]:
+    """Semua string hasil menghapus sampai `max_edits` huruf dari `word` (termasuk word)."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_edits):
+        frontier = {item[:i] + item[i + 1:] for item in frontier for i in range(len(item))}
+        result |= frontier
+    return result
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Damerau-Levenshtein (optimal string alignment): transposisi dua huruf
+    ("trasnport") dihitung satu edit. Hanya diagonal |i - j| <= max_distance
+    yang dihitung; return max_distance + 1 jika jaraknya lebih dari itu.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    over = max_distance + 1
+    previous2: List[int] = []
+    previous = [j if j <= max_distance else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        current = [over] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            char_b = b[j - 1]
+            value = previous[j - 1] + (char_a != char_b)
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current[j] = min(value, over)
+        # Transposisi membaca dua baris ke belakang → dua baris harus sudah lewat batas
+        if min(current) > max_distance and min(previous) > max_distance:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class CategoryIndex:
+    """
+    Index koreksi typo ("trasnport", "mkanan") atas kategori valid dan
+    alias CATEGORY_MAPPING, dihitung sekali saat import.
+
+    Index memetakan semua hasil hapus 1..MAX_EDITS huruf dari tiap alias
+    ke alias tersebut (symmetric delete). String input dengan jarak edit
+    <= MAX_EDITS ke suatu alias pasti berbagi minimal satu key, jadi
+    kandidat didapat lewat lookup dict; edit distance hanya dihitung
+    untuk kandidat tersebut (biasanya satu). Hasil per string di-memo
+    karena output LLM mengulang string kategori yang sama.
+    """
+
+    # Jarak edit maksimal yang diindex (di atas ini selalu < min_similarity
+    # untuk alias terpanjang)
+    MAX_EDITS = 2
+    # String lebih pendek dari ini terlalu ambigu untuk dikoreksi
+    MIN_LENGTH = 4
+    MEMO_SIZE = 4096
+
+    def __init__(self, aliases: Dict[str, str], min_similarity: float = CATEGORY_FUZZY_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._aliases = dict(aliases)
+        self._max_length = max(len(alias) for alias in self._aliases) + self.MAX_EDITS
+        self._index: Dict[str, List[str]] = {}
+        for alias in self._aliases:
+            for key in _deletes(alias, self.MAX_EDITS):
+                self._index.setdefault(key, []).append(alias)
+        self._memo: Dict[str, Optional[CategoryMatch]] = {}
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def match(self, text: str) -> Optional[CategoryMatch]:
+        """
+        Kategori untuk `text` (sudah lowercase/strip).
+
+        Kategori multi kata ("makanan & minuman") dicoba per kata jika
+        string utuh tidak cocok; kata pertama menang saat seri.
+        """
+        if text in self._memo:
+            return self._memo[text]
+
+        result = self._match_one(text)
+        if result is None:
+            for word in re.findall(r"[a-z]+", text):
+                if word == text:
+                    continue
+                candidate = self._match_one(word)
+                if candidate is not None and (result is None or candidate.similarity > result.similarity):
+                    result = candidate
+
+        if len(self._memo) >= self.MEMO_SIZE:
+            self._memo.clear()
+        self._memo[text] = result
+        return result
+
+    def _max_distance(self, length: int) -> int:
+        return min(self.MAX_EDITS, int(length * (1 - self.min_similarity)))
+
+    def _match_one(self, text: str) -> Optional[CategoryMatch]:
+        category = self._aliases.get(text)
+        if category is not None:
+            return CategoryMatch(category, 1.0, text)
+        if not self.MIN_LENGTH <= len(text) <= self._max_length:
+            return None
+
+        candidates: Set[str] = set()
+        for key in _deletes(text, self._max_distance(len(text))):
+            candidates.update(self._index.get(key, ()))
+
+        best = None
+        for alias in candidates:
+            longest = max(len(text), len(alias))
+            max_distance = self._max_distance(longest)
+            distance = _edit_distance(text, alias, max_distance)
+            if distance > max_distance:
+                continue
+            similarity = round(1 - distance / longest, 3)
+            if best is None or similarity > best.similarity or (
+                similarity == best.similarity and alias < best.alias
+            ):
+                best = CategoryMatch(self._aliases[alias], similarity, alias)
+        return best
+
+
+CATEGORY_INDEX = CategoryIndex({
+    **{category: category for category in VALID_CATEGORIES},
+    **CATEGORY_MAPPING,
+})
+
+
+def is_low_category_similarity(similarity: float) -> bool:
+    """True jika similarity normalisasi kategori di bawah CATEGORY_MIN_SIMILARITY."""
+    return similarity < CATEGORY_MIN_SIMILARITY
+
+
 def run_sanity_checks(parsed_output: Dict) -> Dict:
     """
     Jalankan sanity checks pada parsed output dari LLM.
@@ -89,10 +246,17 @@ def run_sanity_checks(parsed_output: Dict) -> Dict:
     )
     normalized_category = category_result["normalized"]
     
+    category_similarity = category_result["similarity"]
+    
     if category_result["was_corrected"]:
         warnings.append(
             f"Kategori dikoreksi: '{parsed_output.get('category')}' → '{normalized_category}'"
+            + (f" (similarity {category_similarity:.2f})" if category_similarity < 1.0 else "")
         )
+    if is_low_category_similarity(category_similarity):
+        flags.append("Low Category Similarity")
+        warnings.append("Kategori tidak yakin")
+        needs_review = True
 
     # Intent match
     penalty = len(flags) * 0.05
@@ -103,7 +267,8 @@ def run_sanity_checks(parsed_output: Dict) -> Dict:
         "flags": flags,
         "adjusted_confidence": adjust_confidence,
         "warning": "; ".join(warnings),
-        "normalized_category": normalized_category
+        "normalized_category": normalized_category,
+        "category_similarity": category_similarity
     }
     
     logger.info(
@@ -121,25 +286,37 @@ def validate_and_normalize_category(category: str) -> Dict:
     Returns:
         {
             "normalized": str,      # Category yang sudah dinormalisasi
-            "was_corrected": bool   # Apakah ada koreksi?
+            "was_corrected": bool,  # Apakah ada koreksi?
+            "similarity": float     # 1.0 exact/alias, <1.0 koreksi typo, 0.0 fallback
         }
     """
     if not category:
-        return {"normalized": "lainnya", "was_corrected": True}
+        return {"normalized": "lainnya", "was_corrected": True, "similarity": 0.0}
     
     normalized = category.lower().strip()
     
     # Exact match
     if normalized in VALID_CATEGORIES:
-        return {"normalized": normalized, "was_corrected": False}
+        return {"normalized": normalized, "was_corrected": False, "similarity": 1.0}
     
     # Try mapping
     if normalized in CATEGORY_MAPPING:
         mapped = CATEGORY_MAPPING[normalized]
         logger.debug(f"Category mapped: '{category}' → '{mapped}'")
-        return {"normalized": mapped, "was_corrected": True}
+        return {"normalized": mapped, "was_corrected": True, "similarity": 1.0}
+    
+    # Fuzzy match (typo / kategori multi kata) lewat index symmetric delete + edit distance
+    match = CATEGORY_INDEX.match(normalized)
+    if match is not None:
+        logger.debug(
+            f"Category fuzzy matched: '{category}' → '{match.category}' "
+            f"(via '{match.alias}', similarity={match.similarity:.2f})"
+        )
+        return {
+            "normalized": match.category,
+            "was_corrected": True,
+            "similarity": match.similarity
+        }
     
-    # Fuzzy match (optional: bisa pakai difflib untuk typo detection)
-    # For now, fallback ke "lainnya"
     logger.warning(f"Unknown category: '{category}', fallback to 'lainnya'")
-    return {"normalized": "lainnya", "was_corrected": True}
\ No newline at end of file
+    return {"normalized": "lainnya", "was_corrected": True, "similarity": 0.0}
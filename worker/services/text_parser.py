@@ -0,0 +1,227 @@
+"""
+Parser rule-based untuk pesan teks transaksi ("kopi 20rb", "gaji masuk 5jt").
+
+Jalur fallback saat LLM tidak tersedia (circuit breaker open / kuota
+rate limit habis). Hasilnya sengaja diberi confidence rendah sehingga
+transaksi disimpan dengan needsReview dan bisa dikoreksi user.
+
+Output memakai format yang sama dengan `parse_llm_response`.
+"""
+
+import json
+import logging
+import re
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from worker.services.receipt_parser import (
+    MAX_AMOUNT,
+    MERCHANT_CATEGORY,
+    is_ambiguous_amount,
+    parse_amount_id,
+)
+from worker.services.sanity_checks import CATEGORY_MAPPING, VALID_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+# Confidence tetap: di bawah ambang sanity check (0.6) → needs review
+RULE_PARSER_CONFIDENCE = 0.5
+
+# Nominal: 20rb | 20 ribu | 15k | 1.5jt | 1,5 juta | Rp 25.000 | 25000
+_AMOUNT = re.compile(
+    r"(rp\.?\s*)?(\d+(?:[.,]\d+)*)\s*(rb|ribu|k|jt|juta)?\b",
+    re.IGNORECASE
+)
+_MULTIPLIERS = {"rb": 1_000, "ribu": 1_000, "k": 1_000, "jt": 1_000_000, "juta": 1_000_000}
+
+# Format angka tanpa satuan yang jelas nominal: "25.000" / "1.500.000" / "25000"
+# (dicek tanpa ekor sen ",00")
+_CLEAR_NUMBER = re.compile(r"\d{1,3}(?:\.\d{3})+|\d{4,}")
+_CENTS_TAIL = re.compile(r"[.,]\d{1,2}$")
+
+# Tahun di konteks tanggal ("kos januari 2024", "12/03/2024", "2024-01") bukan nominal
+_YEAR = re.compile(r"(?:19|20)\d{2}")
+_MONTH_BEFORE = re.compile(
+    r"\b(?:jan(?:uari|uary)?|feb(?:ruari|ruary)?|mar(?:et|ch)?|apr(?:il)?|mei|may|"
+    r"jun[ie]?|jul[iy]?|agu(?:stus)?|agt|aug(?:ust)?|sep(?:t|tember)?|"
+    r"okt(?:ober)?|oct(?:ober)?|nov(?:ember)?|des(?:ember)?|dec(?:ember)?)\.?\s*$",
+    re.IGNORECASE
+)
+_DATE_TOKEN = re.compile(r"\d{1,2}\.\d{1,2}\.(?:\d{2}|\d{4})")
+_DATE_BEFORE = re.compile(r"\d[/\-]$")
+_DATE_AFTER = re.compile(r"^[/\-]\d")
+
+
+class AmountToken(NamedTuple):
+    amount: Optional[int]  # None = bukan nominal (angka kecil, tahun, di luar batas)
+    explicit: bool  # satuan (rb/jt/k) atau prefix Rp
+    clear: bool  # explicit atau format angka jelas ("25.000", "25000")
+
+_INCOME = re.compile(
+    r"\b(gaji|gajian|terima|diterima|dapat|dapet|masuk|bonus|thr|refund|"
+    r"dibayar|jual|penjualan|pemasukan|income)\b",
+    re.IGNORECASE
+)
+
+# Keyword pesan → kategori (selain CATEGORY_MAPPING dan MERCHANT_CATEGORY)
+TEXT_CATEGORY = {
+    "makan": "makan",
+    "sarapan": "makan",
+    "nasi": "makan",
+    "snack": "makan",
+    "minum": "minuman",
+    "teh": "minuman",
+    "gojek": "transportasi",
+    "grab": "transportasi",
+    "gocar": "transportasi",
+    "taksi": "transportasi",
+    "tol": "transportasi",
+    "kereta": "transportasi",
+    "krl": "transportasi",
+    "token": "tagihan",
+    "internet": "tagihan",
+    "bpjs": "kesehatan",
+    "buku": "pendidikan",
+    "spp": "pendidikan",
+    "gaji": "gaji",
+    "transfer": "transfer",
+}
+
+
+def _is_date(text: str, match: re.Match) -> bool:
+    """Token tanggal ("12.03.2024") atau tahun di konteks tanggal."""
+    number = match.group(2)
+    if match.group(1) or match.group(3):
+        return False
+    if _DATE_TOKEN.fullmatch(number):
+        return True
+    if not _YEAR.fullmatch(number):
+        return False
+    before, after = text[:match.start(2)], text[match.end(2):]
+    return bool(
+        _MONTH_BEFORE.search(before) or _DATE_BEFORE.search(before) or _DATE_AFTER.match(after)
+    )
+
+
+def amount_tokens(text: str) -> List[AmountToken]:
+    """Semua token angka di pesan (urutan kemunculan), termasuk yang bukan nominal."""
+    text = text or ""
+    tokens = []
+    for match in _AMOUNT.finditer(text):
+        prefix, number, suffix = match.group(1), match.group(2), (match.group(3) or "").lower()
+
+        if suffix:
+            # Dengan satuan, satu separator dianggap desimal ("1,5jt", "2.5rb")
+            normalized = number.replace(",", ".")
+            if normalized.count(".") > 1:
+                normalized = normalized.replace(".", "")
+            amount = int(Decimal(normalized) * _MULTIPLIERS[suffix])
+        else:
+            # Ekor 1-2 digit = sen ("25.000,00" → 25000), sama seperti struk
+            amount = parse_amount_id(number)
+
+        explicit = bool(prefix or suffix)
+        # Angka kecil tanpa satuan (mis. "2 gelas") dan tanggal bukan nominal
+        if (not suffix and amount < 100) or _is_date(text, match):
+            amount = None
+        elif not 0 < amount <= MAX_AMOUNT:
+            amount = None
+
+        clear = amount is not None and (
+            bool(suffix)
+            or (
+                not is_ambiguous_amount(number)
+                and (explicit or bool(_CLEAR_NUMBER.fullmatch(_CENTS_TAIL.sub("", number))))
+            )
+        )
+        tokens.append(AmountToken(amount, explicit, clear))
+    return tokens
+
+
+def parse_text_amount(text: str) -> Optional[int]:
+    """
+    Nominal di pesan dalam rupiah: yang bersatuan / ber-prefix Rp
+    diutamakan, lalu angka pertama yang bukan tanggal (angka mirip tahun
+    tanpa konteks tanggal dipakai paling akhir).
+
+    "kopi 20rb" → 20000, "1,5jt" → 1500000, "25.000" → 25000,
+    "bayar kos januari 2024 1500000" → 1500000
+    """
+    tokens = [token for token in amount_tokens(text) if token.amount is not None]
+    if not tokens:
+        return None
+    # sorted() stabil → urutan kemunculan dipertahankan dalam tiap prioritas
+    best = sorted(
+        tokens,
+        key=lambda token: (not token.explicit, bool(_YEAR.fullmatch(str(token.amount))))
+    )[0]
+    return best.amount
+
+
+def strip_amounts(text: str) -> str:
+    """Pesan tanpa nominal ("kopi 20rb" → "kopi")."""
+    return re.sub(r"\s+", " ", _AMOUNT.sub(" ", text or "")).strip(" ,.-")
+
+
+def guess_text_category(text: str) -> str:
+    lowered = (text or "").lower()
+    words = set(re.findall(r"[a-z]+", lowered))
+
+    for category in VALID_CATEGORIES:
+        if category in words:
+            return category
+    for keyword, category in {**CATEGORY_MAPPING, **TEXT_CATEGORY}.items():
+        if keyword in words or (" " in keyword and keyword in lowered):
+            return category
+    for keyword, category in MERCHANT_CATEGORY.items():
+        if keyword in lowered:
+            return category
+    return "lainnya"
+
+
+def parse_transaction_text(
+    text: str,
+    category: Optional[str] = None,
+    intent: Optional[str] = None,
+    confidence: float = RULE_PARSER_CONFIDENCE
+) -> Optional[Dict]:
+    """
+    Ekstrak satu transaksi dari pesan teks tanpa LLM.
+
+    Args:
+        text: Pesan user
+        category: Kategori yang sudah diketahui (mis. dari cache kategori
+            user); None = ditebak dari keyword
+        intent: Intent yang sudah diketahui; None = ditebak dari keyword
+        confidence: Confidence hasil
+
+    Returns:
+        Dict format `parse_llm_response` (confidence RULE_PARSER_CONFIDENCE),
+        atau None jika tidak ada nominal
+    """
+    amount = parse_text_amount(text)
+    if amount is None:
+        return None
+
+    intent = intent or ("income" if _INCOME.search(text) else "expense")
+    if category is None:
+        category = guess_text_category(text)
+        if intent == "income" and category == "lainnya":
+            category = "gaji" if re.search(r"\bgaji", text, re.IGNORECASE) else "transfer"
+
+    # Note = pesan tanpa nominal
+    note = strip_amounts(text) or text.strip()
+
+    result = {
+        "intent": intent,
+        "amount": Decimal(amount),
+        "currency": "IDR",
+        "date": None,
+        "category": category,
+        "note": note[:200],
+        "confidence": confidence,
+    }
+    result["raw_output"] = json.dumps(result, default=str)
+
+    logger.debug("Text rule parser: amount=%s intent=%s category=%s", amount, intent, category)
+    return result
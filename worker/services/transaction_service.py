@@ -1,10 +1,12 @@
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any
 import logging
 import json
 from decimal import Decimal
 
 from app.db.connection import prisma 
+from app.utils.metrics import DB_WRITE_DURATION, observe
+from app.utils.tracing import current_trace_id
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +26,12 @@ async def save_transaction(
     category: str,
     description: str,
     transaction_type: str,
-    llm_response_id: int,
+    llm_response_id: Optional[int],
     receipt_id: Optional[int],
     source: str,
-    db: Optional[Any] = None
+    db: Optional[Any] = None,
+    needs_review: bool = False,
+    category_similarity: Optional[float] = None
 ) -> dict:
     """
     Simple save transaction untuk worker_main.py
@@ -38,10 +42,13 @@ async def save_transaction(
         category: Category string
         description: Deskripsi/note
         transaction_type: "masuk" atau "keluar"
-        llm_response_id: ID dari llm_responses table
+        llm_response_id: ID dari llm_responses table (None jika di-link
+            belakangan oleh write-behind LlmAuditBuffer)
         receipt_id: ID dari receipts table (optional)
         source: "telegram" atau "whatsapp"
         db: Prisma client (optional)
+        needs_review: Tandai perlu dicek user (mis. hasil parser fallback)
+        category_similarity: Skor normalisasi kategori (disimpan di extra)
     
     Returns:
         Dict dengan transaction data
@@ -58,23 +65,28 @@ async def save_transaction(
         if isinstance(amount, float):
             amount = Decimal(str(amount))
         
+        extra = {"source": source, "trace_id": current_trace_id()}
+        if category_similarity is not None:
+            extra["category_similarity"] = category_similarity
+
         # Create transaction
-        transaction = await db_client.transaction.create(
-            data={
-                "userId": user_id,
-                "amount": int(amount),
-                "category": category,
-                "note": description,
-                "intent": transaction_type,
-                "llmResponseId": llm_response_id,
-                "receiptId": receipt_id,
-                "currency": "IDR",
-                "txDate": datetime.now(),
-                "needsReview": False,
-                "createdAt": datetime.now(),
-                "extra": json.dumps({"source": source})
-            }
-        )
+        with observe(DB_WRITE_DURATION, table="transactions"):
+            transaction = await db_client.transaction.create(
+                data={
+                    "userId": user_id,
+                    "amount": int(amount),
+                    "category": category,
+                    "note": description,
+                    "intent": transaction_type,
+                    "llmResponseId": llm_response_id,
+                    "receiptId": receipt_id,
+                    "currency": "IDR",
+                    "txDate": datetime.now(),
+                    "needsReview": needs_review,
+                    "createdAt": datetime.now(),
+                    "extra": json.dumps(extra)
+                }
+            )
         
         logger.info(f"Transaction saved: id={transaction.id}")
         return {
@@ -85,6 +97,7 @@ async def save_transaction(
             "note": transaction.note,
             "intent": transaction.intent,
             "currency": transaction.currency,
+            "needsReview": transaction.needsReview,
             "createdAt": transaction.createdAt.isoformat() if transaction.createdAt else None
         }
         
@@ -92,20 +105,83 @@ async def save_transaction(
         logger.error(f"Error saving transaction: {e}", exc_info=True)
         raise TransactionServiceError(f"Failed to save transaction: {e}") from e
     
+async def save_transaction_batch(
+    user_id: int,
+    transactions: List[Dict],
+    llm_data: Dict,
+    receipt_id: Optional[int],
+    source: str,
+    db: Optional[Any] = None
+) -> List[dict]:
+    """
+    Simpan satu LlmResponse + banyak transaksi dalam SATU DB transaction
+    (dipakai mode batch: pesan multi-item / burst pesan).
+
+    Args:
+        user_id: User ID
+        transactions: List dict dengan key amount, category, description,
+            transaction_type (dan optional needs_review, category_similarity)
+        llm_data: Data untuk prisma.llmresponse.create
+        receipt_id: ID dari receipts table (optional)
+        source: "telegram" atau "whatsapp"
+        db: Prisma client (optional)
+
+    Returns:
+        List dict transaksi (urutan sama dengan input)
+    """
+    db_client = db or prisma
+
+    try:
+        with observe(DB_WRITE_DURATION, table="batch"):
+            async with db_client.tx() as tx:
+                llm_record = await tx.llmresponse.create(data=llm_data)
+
+                saved = []
+                for item in transactions:
+                    saved.append(await save_transaction(
+                        user_id=user_id,
+                        amount=item["amount"],
+                        category=item["category"],
+                        description=item["description"],
+                        transaction_type=item["transaction_type"],
+                        llm_response_id=llm_record.id,
+                        receipt_id=receipt_id,
+                        source=source,
+                        db=tx,
+                        needs_review=item.get("needs_review", False),
+                        category_similarity=item.get("category_similarity")
+                    ))
+
+        logger.info(
+            f"Batch saved: llm_response={llm_record.id}, transactions={len(saved)}"
+        )
+        return saved
+
+    except TransactionServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"Error saving transaction batch: {e}", exc_info=True)
+        raise TransactionServiceError(f"Failed to save transaction batch: {e}") from e
+
 async def save_ocr_result(
     receipt_id: int,
     raw_text: str,
     confidence: float,
-    db: Optional[Any] = None
+    db: Optional[Any] = None,
+    meta: Optional[Dict] = None
 ) -> dict:
     """
     Save OCR result untuk worker_main.py
+
+    Satu OcrText per receipt: jika sudah ada (mis. job yang sama di-retry
+    setelah gagal), row lama di-update, bukan ditambah.
     
     Args:
         receipt_id: Receipt ID
         raw_text: Raw OCR text
         confidence: OCR confidence score (0-100)
         db: Prisma client (optional)
+        meta: ocrMeta lengkap (default hanya confidence)
     
     Returns:
         Dict dengan OCR text data
@@ -115,14 +191,28 @@ async def save_ocr_result(
     try:
         logger.debug(f"Saving OCR text for receipt {receipt_id}")
         
-        ocr_text = await db_client.ocrtext.create(
-            data={
-                "receiptId": receipt_id,
-                "ocrRaw": raw_text,
-                "ocrMeta": json.dumps({"confidence": confidence}),
-                "createdAt": datetime.now()
-            }
-        )
+        data = {
+            "ocrRaw": raw_text,
+            "ocrMeta": json.dumps(meta or {"confidence": confidence}),
+        }
+        with observe(DB_WRITE_DURATION, table="ocr_texts"):
+            # receipt_id tidak unique di schema, jadi upsert manual
+            existing = await db_client.ocrtext.find_first(
+                where={"receiptId": receipt_id}
+            )
+            if existing:
+                ocr_text = await db_client.ocrtext.update(
+                    where={"id": existing.id},
+                    data=data
+                )
+            else:
+                ocr_text = await db_client.ocrtext.create(
+                    data={
+                        "receiptId": receipt_id,
+                        **data,
+                        "createdAt": datetime.now()
+                    }
+                )
         
         logger.info(f"OCR text saved: id={ocr_text.id}")
         return {
@@ -137,6 +227,173 @@ async def save_ocr_result(
         logger.error(f"Error saving OCR result: {e}", exc_info=True)
         raise TransactionServiceError(f"Failed to save OCR result: {e}") from e
 
+# Satu statement untuk OcrText + LlmResponse + Transaction (N bundle sekaligus).
+# ID di-alokasikan dulu lewat nextval supaya FK antar tabel bisa diisi di
+# statement yang sama dan hasilnya bisa dipetakan balik ke urutan input.
+_BUNDLE_INSERT_SQL = """
+WITH input AS MATERIALIZED (
+    SELECT
+        x.*,
+        CASE WHEN x.ocr_raw IS NULL THEN NULL
+             ELSE nextval(pg_get_serial_sequence('ocr_texts', 'id')) END AS ocr_id,
+        nextval(pg_get_serial_sequence('llm_responses', 'id')) AS llm_id,
+        nextval(pg_get_serial_sequence('transactions', 'id')) AS tx_id,
+        (now() AT TIME ZONE 'UTC') AS created_at
+    FROM jsonb_to_recordset($1::jsonb) AS x(
+        idx int,
+        receipt_id int,
+        user_id bigint,
+        ocr_raw text,
+        ocr_meta jsonb,
+        input_source text,
+        input_text text,
+        prompt_used text,
+        model_name text,
+        llm_output jsonb,
+        llm_meta jsonb,
+        intent text,
+        amount int,
+        category text,
+        note text,
+        needs_review boolean,
+        extra jsonb
+    )
+),
+ocr AS (
+    INSERT INTO ocr_texts (id, receipt_id, ocr_raw, ocr_meta, created_at)
+    SELECT ocr_id, receipt_id, ocr_raw, ocr_meta, created_at
+    FROM input WHERE ocr_id IS NOT NULL
+),
+llm AS (
+    INSERT INTO llm_responses (
+        id, user_id, input_source, input_text, prompt_used,
+        model_name, llm_output, llm_meta, created_at
+    )
+    SELECT llm_id, user_id, input_source, input_text, prompt_used,
+           model_name, llm_output, llm_meta, created_at
+    FROM input
+),
+tx AS (
+    INSERT INTO transactions (
+        id, user_id, llm_response_id, receipt_id, intent, amount, currency,
+        tx_date, category, note, needs_review, extra, created_at
+    )
+    SELECT tx_id, user_id, llm_id, receipt_id, intent, amount, 'IDR',
+           created_at, category, note, needs_review, extra, created_at
+    FROM input
+)
+SELECT idx, ocr_id, llm_id, tx_id, created_at FROM input ORDER BY idx
+"""
+
+
+def _as_json_value(value: Any) -> Any:
+    """Output LLM (string JSON) → value JSON; teks non-JSON disimpan sebagai string."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def build_bundle(
+    user_id: int,
+    receipt_id: Optional[int],
+    ocr_text: Optional[str],
+    ocr_meta: Optional[Dict],
+    input_source: str,
+    input_text: str,
+    prompt_used: Optional[str],
+    model_name: Optional[str],
+    llm_output: str,
+    llm_meta: Dict,
+    amount: Any,
+    category: str,
+    description: str,
+    transaction_type: str,
+    source: str,
+    needs_review: bool = False,
+    category_similarity: Optional[float] = None
+) -> Dict:
+    """
+    Susun satu unit-of-work (OcrText + LlmResponse + Transaction) untuk
+    `save_bundles` / `BundleWriter`.
+    """
+    extra = {"source": source, "trace_id": current_trace_id()}
+    if category_similarity is not None:
+        extra["category_similarity"] = category_similarity
+
+    return {
+        "receipt_id": receipt_id,
+        "user_id": user_id,
+        "ocr_raw": ocr_text,
+        "ocr_meta": ocr_meta or {},
+        "input_source": input_source,
+        "input_text": input_text,
+        "prompt_used": prompt_used,
+        "model_name": model_name,
+        "llm_output": _as_json_value(llm_output),
+        "llm_meta": llm_meta,
+        "intent": transaction_type,
+        "amount": int(Decimal(str(amount))),
+        "category": category,
+        "note": description,
+        "needs_review": needs_review,
+        "extra": extra,
+    }
+
+
+async def save_bundles(bundles: List[Dict], db: Optional[Any] = None) -> List[dict]:
+    """
+    Simpan banyak bundle dalam SATU round trip (satu statement CTE,
+    otomatis atomic — gagal di tengah tidak meninggalkan orphan row).
+
+    Args:
+        bundles: List hasil `build_bundle`
+        db: Prisma client (optional)
+
+    Returns:
+        List dict transaksi (urutan sama dengan input), plus
+        ocrTextId dan llmResponseId
+    """
+    if not bundles:
+        return []
+
+    db_client = db or prisma
+    payload = [{"idx": i, **bundle} for i, bundle in enumerate(bundles)]
+
+    try:
+        with observe(DB_WRITE_DURATION, table="bundle"):
+            rows = await db_client.query_raw(_BUNDLE_INSERT_SQL, json.dumps(payload, default=str))
+    except Exception as e:
+        logger.error(f"Error saving bundles: {e}", exc_info=True)
+        raise TransactionServiceError(f"Failed to save bundles: {e}") from e
+
+    results = []
+    for row, bundle in zip(sorted(rows, key=lambda r: r["idx"]), bundles):
+        created_at = row["created_at"]
+        results.append({
+            "id": int(row["tx_id"]),
+            "userId": bundle["user_id"],
+            "amount": bundle["amount"],
+            "category": bundle["category"],
+            "note": bundle["note"],
+            "intent": bundle["intent"],
+            "currency": "IDR",
+            "needsReview": bundle["needs_review"],
+            "createdAt": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+            "ocrTextId": int(row["ocr_id"]) if row["ocr_id"] is not None else None,
+            "llmResponseId": int(row["llm_id"]),
+        })
+
+    logger.info(f"Bundles saved: {len(results)} (1 round trip)")
+    return results
+
+
+async def save_bundle(bundle: Dict, db: Optional[Any] = None) -> dict:
+    """Simpan satu bundle (OcrText + LlmResponse + Transaction) dalam satu round trip."""
+    return (await save_bundles([bundle], db=db))[0]
+
 # Internal Helper Functions
 async def _save_llm_response(db: Any, payload: Dict) -> Optional[int]:
     """
@@ -421,6 +678,7 @@ async def save_transaction_from_text(
                 "confidence": sanity_result["adjusted_confidence"],
                 "raw_confidence": parsed_output.get("confidence", 0),
                 "flags": sanity_result.get("flags", []),
+                "category_similarity": sanity_result.get("category_similarity"),
                 "warnings": sanity_result.get("warning", "")
             }
         }
@@ -563,6 +821,7 @@ async def save_transaction_from_ocr(
                 "raw_confidence": parsed_output.get("confidence", 0),
                 "ocr_confidence": ocr_confidence,
                 "flags": sanity_result.get("flags", []),
+                "category_similarity": sanity_result.get("category_similarity"),
                 "warnings": sanity_result.get("warning", ""),
                 "ocr_preprocessing": ocr_metadata.get("preprocessing_steps", [])
             }
@@ -652,6 +911,37 @@ async def get_user_transactions(
         logger.error(f"Failed to fetch user transactions: {e}", exc_info=True)
         raise TransactionServiceError(f"Failed to fetch transactions: {e}") from e
 
+async def get_confirmed_categories(
+    user_id: int,
+    limit: int = 200,
+    db: Optional[Any] = None
+) -> List[Dict]:
+    """
+    Riwayat note → kategori dari transaksi yang tidak perlu review
+    (untuk cache kategori per user), terbaru dulu.
+
+    Returns:
+        List dict note, category, intent
+    """
+    db_client = db or prisma
+
+    try:
+        transactions = await db_client.transaction.find_many(
+            where={"userId": user_id, "needsReview": False},
+            order={"createdAt": "desc"},
+            take=limit
+        )
+    except Exception as e:
+        logger.error(f"Failed to fetch confirmed categories: {e}", exc_info=True)
+        raise TransactionServiceError(f"Failed to fetch transactions: {e}") from e
+
+    return [
+        {"note": tx.note, "category": tx.category, "intent": tx.intent}
+        for tx in transactions
+        if tx.note
+    ]
+
+
 async def update_transaction_status(
     transaction_id: int,
     new_status: str,
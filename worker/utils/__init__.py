@@ -1,20 +1,31 @@
 # Worker Utils Package
-from .image_utils import (
-    load_image,
-    save_image,
-    resize_image,
-    to_grayscale,
-    pil_to_cv,
-    cv_to_pil,
-    get_image_info
-)
+#
+# image_utils (cv2, numpy, PIL) di-load lazy; `worker.utils.compression`
+# dkk. bisa di-import tanpa ikut memuat OpenCV.
+import importlib
 
-__all__ = [
-    "load_image",
-    "save_image",
-    "resize_image",
-    "to_grayscale",
-    "pil_to_cv",
-    "cv_to_pil",
-    "get_image_info"
-]
\ No newline at end of file
+_LAZY_EXPORTS = {
+    "load_image": "image_utils",
+    "save_image": "image_utils",
+    "resize_image": "image_utils",
+    "to_grayscale": "image_utils",
+    "pil_to_cv": "image_utils",
+    "cv_to_pil": "image_utils",
+    "get_image_info": "image_utils",
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
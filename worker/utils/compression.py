@@ -0,0 +1,75 @@
+"""
+Text Compression Utilities
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Kompresi teks besar (inputText / llmOutput) sebelum disimpan ke DB.
+Hasil kompresi tetap berupa string (base64) dengan prefix codec agar
+bisa dibedakan dari teks biasa:
+
+- "zstd:<base64>" jika package `zstandard` terinstall
+- "gz:<base64>" fallback (stdlib gzip)
+"""
+
+import base64
+import gzip
+import os
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Teks di bawah ukuran ini tidak dikompres (overhead base64 tidak sepadan)
+COMPRESS_MIN_BYTES = int(os.getenv("LLM_COMPRESS_MIN_BYTES", "512"))
+
+ZSTD_PREFIX = "zstd:"
+GZIP_PREFIX = "gz:"
+
+
+def is_compressed(value: Optional[str]) -> bool:
+    return isinstance(value, str) and value.startswith((ZSTD_PREFIX, GZIP_PREFIX))
+
+
+def compress_text(value: Optional[str], min_bytes: int = COMPRESS_MIN_BYTES) -> Optional[str]:
+    """
+    Kompres teks jika cukup besar dan hasilnya memang lebih kecil.
+
+    Returns:
+        String terkompresi (dengan prefix) atau teks asli
+    """
+    if not value or is_compressed(value):
+        return value
+
+    raw = value.encode("utf-8")
+    if len(raw) < min_bytes:
+        return value
+
+    if zstandard is not None:
+        packed = ZSTD_PREFIX + base64.b64encode(
+            zstandard.ZstdCompressor(level=10).compress(raw)
+        ).decode("ascii")
+    else:
+        packed = GZIP_PREFIX + base64.b64encode(
+            gzip.compress(raw, compresslevel=9, mtime=0)
+        ).decode("ascii")
+
+    return packed if len(packed) < len(value) else value
+
+
+def decompress_text(value: Optional[str]) -> Optional[str]:
+    """Kebalikan `compress_text`; teks tanpa prefix dikembalikan apa adanya."""
+    if not isinstance(value, str):
+        return value
+
+    if value.startswith(ZSTD_PREFIX):
+        if zstandard is None:
+            raise RuntimeError("Data terkompresi zstd tapi package zstandard tidak terinstall")
+        data = base64.b64decode(value[len(ZSTD_PREFIX):])
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+
+    if value.startswith(GZIP_PREFIX):
+        data = base64.b64decode(value[len(GZIP_PREFIX):])
+        return gzip.decompress(data).decode("utf-8")
+
+    return value
@@ -1,39 +1,514 @@
+import asyncio
+import functools
 import logging
 import json
-from typing import Optional
+import os
+import re
+import time
+from typing import List, Optional, Union
 from datetime import datetime
 
 from app.db.connection import prisma
-from worker.llm.llm_client import call_llm, LLMAPIError
-from worker.llm.parser import parse_llm_response, ParserError
+from app.utils.metrics import (
+    DB_WRITE_DURATION,
+    LLM_FALLBACK,
+    PARSE_DURATION,
+    observe,
+    record_failure,
+)
+from app.utils.tracing import current_trace_id, span
+from worker.llm.llm_client import call_llm_routed, LLMAPIError, LLMUnavailableError
+from worker.llm.parser import (
+    parse_llm_response,
+    parse_llm_batch_response,
+    ParserError
+)
+from worker.llm.batcher import TextBatcher
 from worker.services.transaction_service import (
-    save_transaction,
+    build_bundle,
+    get_confirmed_categories,
     save_ocr_result,
+    save_transaction,
+    save_transaction_batch,
     TransactionServiceError
 )
-from worker.services.sanity_checks import run_sanity_checks
-from worker.llm.prompts import build_prompt
+from worker.services.bundle_writer import BundleWriter
+from worker.services.category_cache import (
+    CATEGORY_CACHE_CONFIDENCE,
+    CATEGORY_CACHE_ENABLED,
+    CATEGORY_CACHE_LEARN_MIN_CONFIDENCE,
+    CATEGORY_CACHE_MAX_WORDS,
+    category_cache,
+    ensure_user_loaded,
+)
+from worker.services.llm_audit import LlmAuditBuffer
+from worker.services.prompt_store import pack_llm_fields
+from worker.services.sanity_checks import (
+    is_low_category_similarity,
+    run_sanity_checks,
+    validate_and_normalize_category
+)
+from worker.services.receipt_parser import (
+    DEFAULT_MIN_CONFIDENCE,
+    parse_receipt_text
+)
+from worker.services.text_parser import amount_tokens, parse_transaction_text, strip_amounts
+from worker.llm.prompts import (
+    BATCH_SYSTEM_PROMPT,
+    INPUT_PLACEHOLDER,
+    build_batch_prompt,
+    build_prompt_parts,
+    render_prompt,
+    split_multi_item_message
+)
+from worker.utils.compression import compress_text
 
-from worker.ocr.preprocessor import ImagePreprocessor
-from worker.utils.image_utils import load_image
-from worker.ocr.tesseract import TesseractOCR
+# Modul OCR (cv2, numpy, pytesseract) di-import lazy di process_image_message
+# agar pesan teks / replica web tidak menanggung biaya load-nya
 
 logger = logging.getLogger(__name__)
 
+# Window pengumpulan pesan per user untuk mode batch (0 = mati)
+# Default mati: dengan window > 0 setiap pesan tunggal ikut menunggu selama window
+TEXT_BATCH_WINDOW_MS = int(os.getenv("TEXT_BATCH_WINDOW_MS", "0"))
+
+# Skor minimal parser struk deterministik untuk melewati call LLM
+RECEIPT_PARSER_MIN_CONFIDENCE = float(
+    os.getenv("RECEIPT_PARSER_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE))
+)
+RECEIPT_PARSER_MODEL_NAME = "receipt-parser"
+# Model name audit untuk pesan teks yang diparse rule-based saat LLM tidak tersedia
+TEXT_PARSER_MODEL_NAME = "text-parser"
+# Model name audit untuk pesan teks yang kategorinya diresolve dari cache kategori user
+CATEGORY_CACHE_MODEL_NAME = "category-cache"
+# Koma desimal ("25.000,00", "1,5 juta"): pesan seperti ini tidak diresolve dari cache
+_DECIMAL_COMMA = re.compile(r"\d,\d{1,2}\b")
+
+# Mode OCR: "full" (seluruh halaman, default), "roi" (semua region baris),
+# "fast" (header + bagian bawah dulu, fallback full page jika TOTAL tidak ketemu).
+# "roi"/"fast" opt-in: belum ada hasil akurasi/latency (scripts/bench_ocr_grid.py)
+# dan bagian item struk tidak ikut di-OCR
+OCR_MODE = os.getenv("OCR_MODE", "full").lower()
+OCR_REGION_WORKERS = int(os.getenv("OCR_REGION_WORKERS", "4"))
+
+# Window buffer write OcrText+LlmResponse+Transaction lintas job (0 = tulis langsung)
+DB_BUNDLE_WINDOW_MS = int(os.getenv("DB_BUNDLE_WINDOW_MS", "0"))
+
+# Interval flush write-behind audit LlmResponse untuk pesan teks (0 = insert langsung)
+LLM_AUDIT_FLUSH_MS = int(os.getenv("LLM_AUDIT_FLUSH_MS", "500"))
+
 
 class WorkerError(Exception):
     pass
 
 
+def _serialize_usage(usage) -> dict:
+    if not usage:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+def _summarize_transactions(transactions: List[dict]) -> Optional[dict]:
+    """
+    Hasil untuk satu pesan: dict transaksi biasa jika hanya satu item,
+    atau ringkasan (total + list transaksi) jika pesan berisi banyak item.
+    """
+    if not transactions:
+        return None
+    if len(transactions) == 1:
+        return transactions[0]
+
+    intents = {tx["intent"] for tx in transactions}
+    return {
+        "transactions": transactions,
+        "count": len(transactions),
+        "needsReview": any(tx.get("needsReview") for tx in transactions),
+        "amount": sum(tx["amount"] for tx in transactions),
+        "category": ", ".join(dict.fromkeys(tx["category"] for tx in transactions)),
+        "intent": intents.pop() if len(intents) == 1 else "campuran",
+    }
+
+
+def _cached_category(user_id: int, text: str):
+    """Kategori dari cache kategori user untuk pesan pendek (None jika tidak ada)."""
+    if not CATEGORY_CACHE_ENABLED:
+        return None
+    note = strip_amounts(text)
+    if not note or len(note.split()) > CATEGORY_CACHE_MAX_WORDS:
+        return None
+    return category_cache.lookup(user_id, note)
+
+
+def _learn_category(user_id: int, text: str, parsed: dict, needs_review: bool) -> None:
+    """Pelajari keputusan kategori dari hasil yang tidak perlu review."""
+    if not CATEGORY_CACHE_ENABLED or needs_review:
+        return
+    if float(parsed.get("confidence", 0.0)) < CATEGORY_CACHE_LEARN_MIN_CONFIDENCE:
+        return
+    category_cache.learn(
+        user_id, strip_amounts(text) or parsed["note"], parsed["category"], parsed["intent"]
+    )
+
+
+def _category_cache_parse(user_id: int, text: str) -> Optional[dict]:
+    """
+    Pengganti call LLM untuk pesan yang mirip riwayat terkonfirmasi user:
+    nominal + intent rule-based, kategori dari cache.
+
+    Hanya untuk pesan dengan tepat satu angka yang jelas nominal ("kopi
+    20rb", "parkir 5.000") tanpa koma desimal: hasil cache disimpan dengan
+    confidence CATEGORY_CACHE_CONFIDENCE, jadi nominal yang ambigu ("1,5",
+    "2 kopi 20rb", "Rp 25.000,00", "kos januari 2024 1500000") tetap lewat
+    LLM. Hasil cache tetap melewati sanity check; flag apa pun → needs_review.
+
+    Returns:
+        Dict format `call_llm_routed`, atau None jika harus lewat LLM
+        (nominal tidak jelas, tidak ada match, atau intent keyword berbeda
+        dari riwayat)
+    """
+    tokens = amount_tokens(text)
+    if len(tokens) != 1 or not tokens[0].clear or _DECIMAL_COMMA.search(text):
+        return None
+
+    match = _cached_category(user_id, text)
+    if match is None:
+        return None
+
+    parsed = parse_transaction_text(
+        text, category=match.category, confidence=CATEGORY_CACHE_CONFIDENCE
+    )
+    if parsed is None or parsed["intent"] != match.intent:
+        return None
+
+    logger.info(
+        "Category cache hit for user %s: '%s' → %s (%.2f)",
+        user_id, match.note, match.category, match.similarity
+    )
+    text_output = parsed["raw_output"]
+    parsed = parse_llm_response(text_output)
+    sanity = run_sanity_checks(parsed)
+    cache_meta = {"note": match.note, "similarity": match.similarity}
+    if sanity["flags"]:
+        cache_meta["sanity_flags"] = sanity["flags"]
+    return {
+        "text": text_output,
+        "model": CATEGORY_CACHE_MODEL_NAME,
+        "usage": None,
+        "parsed": parsed,
+        "calls": [],
+        "category_cache": cache_meta,
+        "needs_review": bool(sanity["flags"]),
+    }
+
+
+def _text_fallback(
+    user_id: int,
+    items: List[str],
+    error: LLMUnavailableError,
+    input_source: str
+) -> dict:
+    """
+    Pengganti response `call_llm` saat LLM tidak tersedia: tiap item diparse
+    rule-based (format sama dengan output LLM, JSON array untuk batch),
+    dengan kategori dari cache kategori user jika ada.
+
+    Raises:
+        WorkerError: Jika ada item tanpa nominal yang bisa dikenali
+    """
+    parsed_items = []
+    for item in items:
+        match = _cached_category(user_id, item)
+        parsed = parse_transaction_text(item, category=match.category if match else None)
+        if parsed is None:
+            raise WorkerError(
+                f"LLM tidak tersedia ({error.reason}) dan parser rule-based gagal"
+            ) from error
+        parsed_items.append(parsed)
+
+    LLM_FALLBACK.labels(input_source=input_source, reason=error.reason).inc()
+    logger.warning(
+        "LLM unavailable (%s), %s item(s) parsed rule-based", error.reason, len(items)
+    )
+
+    if len(items) == 1:
+        text = parsed_items[0]["raw_output"]
+        parsed = parse_llm_response(text)
+    else:
+        text = json.dumps([
+            {"ref": ref, **json.loads(parsed["raw_output"])}
+            for ref, parsed in enumerate(parsed_items, 1)
+        ])
+        parsed = parse_llm_batch_response(text, expected_count=len(items))
+
+    return {
+        "text": text,
+        "model": TEXT_PARSER_MODEL_NAME,
+        "usage": None,
+        "parsed": parsed,
+        "calls": [],
+        "fallback": error.reason,
+    }
+
+
+def _ocr_meta(ocr_metadata: dict) -> dict:
+    """ocrMeta untuk OcrText: confidence, plus ringkasan per halaman untuk PDF."""
+    meta = {"confidence": ocr_metadata.get("confidence", 0.0)}
+    if "quality_gate" in ocr_metadata:
+        meta["quality_gate"] = ocr_metadata["quality_gate"]
+    if "pages" in ocr_metadata:
+        for key in ("ocr_mode", "page_count", "truncated", "pages"):
+            meta[key] = ocr_metadata[key]
+    return meta
+
+
+def _llm_call_meta(llm_response: dict) -> dict:
+    """Statistik per model (latency, token, repair, eskalasi, fallback) untuk llmMeta."""
+    meta = {"llm_calls": llm_response.get("calls", [])}
+    if llm_response.get("repaired"):
+        meta["repaired"] = True
+    if llm_response.get("escalated"):
+        meta["escalated"] = llm_response["escalated"]
+    if llm_response.get("fallback"):
+        meta["fallback"] = llm_response["fallback"]
+    if llm_response.get("category_cache"):
+        meta["category_cache"] = llm_response["category_cache"]
+    return meta
+
+
+def _normalize_category(parsed: dict) -> float:
+    """
+    Normalisasi kategori hasil LLM / parser (in-place) seperti jalur OCR,
+    supaya typo ("trasnport") tidak tersimpan / dipelajari cache kategori.
+
+    Returns:
+        Similarity normalisasi (1.0 exact/alias, 0.0 fallback "lainnya")
+    """
+    result = validate_and_normalize_category(parsed.get("category"))
+    parsed["category"] = result["normalized"]
+    return result["similarity"]
+
+
 # =========================
 # TEXT MESSAGE
 # =========================
 async def process_text_message(
     user_id: int,
     text: str,
-    source: str = "telegram"
+    source: str = "telegram",
+    raise_errors: bool = False
+) -> Optional[dict]:
+    """
+    Proses pesan teks transaksi.
+
+    Pesan multi-item ("kopi 20rb, parkir 5rb") dan burst pesan dari user
+    yang sama (dalam TEXT_BATCH_WINDOW_MS) diekstrak dengan satu call LLM.
+    Dengan `raise_errors` (job runner) exception diteruskan supaya job
+    di-retry, bukan None.
+    """
+    items = split_multi_item_message(text) or [text]
+
+    try:
+        if text_batcher.enabled:
+            return await text_batcher.submit(user_id, source, items)
+
+        if len(items) > 1:
+            results = await process_text_batch(user_id, source, [items], raise_errors)
+            if isinstance(results[0], Exception):
+                raise results[0]
+            return results[0]
+
+    except (LLMAPIError, ParserError, TransactionServiceError, WorkerError) as e:
+        record_failure("batch", e)
+        logger.error("Error processing text batch: %s", e, exc_info=True)
+        if raise_errors and not isinstance(e, WorkerError):
+            raise
+        return None
+
+    return await _process_single_text(user_id, text, source, raise_errors)
+
+
+async def process_text_batch(
+    user_id: int,
+    source: str,
+    messages: List[List[str]],
+    raise_errors: bool = False
+) -> List[Union[Optional[dict], Exception]]:
+    """
+    Ekstrak semua item dari beberapa pesan dengan SATU call LLM (output
+    JSON array), lalu simpan semuanya dalam satu DB transaction.
+
+    Args:
+        user_id: User ID
+        source: "telegram" atau "whatsapp"
+        messages: List pesan, tiap pesan berupa list item teks
+        raise_errors: Kegagalan per pesan di fallback per item dikembalikan
+            sebagai exception (bukan None) supaya job pesan itu di-retry
+
+    Returns:
+        Satu hasil per pesan (lihat `_summarize_transactions`), atau
+        exception pesan tersebut jika `raise_errors`
+    """
+    flat_items = [item for items in messages for item in items]
+
+    # Satu item saja → pakai jalur biasa (prompt single object)
+    if len(flat_items) == 1:
+        return [await _process_single_text(user_id, flat_items[0], source, raise_errors)]
+
+    logger.info(
+        "Processing text batch from user %s via %s: %s items",
+        user_id, source, len(flat_items)
+    )
+
+    await ensure_user_loaded(user_id, get_confirmed_categories)
+
+    prompt = build_batch_prompt(flat_items)
+    with span("call_llm", input_source="text_batch", items=len(flat_items)) as llm_attrs:
+        try:
+            llm_response = await asyncio.to_thread(
+                call_llm_routed,
+                prompt,
+                lambda out: parse_llm_batch_response(out, expected_count=len(flat_items)),
+                input_source="text_batch",
+                system_prompt=BATCH_SYSTEM_PROMPT
+            )
+        except LLMUnavailableError as e:
+            llm_response = _text_fallback(user_id, flat_items, e, "text_batch")
+            llm_attrs["fallback"] = e.reason
+        except (LLMAPIError, ParserError) as e:
+            # Output batch rusak (schema / jumlah / ref) tidak boleh menggagalkan semua pesan
+            llm_attrs["fallback"] = "single"
+            return await _process_batch_individually(user_id, source, messages, e, raise_errors)
+        llm_attrs["model"] = llm_response["model"]
+    needs_review = bool(llm_response.get("fallback"))
+
+    llm_text = llm_response["text"]
+    logger.info("RAW LLM OUTPUT (batch): %s", llm_text)
+    parsed_items = llm_response["parsed"]
+    similarities = {parsed["ref"]: _normalize_category(parsed) for parsed in parsed_items}
+
+    llm_meta = {
+        "trace_id": current_trace_id(),
+        "batch_size": len(flat_items),
+        "message_count": len(messages),
+        **_serialize_usage(llm_response.get("usage")),
+        **_llm_call_meta(llm_response),
+    }
+
+    # Prompt batch disimpan sebagai referensi template + daftar item
+    llm_fields = await pack_llm_fields(
+        "text_batch",
+        INPUT_PLACEHOLDER,
+        prompt,
+        "\n".join(flat_items),
+        llm_text,
+        system_prompt=BATCH_SYSTEM_PROMPT
+    )
+
+    with span("save_transaction_batch"):
+        try:
+            saved = await save_transaction_batch(
+                user_id=user_id,
+                transactions=[
+                    {
+                        "amount": float(parsed["amount"]),
+                        "category": parsed["category"],
+                        "description": parsed["note"],
+                        "transaction_type": parsed["intent"],
+                        "needs_review": needs_review or is_low_category_similarity(
+                            similarities[parsed["ref"]]
+                        ),
+                        "category_similarity": similarities[parsed["ref"]],
+                    }
+                    for parsed in sorted(parsed_items, key=lambda p: p["ref"])
+                ],
+                llm_data={
+                    "userId": user_id,
+                    "inputSource": "text",
+                    **llm_fields,
+                    "modelName": llm_response.get("model"),
+                    "llmMeta": json.dumps(llm_meta),
+                    "createdAt": datetime.utcnow()
+                },
+                receipt_id=None,
+                source=source
+            )
+        except TransactionServiceError as e:
+            # Batch ditulis atomic (tidak ada row tersimpan) → aman diulang per pesan
+            return await _process_batch_individually(user_id, source, messages, e, raise_errors)
+
+    for parsed in parsed_items:
+        _learn_category(
+            user_id,
+            flat_items[parsed["ref"] - 1],
+            parsed,
+            needs_review or is_low_category_similarity(similarities[parsed["ref"]])
+        )
+
+    # Kembalikan hasil ke masing-masing pesan sesuai urutan item
+    results = []
+    offset = 0
+    for items in messages:
+        results.append(_summarize_transactions(saved[offset:offset + len(items)]))
+        offset += len(items)
+
+    return results
+
+
+async def _process_batch_individually(
+    user_id: int,
+    source: str,
+    messages: List[List[str]],
+    error: Exception,
+    raise_errors: bool = False
+) -> List[Union[Optional[dict], Exception]]:
+    """
+    Fallback batch gagal: proses tiap item lewat jalur pesan tunggal.
+
+    Dengan `raise_errors`, pesan yang salah satu itemnya gagal (selain
+    WorkerError) mendapat exception-nya sebagai hasil; pesan lain tidak ikut gagal.
+    """
+    record_failure("batch", error)
+    logger.warning(
+        "Text batch failed (%s), retrying %s messages individually", error, len(messages)
+    )
+    results: List[Union[Optional[dict], Exception]] = []
+    for items in messages:
+        saved = []
+        failure = None
+        for item in items:
+            try:
+                tx = await _process_single_text(user_id, item, source, raise_errors)
+            except (LLMAPIError, ParserError, TransactionServiceError) as e:
+                failure = failure or e
+                continue
+            if tx:
+                saved.append(tx)
+        results.append(failure or _summarize_transactions(saved))
+    return results
+
+
+# Batcher menggabungkan pesan dari beberapa job: kegagalan dikembalikan per
+# pesan lalu diteruskan ke pemanggil `submit` masing-masing
+text_batcher = TextBatcher(
+    functools.partial(process_text_batch, raise_errors=True),
+    window_ms=TEXT_BATCH_WINDOW_MS
+)
+bundle_writer = BundleWriter(window_ms=DB_BUNDLE_WINDOW_MS)
+llm_audit = LlmAuditBuffer(flush_ms=LLM_AUDIT_FLUSH_MS)
+
+
+async def _process_single_text(
+    user_id: int,
+    text: str,
+    source: str,
+    raise_errors: bool = False
 ) -> Optional[dict]:
 
+    stage = "llm_call"
     try:
         logger.info(
             "Processing text message from user %s via %s",
@@ -41,58 +516,96 @@ async def process_text_message(
             source
         )
 
-        # 1. Call LLM
-        llm_response = call_llm(text)
-        llm_text = llm_response.get("text")
-        if not llm_text:
-            raise WorkerError("LLM mengembalikan teks kosong")
-
+        # 1-2. Call LLM + parse: pesan yang mirip riwayat user diresolve dari
+        # cache kategori; selain itu router memilih model dan eskalasi jika
+        # parse gagal / confidence rendah; parser rule-based jika LLM tidak tersedia
+        await ensure_user_loaded(user_id, get_confirmed_categories)
+        with span("call_llm", input_source="text") as llm_attrs:
+            llm_response = _category_cache_parse(user_id, text)
+            if llm_response is None:
+                try:
+                    llm_response = await asyncio.to_thread(
+                        call_llm_routed, text, parse_llm_response, input_source="text"
+                    )
+                except LLMUnavailableError as e:
+                    llm_response = _text_fallback(user_id, [text], e, "text")
+                    llm_attrs["fallback"] = e.reason
+            llm_attrs["model"] = llm_response["model"]
+        needs_review = bool(llm_response.get("fallback") or llm_response.get("needs_review"))
+
+        llm_text = llm_response["text"]
         logger.info("RAW LLM OUTPUT: %s", llm_text)
-
-        # 2. Parse hasil LLM
-        parsed = parse_llm_response(llm_text)
+        parsed = llm_response["parsed"]
+        category_similarity = _normalize_category(parsed)
+        needs_review = needs_review or is_low_category_similarity(category_similarity)
 
         # 3. Serialize usage (WAJIB, agar JSON aman)
-        usage = llm_response.get("usage")
-        llm_meta = {}
-        if usage:
-            llm_meta = {
-                "prompt_tokens": getattr(usage, "prompt_tokens", None),
-                "completion_tokens": getattr(usage, "completion_tokens", None),
-                "total_tokens": getattr(usage, "total_tokens", None),
-            }
+        llm_meta = {
+            "trace_id": current_trace_id(),
+            **_serialize_usage(llm_response.get("usage")),
+            **_llm_call_meta(llm_response),
+        }
 
-        # 4. Simpan LLM response (UNTUK FK)
-        llm_record = await prisma.llmresponse.create(
-            data={
-                "userId": user_id,
-                "inputSource": "text",
-                "inputText": text,
-                "promptUsed": text,
-                "modelName": llm_response.get("model"),
-                "llmOutput": llm_text,                 # ✅ STRING ONLY
-                "llmMeta": json.dumps(llm_meta),       # ✅ DICT ONLY
-                "createdAt": datetime.utcnow()
-            }
-        )
+        # Prompt teks = input apa adanya → cukup referensi template
+        llm_fields = await pack_llm_fields("text", INPUT_PLACEHOLDER, text, text, llm_text)
 
-        # 5. Simpan transaksi
-        transaction = await save_transaction(
-            user_id=user_id,
-            amount=float(parsed["amount"]),
-            category=parsed["category"],
-            description=parsed["note"],
-            transaction_type=parsed["intent"],
-            llm_response_id=llm_record.id,
-            receipt_id=None,
-            source=source
-        )
+        llm_data = {
+            "userId": user_id,
+            "inputSource": "text",
+            **llm_fields,                          # ✅ STRING ONLY
+            "modelName": llm_response.get("model"),
+            "llmMeta": json.dumps(llm_meta),       # ✅ DICT ONLY
+            "createdAt": datetime.utcnow()
+        }
+
+        stage = "db_write"
+        if llm_audit.enabled:
+            # 4. Transaksi dulu; audit LlmResponse ditulis belakangan (write-behind)
+            llm_response_id = await llm_audit.reserve_id()
+            with span("save_transaction"):
+                transaction = await save_transaction(
+                    user_id=user_id,
+                    amount=float(parsed["amount"]),
+                    category=parsed["category"],
+                    description=parsed["note"],
+                    transaction_type=parsed["intent"],
+                    llm_response_id=None,
+                    receipt_id=None,
+                    source=source,
+                    needs_review=needs_review,
+                    category_similarity=category_similarity
+                )
+            llm_audit.enqueue(llm_response_id, llm_data, [transaction["id"]])
+        else:
+            # 4. Simpan LLM response (UNTUK FK)
+            with span("save_llm_response"), observe(DB_WRITE_DURATION, table="llm_responses"):
+                llm_record = await prisma.llmresponse.create(data=llm_data)
+
+            # 5. Simpan transaksi
+            with span("save_transaction"):
+                transaction = await save_transaction(
+                    user_id=user_id,
+                    amount=float(parsed["amount"]),
+                    category=parsed["category"],
+                    description=parsed["note"],
+                    transaction_type=parsed["intent"],
+                    llm_response_id=llm_record.id,
+                    receipt_id=None,
+                    source=source,
+                    needs_review=needs_review,
+                    category_similarity=category_similarity
+                )
 
         logger.info("Transaction saved: %s", transaction["id"])
+        _learn_category(user_id, text, parsed, needs_review)
         return transaction
 
     except (LLMAPIError, ParserError, TransactionServiceError, WorkerError) as e:
+        # Parse terjadi di dalam call_llm_routed (stage masih "llm_call")
+        record_failure("parse" if isinstance(e, ParserError) else stage, e)
         logger.error("Error processing text message: %s", e, exc_info=True)
+        if raise_errors and not isinstance(e, WorkerError):
+            raise
         return None
 
 
@@ -103,9 +616,33 @@ async def process_image_message(
     user_id: int,
     receipt_id: int,
     file_path: str,
-    source: str
+    source: str,
+    raise_errors: bool = False
 ) -> Optional[dict]:
-
+    """
+    OCR struk / dokumen lalu simpan transaksinya.
+
+    Args:
+        raise_errors: True saat dijalankan job runner → exception diteruskan
+            supaya job di-retry / ditandai failed (OCR tanpa teks tetap None)
+
+    Returns:
+        Transaction, dict {"rejected", "hint"} jika ditolak, atau None jika gagal
+    """
+
+    from worker.utils.image_utils import load_image
+    from worker.ocr.document import DocumentError, extract_pdf_text, is_pdf
+    from worker.ocr.engines import get_preprocessor, get_region_ocr, get_tesseract
+    from worker.ocr.quality import (
+        QUALITY_GATE_MODE,
+        check_image_quality,
+        record_pipeline_seconds,
+        record_quality_result,
+    )
+
+    stage = "preprocess"
+    ocr_text = None
+    ocr_metadata: dict = {}
     try:
         logger.info(
             "Processing image message from user %s via %s",
@@ -113,89 +650,222 @@ async def process_image_message(
             source
         )
 
-        # 1. Preprocess image
-        preprocessor = ImagePreprocessor()
-        img = load_image(file_path)
-        preprocessed_img = preprocessor.preprocess(img)
-
-        # 2. OCR
-        ocr_engine = TesseractOCR()
-        ocr_text, ocr_metadata = ocr_engine.extract_text(preprocessed_img)
+        if is_pdf(file_path):
+            # Dokumen PDF: text layer / render + OCR per halaman (tanpa quality gate)
+            stage = "document"
+            with span("pdf_extract") as pdf_attrs:
+                try:
+                    ocr_text, ocr_metadata = await asyncio.to_thread(extract_pdf_text, file_path)
+                except DocumentError as e:
+                    record_failure(stage, e)
+                    logger.info("Receipt %s: PDF rejected (%s): %s", receipt_id, e.reason, e)
+                    return {"rejected": e.reason, "hint": e.hint}
+                pdf_attrs["pages"] = ocr_metadata["pages_processed"]
+                pdf_attrs["ocr_mode"] = ocr_metadata["ocr_mode"]
+        else:
+            # Tahap gambar (decode, gate, preprocess, OCR) blocking CPU: jalan di
+            # thread seperti jalur PDF supaya event loop (job lain, claim,
+            # reaper) tidak berhenti selama OCR
+            preprocessor = get_preprocessor()
+            img = await asyncio.to_thread(load_image, file_path)
+
+            # 0. Quality gate: foto blur / gelap / terpotong ditolak sebelum OCR
+            stage = "quality"
+            shadow_reject = None
+            if QUALITY_GATE_MODE != "off":
+                with span("quality_gate") as quality_attrs:
+                    quality = await asyncio.to_thread(
+                        check_image_quality, img, preprocessor.max_width, preprocessor.max_height
+                    )
+                    quality_attrs["result"] = quality.reason or "accepted"
+                    quality_attrs["duration_ms"] = quality.duration_ms
+                enforced = QUALITY_GATE_MODE == "enforce"
+                record_quality_result(quality, enforced)
+                if not quality.ok:
+                    logger.info(
+                        "Receipt %s failed quality gate (%s%s): %s",
+                        receipt_id, quality.reason, "" if enforced else ", log only", quality.metrics
+                    )
+                    if enforced:
+                        return {"rejected": quality.reason, "hint": quality.hint}
+                    shadow_reject = quality.reason
+
+            # 1. Preprocess image
+            stage = "preprocess"
+            pipeline_start = time.perf_counter()
+            with span("preprocess"):
+                preprocessed_img = await asyncio.to_thread(preprocessor.preprocess, img)
+
+            # 2. OCR
+            stage = "ocr"
+            with span("ocr", mode=OCR_MODE) as ocr_attrs:
+                if OCR_MODE in ("roi", "fast"):
+                    region_ocr = get_region_ocr(max_workers=OCR_REGION_WORKERS)
+                    ocr_text, ocr_metadata = await asyncio.to_thread(
+                        region_ocr.extract_text,
+                        preprocessed_img,
+                        fast=OCR_MODE == "fast"
+                    )
+                else:
+                    ocr_text, ocr_metadata = await asyncio.to_thread(
+                        get_tesseract().extract_text, preprocessed_img
+                    )
+                ocr_attrs["confidence"] = float(ocr_metadata.get("confidence", 0.0))
+                ocr_attrs["ocr_mode"] = ocr_metadata.get("ocr_mode", "full")
+            if shadow_reject:
+                # Mode log: alasan yang akan ditolak disimpan di ocrMeta untuk
+                # mengukur false-reject (transaksi tetap terbaca / tidak dikoreksi)
+                ocr_metadata["quality_gate"] = shadow_reject
+
+            record_pipeline_seconds(time.perf_counter() - pipeline_start)
 
         if not ocr_text:
             raise WorkerError("OCR gagal mengekstrak teks")
 
         logger.info("OCR TEXT:\n%s", ocr_text)
 
-        # 3. Simpan OCR result
-        await save_ocr_result(
-            receipt_id=receipt_id,
-            raw_text=ocr_text,
-            confidence=ocr_metadata.get("confidence", 0.0)
-        )
-
-        # 4. Build prompt & call LLM
-        prompt = build_prompt(ocr_text)
-        llm_response = call_llm(prompt)
-
-        llm_text = llm_response.get("text")
-        if not llm_text:
-            raise WorkerError("LLM mengembalikan teks kosong")
+        # 3. Parser deterministik (tanpa LLM) untuk struk dengan TOTAL jelas
+        stage = "parse"
+        with span("receipt_parser") as parser_attrs, \
+                observe(PARSE_DURATION, source="receipt_parser"):
+            parsed = parse_receipt_text(
+                ocr_text,
+                ocr_confidence=ocr_metadata.get("confidence")
+            )
+            parser_attrs["confidence"] = parsed["confidence"] if parsed else 0.0
 
-        logger.info("RAW LLM OUTPUT (OCR): %s", llm_text)
-
-        # 5. Parse & sanity check
-        parsed = parse_llm_response(llm_text)
-        sanity = run_sanity_checks(parsed)
-
-        # 6. Serialize usage
-        usage = llm_response.get("usage")
         llm_meta = {
-            "ocr_confidence": ocr_metadata.get("confidence", 0.0)
+            "ocr_confidence": ocr_metadata.get("confidence", 0.0),
+            "ocr_mode": ocr_metadata.get("ocr_mode", "full"),
+            "trace_id": current_trace_id(),
         }
-        if usage:
-            llm_meta.update({
-                "prompt_tokens": getattr(usage, "prompt_tokens", None),
-                "completion_tokens": getattr(usage, "completion_tokens", None),
-                "total_tokens": getattr(usage, "total_tokens", None),
-            })
-
-        # 7. Simpan LLM response
-        llm_record = await prisma.llmresponse.create(
-            data={
-                "userId": user_id,
-                "inputSource": "ocr",
-                "inputText": ocr_text,
-                "promptUsed": prompt,
-                "modelName": llm_response.get("model"),
-                "llmOutput": llm_text,                 # ✅ STRING
-                "llmMeta": json.dumps(llm_meta),       # ✅ JSON
-                "createdAt": datetime.utcnow()
+
+        llm_response = None
+        fallback_reason = None
+
+        if not parsed or parsed["confidence"] < RECEIPT_PARSER_MIN_CONFIDENCE:
+            # 4. Build prompt & call LLM
+            stage = "llm_call"
+            template, prompt_input, prompt_stats = build_prompt_parts(ocr_text)
+            prompt = render_prompt(template, prompt_input)
+            with span("call_llm", input_source="ocr") as llm_attrs:
+                try:
+                    llm_response = await asyncio.to_thread(
+                        call_llm_routed, prompt, parse_llm_response, input_source="ocr"
+                    )
+                    llm_attrs["model"] = llm_response["model"]
+                except LLMUnavailableError as e:
+                    # Tanpa hasil parser struk tidak ada fallback → gagal seperti biasa
+                    if not parsed:
+                        raise
+                    fallback_reason = e.reason
+                    llm_attrs["fallback"] = e.reason
+                    LLM_FALLBACK.labels(input_source="ocr", reason=e.reason).inc()
+                    logger.warning(
+                        "LLM unavailable (%s), using receipt parser result (%.2f) for review",
+                        e.reason, parsed["confidence"]
+                    )
+
+        if llm_response is None:
+            if fallback_reason is None:
+                logger.info(
+                    "Receipt parser confident (%.2f), skipping LLM", parsed["confidence"]
+                )
+            model_name = RECEIPT_PARSER_MODEL_NAME
+            llm_text = parsed["raw_output"]
+            llm_fields = {
+                "inputText": compress_text(ocr_text),
+                "promptUsed": None,
+                "llmOutput": llm_text,
             }
-        )
+            llm_meta["receipt_parser"] = {
+                "confidence": parsed["confidence"],
+                "signals": parsed["signals"],
+                "merchant": parsed["merchant"],
+            }
+            if fallback_reason:
+                llm_meta["fallback"] = fallback_reason
+        else:
+            llm_text = llm_response["text"]
+            logger.info("RAW LLM OUTPUT (OCR): %s", llm_text)
+            parsed = llm_response["parsed"]
+
+            llm_fields = await pack_llm_fields(
+                "ocr", template, prompt_input, ocr_text, llm_text
+            )
+            model_name = llm_response.get("model")
+            llm_meta["prompt_stats"] = prompt_stats
+            llm_meta.update(_serialize_usage(llm_response.get("usage")))
+            llm_meta.update(_llm_call_meta(llm_response))
+
+        # 5. Sanity check (sama untuk hasil parser maupun LLM)
+        sanity = run_sanity_checks(parsed)
+        llm_meta["sanity"] = {
+            "flags": sanity["flags"],
+            "adjusted_confidence": sanity["adjusted_confidence"],
+        }
 
-        # 8. Simpan transaksi
-        transaction = await save_transaction(
-            user_id=user_id,
-            amount=float(parsed["amount"]),
-            category=sanity.get(
-                "normalized_category",
-                parsed["category"]
-            ),
-            description=parsed["note"],
-            transaction_type=parsed["intent"],
-            llm_response_id=llm_record.id,
-            receipt_id=receipt_id,
-            source=source
-        )
+        # 6. Simpan OcrText + LlmResponse + Transaction (1 round trip, atomic)
+        stage = "db_write"
+        with span("save_bundle"):
+            transaction = await bundle_writer.submit(build_bundle(
+                user_id=user_id,
+                receipt_id=receipt_id,
+                ocr_text=ocr_text,
+                ocr_meta=_ocr_meta(ocr_metadata),
+                input_source="ocr",
+                input_text=llm_fields["inputText"],
+                prompt_used=llm_fields["promptUsed"],
+                model_name=model_name,
+                llm_output=llm_fields["llmOutput"],
+                llm_meta=llm_meta,
+                amount=parsed["amount"],
+                category=sanity.get(
+                    "normalized_category",
+                    parsed["category"]
+                ),
+                description=parsed["note"],
+                transaction_type=parsed["intent"],
+                source=source,
+                needs_review=fallback_reason is not None or sanity["needs_review"],
+                category_similarity=sanity["category_similarity"]
+            ))
 
         return transaction
 
     except Exception as e:
+        record_failure("parse" if isinstance(e, ParserError) else stage, e)
         logger.error("Error processing image message: %s", e, exc_info=True)
+        if ocr_text:
+            # Bundle tidak tersimpan (atomic): hasil OCR tetap disimpan seperti sebelumnya
+            try:
+                await save_ocr_result(
+                    receipt_id=receipt_id,
+                    raw_text=ocr_text,
+                    confidence=ocr_metadata.get("confidence", 0.0),
+                    meta=_ocr_meta(ocr_metadata),
+                )
+            except TransactionServiceError as save_error:
+                logger.error("Failed to keep OCR text for receipt %s: %s", receipt_id, save_error)
+        if raise_errors and not isinstance(e, WorkerError):
+            raise
         return None
 
 
+# =========================
+# STARTUP / SHUTDOWN
+# =========================
+async def startup_worker():
+    """Replay audit LlmResponse yang ter-spill saat shutdown sebelumnya."""
+    await llm_audit.replay_spill()
+
+
+async def shutdown_worker():
+    """Flush semua buffer write yang masih tertunda (dipanggil saat shutdown app)."""
+    await bundle_writer.close()
+    await llm_audit.close()
+
+
 # =========================
 # BACKGROUND WRAPPER
 # =========================